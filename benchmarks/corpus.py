@@ -0,0 +1,138 @@
+"""Generator of synthetic mael directories for benchmarks.
+
+The same parameters and seed always generate the same files.
+
+Usage::
+
+    $ python benchmarks/corpus.py some_dir [--files 20] [--steps 100] [--columns 5]
+        [--list-width 3] [--variables 5] [--cell-size 40] [--seed 0]
+"""
+import argparse
+import os
+import random
+
+WORDS = [
+    'open', 'the', 'page', 'click', 'button', 'check', 'that', 'message', 'is', 'shown',
+    'input', 'value', 'form', 'submit', 'login', 'user', 'error', 'list', 'item', 'save',
+]
+
+COLUMNS_YML = """global:
+  duplicate_previous_for_blank: true
+prepend:
+  No.:
+    type: increment
+    width: 5
+column_conditions:
+  Tags:
+    type: list
+  Column 1:
+    width: 40
+"""
+
+
+def text(rng: random.Random, size: int, variables: int) -> str:
+    """Return words of about size characters, sometimes with a variable placeholder."""
+    words = []
+    length = 0
+    while length < size:
+        if variables and rng.random() < 0.05:
+            word = f'{{{{ VAR_{rng.randrange(variables)} }}}}'
+        else:
+            word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return ' '.join(words)
+
+
+def markdown(rng: random.Random, index: int, steps: int, columns: int, list_width: int,
+             variables: int, cell_size: int) -> str:
+    lines = [
+        f'# Scenario {index:04d}',
+        '',
+        '## Summary',
+        '',
+        text(rng, cell_size, variables),
+        '',
+        '## List',
+        '',
+    ]
+    for step in range(steps):
+        if step > 0:
+            lines.extend(['---', ''])
+        for column in range(1, columns + 1):
+            # leave some cells blank so that they are filled from the previous step
+            if step > 0 and column > 1 and rng.random() < 0.2:
+                continue
+            lines.extend([f'### Column {column}', '', text(rng, cell_size, variables), ''])
+        if list_width:
+            lines.extend(['### Tags', ''])
+            lines.extend(f'* {rng.choice(WORDS)}' for _ in range(rng.randint(1, list_width)))
+            lines.append('')
+    return '\n'.join(lines)
+
+
+def generate_corpus(
+        directory_path,
+        files: int = 20,
+        steps: int = 100,
+        columns: int = 5,
+        list_width: int = 3,
+        variables: int = 5,
+        cell_size: int = 40,
+        seed: int = 0,
+) -> None:
+    """Write a mael directory with config files and markdown files.
+
+    :param directory_path: path to the directory to write, created if it does not exist
+    :param files: number of markdown files
+    :param steps: number of steps per file
+    :param columns: number of string columns
+    :param list_width: maximum number of items of the list column "Tags", 0 for no list column
+    :param variables: number of variables in variables.ini used in the cells
+    :param cell_size: approximate number of characters per cell
+    :param seed: seed of the random generator
+    """
+    rng = random.Random(seed)
+    os.makedirs(os.path.join(directory_path, 'config'), exist_ok=True)
+    with open(os.path.join(directory_path, 'config', 'columns.yml'), 'w', encoding='utf-8') as f:
+        f.write(COLUMNS_YML)
+    with open(os.path.join(directory_path, 'config', 'variables.ini'), 'w', encoding='utf-8') as f:
+        f.writelines(f'VAR_{i}=value {i}\n' for i in range(variables))
+    for index in range(files):
+        content = markdown(rng, index, steps, columns, list_width, variables, cell_size)
+        with open(os.path.join(directory_path, f'scenario_{index:04d}.md'), 'w', encoding='utf-8') as f:
+            f.write(content)
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('--files', type=int, default=20, help='Number of markdown files')
+    parser.add_argument('--steps', type=int, default=100, help='Number of steps per file')
+    parser.add_argument('--columns', type=int, default=5, help='Number of string columns')
+    parser.add_argument('--list-width', type=int, default=3, help='Maximum number of items of the list column')
+    parser.add_argument('--variables', type=int, default=5, help='Number of variables')
+    parser.add_argument('--cell-size', type=int, default=40, help='Approximate number of characters per cell')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the random generator')
+
+
+def corpus_parameters(args: argparse.Namespace) -> dict:
+    return {
+        'files': args.files,
+        'steps': args.steps,
+        'columns': args.columns,
+        'list_width': args.list_width,
+        'variables': args.variables,
+        'cell_size': args.cell_size,
+        'seed': args.seed,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Generate a synthetic mael directory.')
+    parser.add_argument('directory', help='Directory to write')
+    add_arguments(parser)
+    args = parser.parse_args()
+    generate_corpus(args.directory, **corpus_parameters(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+"""Benchmark of the stages of a build on a synthetic corpus.
+
+Each stage is timed (best of ``--repeat`` runs) and run once more under
+tracemalloc for its peak memory.  The stages are:
+
+* parse: parsing the markdown files
+* normalize: normalization of the parsed steps
+* excel, excel_stream: ExcelComposer in normal and stream mode
+* csv, tsv: CsvComposer and TsvComposer
+* convert: the whole ``convert`` without cache
+
+Results are written as JSON, and compared with a baseline written before.
+
+Usage::
+
+    $ python benchmarks/run.py --output baseline.json
+    $ python benchmarks/run.py --baseline baseline.json [--tolerance 0.2]
+
+The command exits with status 1 if a stage is slower than the baseline
+by more than the tolerance.  The corpus options are the same as corpus.py.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from corpus import add_arguments, corpus_parameters, generate_corpus
+
+# the benchmark imports mael from the repository it is in, installed or not
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mael import __version__
+from mael.composer import CsvComposer, ExcelComposer, ExcelMode, TsvComposer
+from mael.excel_builder import convert, read_column_config, read_variables
+from mael.normalizer import normalize_steps
+from mael.parser import MarkdownListParser
+from mael.variables import VariableTemplate
+
+
+class Stages:
+    """Stages of a build over a corpus, each of which can run repeatedly."""
+
+    def __init__(self, directory_path):
+        self.directory_path = directory_path
+        self.column_config = read_column_config(directory_path)
+        self.files = sorted(
+            os.path.join(directory_path, name) for name in os.listdir(directory_path) if name.endswith('.md'))
+        self.documents = self.parse()
+        self.normalized = self.normalize()
+
+    def parse(self) -> list:
+        parser = MarkdownListParser(self.column_config)
+        return [parser.parse_file(path) for path in self.files]
+
+    def normalize(self) -> list:
+        return [normalize_steps(document.steps, self.column_config) for document in self.documents]
+
+    def compose(self, composer) -> None:
+        variables = VariableTemplate(read_variables(self.directory_path))
+        all_conditions = self.column_config.all_conditions()
+        for document, (columns, table) in zip(self.documents, self.normalized):
+            composer.add_sheet(document, self.column_config, variables, all_conditions, columns, table)
+        composer.compose(self.directory_path, None, 'benchmark')
+
+    def excel(self) -> None:
+        self.compose(ExcelComposer(ExcelMode.NORMAL))
+
+    def excel_stream(self) -> None:
+        self.compose(ExcelComposer(ExcelMode.STREAM))
+
+    def csv(self) -> None:
+        self.compose(CsvComposer())
+
+    def tsv(self) -> None:
+        self.compose(TsvComposer())
+
+    def convert(self) -> None:
+        convert(self.directory_path, use_cache=False)
+
+
+STAGE_NAMES = ['parse', 'normalize', 'excel', 'excel_stream', 'csv', 'tsv', 'convert']
+
+
+def measure(function, repeat: int) -> dict:
+    """Return the best time and the peak traced memory of function.
+
+    Memory is measured in a separate run, since tracing slows down the function.
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function()
+            times.append(time.perf_counter() - start)
+        tracemalloc.start()
+        try:
+            function()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return {'seconds': min(times), 'peak_bytes': peak}
+
+
+def run(directory_path, stage_names: list[str], repeat: int) -> dict:
+    stages = Stages(directory_path)
+    return {name: measure(getattr(stages, name), repeat) for name in stage_names}
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> bool:
+    """Print the ratio of each stage to the baseline.
+
+    :return: True if no stage is slower than the baseline by more than tolerance
+    """
+    passed = True
+    if results['corpus'] != baseline.get('corpus'):
+        print('Warning: the corpus differs from the baseline')
+    print(f'{"stage":<14}{"seconds":>10}{"baseline":>10}{"ratio":>8}{"peak MiB":>10}{"baseline":>10}')
+    for name, result in results['stages'].items():
+        base = baseline['stages'].get(name)
+        if base is None:
+            print(f'{name:<14}{result["seconds"]:>10.3f}{"-":>10}')
+            continue
+        ratio = result['seconds'] / base['seconds'] if base['seconds'] else float('inf')
+        mark = ''
+        if ratio > 1 + tolerance:
+            mark = '  slower'
+            passed = False
+        print(
+            f'{name:<14}{result["seconds"]:>10.3f}{base["seconds"]:>10.3f}{ratio:>8.2f}'
+            f'{result["peak_bytes"] / 2 ** 20:>10.1f}{base["peak_bytes"] / 2 ** 20:>10.1f}{mark}'
+        )
+    return passed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark the stages of a build.')
+    add_arguments(parser)
+    parser.add_argument('--stages', default=','.join(STAGE_NAMES),
+                        help='Comma separated stages to run')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of timed runs of each stage')
+    parser.add_argument('--output', help='Path to write the results as JSON')
+    parser.add_argument('--baseline', help='Path to the JSON results to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Allowed slowdown to the baseline, 0.2 for 20%%')
+    args = parser.parse_args()
+
+    stage_names = [name.strip() for name in args.stages.split(',') if name.strip()]
+    unknown = [name for name in stage_names if name not in STAGE_NAMES]
+    if unknown:
+        parser.error(f'unknown stages: {", ".join(unknown)}')
+
+    parameters = corpus_parameters(args)
+    with tempfile.TemporaryDirectory() as directory_path:
+        generate_corpus(directory_path, **parameters)
+        stages = run(directory_path, stage_names, args.repeat)
+    results = {
+        'mael': __version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'corpus': parameters,
+        'stages': stages,
+    }
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if not compare(results, baseline, args.tolerance):
+            sys.exit(1)
+    elif not args.output:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""Benchmark of the startup time of mael commands.
+
+Each command runs in a new interpreter with ``python -X importtime``, and
+the time spent importing modules is summed up (median of ``--repeat``
+runs, which a single slow run does not move).
+The commands which do not write Excel files must import modules within
+the budget, and must not import openpyxl, nor yaml without columns.yml.
+The command to build an Excel file is measured for comparison only.
+
+Usage::
+
+    $ python benchmarks/startup.py [--budget 150] [--repeat 5] [--output startup.json]
+
+The command exits with status 1 if a command is over the budget or imports
+a module it should not.  The corpus options are the same as corpus.py.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from corpus import add_arguments, corpus_parameters, generate_corpus
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUN_MAIN = "import sys; from mael.main import main; sys.argv = ['mael'] + sys.argv[1:]; main()"
+
+
+def scenarios(directory_path, bare_directory_path) -> list[tuple]:
+    """Return the name, arguments, modules which must not be imported and whether it is budgeted of each command."""
+    return [
+        ('help', ['--help'], ['openpyxl', 'yaml'], True),
+        ('build csv', ['build', directory_path, '-f', 'csv'], ['openpyxl'], True),
+        ('build tsv', ['build', directory_path, '-f', 'tsv'], ['openpyxl'], True),
+        ('build jsonl', ['build', directory_path, '-f', 'jsonl'], ['openpyxl'], True),
+        ('build sqlite', ['build', directory_path, '-f', 'sqlite'], ['openpyxl'], True),
+        ('build csv without columns.yml', ['build', bare_directory_path, '-f', 'csv'], ['openpyxl', 'yaml'], True),
+        ('build excel', ['build', directory_path], [], False),
+    ]
+
+
+def import_times(stderr: str) -> tuple[float, set[str]]:
+    """Return the seconds spent importing and the names of the imported modules from -X importtime output."""
+    seconds = 0.0
+    modules = set()
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        modules.add(name.strip())
+        # only the modules imported at the top level, since their times include the nested ones
+        if name.startswith(' ') and not name.startswith('  '):
+            seconds += int(cumulative) / 1e6
+    return seconds, modules
+
+
+def measure(arguments: list[str], repeat: int) -> dict:
+    environment = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT_PATH, os.environ.get('PYTHONPATH')])))
+    imports = []
+    walls = []
+    modules = set()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        completed = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', RUN_MAIN, *arguments],
+            capture_output=True, text=True, env=environment,
+        )
+        walls.append(time.perf_counter() - start)
+        if completed.returncode != 0:
+            raise RuntimeError(f'mael {" ".join(arguments)} failed:\n{completed.stderr}')
+        seconds, modules = import_times(completed.stderr)
+        imports.append(seconds)
+    return {'import_seconds': statistics.median(imports), 'wall_seconds': statistics.median(walls), 'modules': modules}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark the startup time of mael commands.')
+    add_arguments(parser)
+    # the commands import modules in about 80 ms, which leaves room for a slower machine
+    parser.add_argument('--budget', type=float, default=150,
+                        help='Milliseconds allowed for imports of the commands which do not write Excel files')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of runs of each command')
+    parser.add_argument('--output', help='Path to write the results as JSON')
+    args = parser.parse_args()
+
+    results = {}
+    passed = True
+    print(f'{"command":<32}{"import ms":>10}{"wall ms":>10}  status')
+    with tempfile.TemporaryDirectory() as directory_path:
+        project_path = os.path.join(directory_path, 'project')
+        bare_project_path = os.path.join(directory_path, 'bare')
+        generate_corpus(project_path, **corpus_parameters(args))
+        generate_corpus(bare_project_path, **corpus_parameters(args))
+        os.remove(os.path.join(bare_project_path, 'config', 'columns.yml'))
+
+        for name, arguments, forbidden, budgeted in scenarios(project_path, bare_project_path):
+            result = measure(arguments, args.repeat)
+            problems = [f'imports {module}' for module in forbidden if module in result['modules']]
+            if budgeted and result['import_seconds'] * 1000 > args.budget:
+                problems.append('over budget')
+            passed = passed and not problems
+            status = ', '.join(problems) or ('ok' if budgeted else '-')
+            print(f'{name:<32}{result["import_seconds"] * 1000:>10.1f}{result["wall_seconds"] * 1000:>10.1f}  {status}')
+            results[name] = {
+                'import_seconds': result['import_seconds'],
+                'wall_seconds': result['wall_seconds'],
+                'problems': problems,
+            }
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'budget_ms': args.budget, 'commands': results}, f, indent=2)
+            f.write('\n')
+    if not passed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
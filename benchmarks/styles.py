@@ -0,0 +1,58 @@
+"""Per-cell cost of styling Excel cells.
+
+Compares the previous approach, which built a new Alignment for every cell
+and assigned border and alignment one by one, with StyleRegistry, which
+builds each named style once per workbook.
+
+Usage::
+
+    $ python benchmarks/styles.py [rows] [columns]
+"""
+import os
+import sys
+import time
+
+import openpyxl as px
+
+# the benchmark imports mael from the repository it is in, installed or not
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mael.column_config import Alignment, ColumnCondition
+from mael.styles import StyleRegistry, THIN_BORDER, styled_cell
+
+
+def per_cell_objects(rows: int, columns: int) -> float:
+    workbook = px.Workbook()
+    ws = workbook.active
+    start = time.perf_counter()
+    for row_index in range(1, rows + 1):
+        for column_index in range(1, columns + 1):
+            cell = ws.cell(row=row_index, column=column_index)
+            cell.value = 'value'
+            cell.border = THIN_BORDER
+            cell.alignment = Alignment.LEFT.excel_alignment()
+    return time.perf_counter() - start
+
+
+def style_registry(rows: int, columns: int) -> float:
+    workbook = px.Workbook()
+    ws = workbook.active
+    start = time.perf_counter()
+    styles = StyleRegistry(workbook)
+    style_arrays = [styles.style_array('cell', ColumnCondition()) for _ in range(columns)]
+    for _ in range(rows):
+        ws.append([styled_cell(ws, 'value', style_array) for style_array in style_arrays])
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    columns = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    cells = rows * columns
+    for name, function in [('per-cell objects', per_cell_objects), ('style registry', style_registry)]:
+        elapsed = function(rows, columns)
+        print(f'{name:<17} {elapsed:8.3f} s  {elapsed / cells * 1e6:6.2f} us/cell')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+import hashlib
+import json
+import os
+import pickle
+import shutil
+
+from . import __version__
+
+CACHE_DIRECTORY = os.path.join('output', '.mael-cache')
+SHEET_CACHE_DIRECTORY = os.path.join('output', '.mael-sheets')
+
+# Format of the parse results in the cache, which is part of every key.
+# Bump it whenever parsing gives results of another shape or content,
+# since the version of mael is not changed by every such change.
+CACHE_FORMAT = 1
+# Format of the worksheets in the sheet cache, bumped whenever they are rendered differently.
+SHEET_CACHE_FORMAT = 2
+
+
+def cache_directory(directory_path) -> str:
+    """Return the path to the parse cache of a mael directory.
+
+    :param directory_path: path to the directory which holds markdown files
+    :return: path to the cache directory
+    """
+    return os.path.join(directory_path, CACHE_DIRECTORY)
+
+
+def clear_cache(directory_path) -> None:
+    """Remove the parse cache and the sheet cache of a mael directory.
+
+    :param directory_path: path to the directory which holds markdown files
+    """
+    for path in [cache_directory(directory_path), os.path.join(directory_path, SHEET_CACHE_DIRECTORY)]:
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+            print('Removed', path)
+
+
+def file_fingerprint(paths: list[str]) -> str:
+    """Return a hash of the contents of the files which exist in paths.
+
+    :param paths: paths to the files
+    :return: hex digest
+    """
+    digest = hashlib.sha256()
+    for path in paths:
+        if os.path.exists(path):
+            digest.update(path.encode('utf-8'))
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+class ParseCache:
+    """On-disk cache of parsed markdown files.
+
+    An entry is keyed by the path and content of the markdown file, the
+    fingerprint of the column config, the mael version and CACHE_FORMAT, so
+    an entry is never used after any of them changes.  Entries which are not used in a
+    build are stale and removed by ``evict``.
+    """
+
+    def __init__(self, directory_path, fingerprint: str = ''):
+        self.path = cache_directory(directory_path)
+        self.fingerprint = fingerprint
+        self.hits = 0
+        self.misses = 0
+        self._used = set()
+
+    def key(self, file_path: str) -> str:
+        digest = hashlib.sha256()
+        digest.update(f'{__version__}/{CACHE_FORMAT}'.encode('utf-8'))
+        digest.update(self.fingerprint.encode('utf-8'))
+        digest.update(os.path.abspath(file_path).encode('utf-8'))
+        with open(file_path, 'rb') as f:
+            digest.update(f.read())
+        return digest.hexdigest()
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.path, key + '.pickle')
+
+    def load(self, key: str):
+        """Load a parsed result.
+
+        :param key: key of the markdown file
+        :return: the parsed result
+        :raises KeyError: if there is no valid entry for the key
+        """
+        self._used.add(key)
+        try:
+            with open(self._entry_path(key), 'rb') as f:
+                value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            self.misses += 1
+            raise KeyError(key)
+        self.hits += 1
+        return value
+
+    def store(self, key: str, value) -> None:
+        self._used.add(key)
+        os.makedirs(self.path, exist_ok=True)
+        temporary_path = self._entry_path(key) + '.tmp'
+        with open(temporary_path, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path, self._entry_path(key))
+
+    def evict(self) -> int:
+        """Remove the entries which were not used since this cache was created.
+
+        :return: number of removed entries
+        """
+        if not os.path.isdir(self.path):
+            return 0
+        removed = 0
+        for file_name in os.listdir(self.path):
+            key, _ = os.path.splitext(file_name)
+            if key not in self._used:
+                os.remove(os.path.join(self.path, file_name))
+                removed += 1
+        return removed
+
+    def stats(self) -> str:
+        return f'Cache: {self.hits} hits, {self.misses} misses'
+
+
+class SheetCache:
+    """On-disk cache of the rendered worksheets of a workbook.
+
+    An entry holds the worksheet XML of each sheet a document was split
+    into, with the sheet titles and row counts, keyed by a hash of what the
+    sheets are rendered from.  Each workbook has its own directory, so that
+    the workbooks of environments can be built in parallel.  Entries which
+    are not used in a build are removed by ``evict``.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._used = set()
+
+    def part_path(self, key: str, index: int) -> str:
+        return os.path.join(self.path, f'{key}.{index}.xml')
+
+    def load(self, key: str) -> list[tuple[str, int, str]] | None:
+        """Load the sheets of an entry.
+
+        :param key: key of the document
+        :return: title, row count and path to the XML of each sheet, or None if there is no entry
+        """
+        self._used.add(key)
+        try:
+            with open(os.path.join(self.path, key + '.json'), encoding='utf-8') as f:
+                sheets = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        parts = [(title, rows, self.part_path(key, index)) for index, (title, rows) in enumerate(sheets)]
+        if not all(os.path.exists(path) for _, _, path in parts):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return parts
+
+    def store(self, key: str, sheets: list[tuple[str, int]]) -> None:
+        """Record the sheets of an entry, whose XML is written to part_path beforehand.
+
+        :param key: key of the document
+        :param sheets: title and row count of each sheet
+        """
+        self._used.add(key)
+        temporary_path = os.path.join(self.path, key + '.json.tmp')
+        with open(temporary_path, 'w', encoding='utf-8') as f:
+            json.dump(sheets, f)
+        os.replace(temporary_path, os.path.join(self.path, key + '.json'))
+
+    def evict(self) -> int:
+        """Remove the entries which were not used since this cache was created.
+
+        :return: number of removed files
+        """
+        if not os.path.isdir(self.path):
+            return 0
+        removed = 0
+        for file_name in os.listdir(self.path):
+            if file_name.split('.', 1)[0] not in self._used:
+                os.remove(os.path.join(self.path, file_name))
+                removed += 1
+        return removed
+
+    def stats(self) -> str:
+        return f'Sheet cache: {self.hits} hits, {self.misses} misses'
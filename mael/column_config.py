@@ -1,6 +1,4 @@
 from enum import Enum
-import openpyxl
-import yaml
 
 
 class ValueType(Enum):
@@ -15,6 +13,9 @@ class Alignment(Enum):
     RIGHT = 3
 
     def excel_alignment(self):
+        # imported here so that only Excel builds load openpyxl
+        import openpyxl.styles.alignment
+
         if self == Alignment.CENTER:
             return openpyxl.styles.alignment.Alignment(
                 wrap_text=True, vertical='top', horizontal='center')
@@ -32,6 +33,10 @@ class ColumnCondition:
             width: int = None,
             alignment: Alignment | str = Alignment.LEFT,
             duplicate_previous_for_blank: bool = None,
+            font: dict = None,
+            fill: str | dict = None,
+            number_format: str = None,
+            items: int = None,
     ):
         self.type = value_type
         self.width = width
@@ -40,6 +45,10 @@ class ColumnCondition:
         else:
             self.alignment = alignment
         self.duplicate_previous_for_blank = duplicate_previous_for_blank
+        self.font = font
+        self.fill = fill
+        self.number_format = number_format
+        self.items = items
 
 
 class ColumnConfig:
@@ -49,6 +58,10 @@ class ColumnConfig:
         self.append_columns = {}
         self.overwrite_for_repeat = False
         self.duplicate_previous_for_blank = False
+        self.font = {}
+        self.header_font = {}
+        self.header_fill = None
+        self.declared_columns = None
 
     def all_conditions(self) -> dict:
         return {**self.prepend_columns, **self.conditions, **self.append_columns}
@@ -64,7 +77,28 @@ class ColumnConfig:
     def type_of(self, column: str) -> ValueType:
         return self.conditions[column].type if column in self.conditions else ValueType.STRING
 
+    def declared_schema(self) -> tuple[list[str], dict[str, int]] | None:
+        """Return the columns and list item counts declared in the config.
+
+        The schema is declared with ``global.columns`` and ``items`` of every
+        list column in it.  Columns which are not declared are not output.
+
+        :return: tuple of columns and item counts, or None if the schema is not fully declared
+        """
+        if self.declared_columns is None:
+            return None
+        counts = {}
+        for column in self.declared_columns:
+            if self.type_of(column) == ValueType.LIST:
+                if self.conditions[column].items is None:
+                    return None
+                counts[column] = self.conditions[column].items
+        return list(self.declared_columns), counts
+
     def parse(self, path: str) -> None:
+        # imported here so that directories without columns.yml do not load yaml
+        import yaml
+
         with open(path, 'r', encoding='utf8') as f:
             config = yaml.load(f, Loader=yaml.SafeLoader)
         if config is None:
@@ -75,6 +109,10 @@ class ColumnConfig:
             True == (config.get('global', {}).get('duplicate_previous_for_blank', False))
         self.overwrite_for_repeat = \
             True == (config.get('global', {}).get('overwrite_for_repeat', False))
+        self.font = config.get('global', {}).get('font') or {}
+        self.header_font = config.get('global', {}).get('header_font') or {}
+        self.header_fill = config.get('global', {}).get('header_fill')
+        self.declared_columns = config.get('global', {}).get('columns')
         for name, column in config.get('prepend', {}).items():
             self.prepend_columns[name] = self.parse_condition(column)
 
@@ -120,12 +158,18 @@ class ColumnConfig:
             Alignment[condition['alignment'].upper()] if condition and 'alignment' in condition else Alignment.LEFT,
             condition.get('duplicate_previous_for_blank', self.duplicate_previous_for_blank) \
                 if condition else self.duplicate_previous_for_blank,
+            condition.get('font') if condition else None,
+            condition.get('fill') if condition else None,
+            condition.get('number_format') if condition else None,
+            condition.get('items') if condition else None,
         )
 
 
 class Document:
     def __init__(self, file_path: str, variables = {}):
+        self.file_path = file_path
         self.title = None
         self.summary = None
         self.summary_lines = []
         self.list = []
+        self.steps = []
@@ -1,17 +1,26 @@
-import logging
+import gzip
+import io
+import json
 import os
 import re
 from abc import ABC, abstractmethod
 from enum import Enum
 
-import openpyxl as px
-from openpyxl.utils.cell import get_column_letter
 from .column_config import ColumnConfig, ValueType, Alignment, Document
+from .variables import VariableTemplate
 
 import csv
 import shutil
 
 
+def __getattr__(name: str):
+    # ExcelComposer is imported when it is used, so that the other formats do not load openpyxl
+    if name == 'ExcelComposer':
+        from .excel_composer import ExcelComposer
+        return ExcelComposer
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
 def apply_variables(value, variables: dict) -> str | None:
     """Apply variables to value.
 
@@ -21,200 +30,555 @@ def apply_variables(value, variables: dict) -> str | None:
 
     >>> apply_variables('a{{b}}c', {'b': 'B'})
     'aBc'
+
+    Composers compile the variables once per build with ``VariableTemplate``;
+    this function is kept for single values.
     """
-    if not isinstance(value, str):
-        return value
-    for k, v in variables.items():
-        value = re.sub(r'{{\s*' + k + r'\s*}}', v, value)
-    return value
+    return VariableTemplate.of(variables).apply(value)
 
 
 class Composer(ABC):
     def __init__(self):
+        # OutputFiles which publishes the outputs, or None to replace them always
+        self.outputs = None
+
+    def begin(self, directory_path, environment, basename) -> None:
+        """Called before the first sheet is added, with the arguments which compose will get.
+
+        Composers which write the output as the sheets are added open it here.
+        """
         pass
 
     @abstractmethod
     def add_sheet(self, document, column_config, variables, all_conditions, columns, steps):
         pass
 
+    def publish(self, temporary_path, path) -> bool:
+        """Move a written file to the output.
+
+        :param temporary_path: path to the written file
+        :param path: path to the output
+        :return: False if the output was left as it was since its content is unchanged
+        """
+        if self.outputs is None:
+            shutil.move(temporary_path, path)
+            return True
+        return self.outputs.publish(temporary_path, path)
+
     @abstractmethod
     def compose(self, directory_path, environment, basename):
         pass
 
 
+class ExcelMode(Enum):
+    """How ExcelComposer holds the workbook.
+
+    NORMAL keeps every cell in memory until the workbook is saved.
+    STREAM uses openpyxl's write-only worksheets, so rows are written out
+    as they are appended and memory does not grow with the row count.
+    INCREMENTAL writes the workbook with XlsxComposer instead, which renders
+    only the documents changed since the last build.
+    """
+    NORMAL = 'normal'
+    STREAM = 'stream'
+    INCREMENTAL = 'incremental'
+
+    @classmethod
+    def of(cls, mode) -> 'ExcelMode':
+        if isinstance(mode, cls):
+            return mode
+        if mode is None or mode == '':
+            return cls.NORMAL
+        return cls(str(mode).lower())
+
+
+class ExcelEngine(Enum):
+    """What writes Excel workbooks.
+
+    OPENPYXL builds the workbook with openpyxl through ExcelComposer.
+    NATIVE writes the xlsx package with the standard library through
+    XlsxComposer, streaming each sheet into the zip with the strings shared
+    in the workbook, which is several times faster.
+    """
+    OPENPYXL = 'openpyxl'
+    NATIVE = 'native'
+
+    @classmethod
+    def of(cls, engine) -> 'ExcelEngine':
+        if isinstance(engine, cls):
+            return engine
+        if engine is None or engine == '':
+            return cls.OPENPYXL
+        return cls(str(engine).lower())
+
+
 class OutputFormat(Enum):
     EXCEL = 'excel'
     CSV = 'csv'
     TSV = 'tsv'
+    SQLITE = 'sqlite'
+    JSONL = 'jsonl'
+
+    @classmethod
+    def of(cls, form) -> 'OutputFormat':
+        if isinstance(form, cls):
+            return form
+        return cls(str(form).lower())
 
     @classmethod
-    def build_composer(cls, form) -> Composer:
+    def build_composer(
+            cls,
+            form,
+            excel_mode: ExcelMode | str = ExcelMode.NORMAL,
+            compress: bool = False,
+            native_lists: bool = False,
+            deterministic: bool = False,
+            engine: ExcelEngine | str = ExcelEngine.OPENPYXL,
+            compression_level: int = None,
+    ) -> Composer:
         lower_name = str(form).lower()
         if cls.EXCEL == form or cls.EXCEL.name.lower() == lower_name:
-            return ExcelComposer()
+            if ExcelMode.of(excel_mode) == ExcelMode.INCREMENTAL:
+                from .xlsx_composer import XlsxComposer
+                return XlsxComposer(deterministic=deterministic, compression_level=compression_level)
+            if ExcelEngine.of(engine) == ExcelEngine.NATIVE:
+                from .xlsx_composer import XlsxComposer
+                return XlsxComposer(deterministic=deterministic, use_cache=False, compression_level=compression_level)
+            from .excel_composer import ExcelComposer
+            return ExcelComposer(excel_mode, deterministic=deterministic)
         if cls.CSV == form or cls.CSV.name.lower() == lower_name:
-            return CsvComposer()
+            return CsvComposer(compress=compress)
         if cls.TSV == form or cls.TSV.name.lower() == lower_name:
-            return TsvComposer()
+            return TsvComposer(compress)
+        if cls.SQLITE == form or cls.SQLITE.name.lower() == lower_name:
+            return SqliteComposer()
+        if cls.JSONL == form or cls.JSONL.name.lower() == lower_name:
+            return JsonlComposer(compress, native_lists)
         raise ValueError('Unknown format: ' + str(form))
 
 
-class ExcelComposer(Composer):
-    THIN_BORDER = px.styles.Border(left=px.styles.Side(border_style='thin'),
-                                   right=px.styles.Side(border_style='thin'),
-                                   top=px.styles.Side(border_style='thin'),
-                                   bottom=px.styles.Side(border_style='thin'))
+class CsvComposer(Composer):
+    """Write each document to a CSV file as soon as it is added.
 
-    def __init__(self):
+    The files are written by a pool of threads, so several documents are
+    written at the same time, through large buffers.  Only the titles and
+    summaries are kept until compose writes the summary file.  With compress,
+    the files are gzip compressed, such as "Title.csv.gz".
+
+    The files are written to a temporary directory, created by begin or by
+    the first add_sheet.  compose moves each file to the output directory
+    and removes the files of documents which are gone.
+    """
+    BUFFER_SIZE = 1024 * 1024
+    MAX_THREADS = 4
+
+    def __init__(self, delimiter: str = ',', compress: bool = False, threads: int = None):
         super().__init__()
-        self.workbook = px.Workbook()
+        self.delimiter = delimiter
+        self.extension = 'csv'
+        self.compress = compress
+        self.threads = threads or min(self.MAX_THREADS, os.cpu_count() or 1)
+        self.variables = {}
+        self.summaries = []
+        self.file_names = set()
+        self.dir_path = None
+        self._temporary_dir_path = None
+        self._executor = None
+        self._futures = []
+
+    def dir_name(self, environment, basename) -> str:
+        if environment is None or environment == '':
+            return basename + '_' + self.extension
+        return f'{basename}_{environment}_' + self.extension
+
+    def file_name(self, name: str) -> str:
+        file_name = name + '.' + self.extension
+        return file_name + '.gz' if self.compress else file_name
+
+    def begin(self, directory_path, environment, basename) -> None:
+        self.dir_path = os.path.join(directory_path, 'output', self.dir_name(environment, basename))
+        self._temporary_dir_path = self.dir_path + '.tmp'
+        if os.path.exists(self._temporary_dir_path):
+            shutil.rmtree(self._temporary_dir_path)
+        os.makedirs(self._temporary_dir_path)
+
+    def _open(self, file_name: str):
+        path = os.path.join(self._temporary_dir_path, file_name)
+        if self.compress:
+            # mtime is fixed so that the same input gives the same file
+            return io.TextIOWrapper(gzip.GzipFile(path, 'wb', mtime=0), newline='')
+        return open(path, 'w', newline='', buffering=self.BUFFER_SIZE)
 
     def add_sheet(self, document, column_config, variables, all_conditions, columns, steps):
-        ws = self.workbook.create_sheet(document.title)
-        row_index = 1
-        cell = ws.cell(row=row_index, column=1)
-        cell.value = 'Summary'
-        cell.font = px.styles.Font(bold=True)
-        row_index += 2
-        # write summary lines
-        for summary_line in document.summary_lines:
-            ws.cell(row=row_index, column=1).value = apply_variables(summary_line, variables)
-            row_index += 1
-        row_index += 1
-
-        # write header
-        for column_index, column in enumerate(columns):
-            cell = ws.cell(row=row_index, column=column_index + 1)
-            cell.value = column
-            cell.font = px.styles.Font(bold=True)
-            cell.border = ExcelComposer.THIN_BORDER
-
-            letter = get_column_letter(column_index + 1)
-
-            # arrange column width
-            if column in all_conditions:
-                condition = all_conditions[column]
-                if condition.width:
-                    ws.column_dimensions[letter].width = condition.width
-                cell.alignment = condition.alignment.excel_alignment()
-            else:
-                cell.alignment = Alignment.LEFT.excel_alignment()
-        row_index += 1
-
-        # write steps
+        if self._temporary_dir_path is None:
+            # compose moves the directory to the output
+            import tempfile
+
+            self._temporary_dir_path = tempfile.mkdtemp()
+        if self._executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+
+            self._executor = ThreadPoolExecutor(max_workers=self.threads)
+        template = VariableTemplate.of(variables)
+        file_name = self.file_name(document.title)
+        if file_name in self.file_names:
+            # a document of the same title is written over the earlier one as it was written one by one
+            while self._futures:
+                self._futures.pop(0).result()
+        self.file_names.add(file_name)
+        self.summaries.append([document.title, template.apply("\n".join(document.summary_lines))])
+
+        # keep the documents waiting for a thread from piling up
+        while len(self._futures) >= self.threads * 2:
+            self._futures.pop(0).result()
+        self._futures.append(self._executor.submit(
+            self._write_document, file_name, column_config, template, columns, steps))
+
+    def _write_document(self, file_name, column_config, template, columns, steps) -> None:
         increment_columns = column_config.increment_columns()
+        with self._open(file_name) as csvfile:
+            writer = csv.writer(csvfile, delimiter=self.delimiter)
+            # write header
+            writer.writerow(columns)
+            # write steps
+            rows = []
+            for index, step in enumerate(steps):
+                increment_value = index + 1
+                for column in increment_columns:
+                    step[column] = increment_value
+                rows.append([
+                    template.apply(step[column]) if column in step else None
+                    for column in columns
+                ])
+                if len(rows) >= 1000:
+                    writer.writerows(rows)
+                    rows = []
+            writer.writerows(rows)
 
-        for index, step in enumerate(steps):
-            increment_value = index + 1
-            for column in increment_columns:
-                step[column] = increment_value
+    def compose(self, directory_path, environment, basename) -> None:
+        if self._temporary_dir_path is None:
+            self.begin(directory_path, environment, basename)
+        try:
+            for future in self._futures:
+                future.result()
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown()
+            self._executor = None
+            self._futures = []
+
+        # write summary file, with a name which no document uses
+        if len(self.summaries) > 0:
+            prefix = ''
+            while self.file_name(prefix + 'summary') in self.file_names:
+                prefix += '_'
+            file_name = self.file_name(prefix + 'summary')
+            with self._open(file_name) as csvfile:
+                writer = csv.writer(csvfile, delimiter=self.delimiter)
+                writer.writerows([['title', 'description'], *self.summaries])
 
-            for column_index, column in enumerate(columns):
-                cell = ws.cell(row=row_index, column=column_index + 1)
-                if column in step:
-                    cell.value = apply_variables(step[column], variables)
-                cell.border = ExcelComposer.THIN_BORDER
-                if column in all_conditions:
-                    cell.alignment = all_conditions[column].alignment.excel_alignment()
-                else:
-                    cell.alignment = Alignment.LEFT.excel_alignment()
+        dir_path = os.path.join(directory_path, 'output', self.dir_name(environment, basename))
+        os.makedirs(dir_path, exist_ok=True)
+        file_names = sorted(os.listdir(self._temporary_dir_path))
+        for file_name in file_names:
+            written = self.publish(os.path.join(self._temporary_dir_path, file_name), os.path.join(dir_path, file_name))
+            print('Saved' if written else 'Unchanged', file_name)
+        for file_name in set(os.listdir(dir_path)) - set(file_names):
+            path = os.path.join(dir_path, file_name)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            elif self.outputs is not None:
+                self.outputs.remove(path)
+            else:
+                os.remove(path)
+        shutil.rmtree(self._temporary_dir_path)
+        self._temporary_dir_path = None
 
-            row_index += 1
 
-    def compose(self, directory_path, environment, basename):
-        self.workbook.remove(self.workbook.worksheets[0])
+class TsvComposer(CsvComposer):
+    def __init__(self, compress: bool = False, threads: int = None):
+        super().__init__('\t', compress, threads)
+        self.extension = 'tsv'
 
-        # save Excel file
-        if environment is None or environment == '':
-            filename = basename + '.xlsx'
-        else:
-            filename = f'{basename}_{environment}.xlsx'
-        os.makedirs(os.path.join(directory_path, 'output'), exist_ok=True)
 
-        if len(self.workbook.worksheets) == 0:
-            raise ValueError('There is no valid markdown file.')
+def sql_identifier(name: str, used: set[str]) -> str:
+    """Return a name usable as an SQL identifier, which is not in used.
 
-        self.workbook.save(os.path.join(directory_path, 'output', filename))
-        print('Saved', filename)
-        return self.workbook
+    Characters other than letters, digits and underscores are replaced with
+    underscores, names reserved by SQLite are prefixed with an underscore,
+    and a suffix is added to a name which is already used.
+    The returned name is added to used.
 
+    >>> used = set()
+    >>> sql_identifier('No.', used), sql_identifier('Categories (1)', used), sql_identifier('No', used)
+    ('No', 'Categories_1', 'No_2')
+    >>> sql_identifier('1st step', used), sql_identifier('SQLite master', used)
+    ('_1st_step', '_SQLite_master')
+    """
+    identifier = re.sub(r'\W+', '_', name, flags=re.ASCII).strip('_') or 'column'
+    if identifier[0].isdigit() or identifier.lower().startswith('sqlite_'):
+        identifier = '_' + identifier
+    candidate = identifier
+    number = 1
+    while candidate.lower() in used:
+        number += 1
+        candidate = f'{identifier}_{number}'
+    used.add(candidate.lower())
+    return candidate
+
+
+class SqliteComposer(Composer):
+    """Write the documents to an SQLite database.
+
+    Each document becomes a table whose columns are the sanitized column
+    names.  The "documents" table holds the title, summary and table name of
+    each document, whose table name is NULL if it has no steps, and the
+    "columns" table maps the sanitized column names to the original ones.
+    Rows are inserted with executemany in batches within one transaction,
+    and indexes are created on the columns declared in columns.yml, and on
+    each numbered column of a declared list column, after the rows are
+    loaded.
+
+    The database is written to a temporary file next to the output while
+    the sheets are added, and replaces the output in compose.
+    """
+    BATCH_SIZE = 10000
 
-class CsvComposer(Composer):
-    def __init__(self, delimiter: str = ','):
+    def __init__(self):
         super().__init__()
-        self.documents = []
-        self.delimiter = delimiter
-        self.extension = 'csv'
-        self.variables = {}
+        self.connection = None
+        self.path = None
+        self.table_names = {'documents', 'columns'}
+        self.document_count = 0
 
-    def add_sheet(self, document, column_config, variables, all_conditions, columns, steps):
-        doc = {
-            'title': document.title,
-            'summary_lines': apply_variables("\n".join(document.summary_lines), variables),
-            'columns': columns,
-            'rows': []
-        }
-
-        # write header
-        values = [columns]
+    def begin(self, directory_path, environment, basename) -> None:
+        os.makedirs(os.path.join(directory_path, 'output'), exist_ok=True)
+        self.path = os.path.join(directory_path, 'output', self.filename(environment, basename))
+        temporary_path = self.path + '.tmp'
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        self._connect(temporary_path)
+
+    @staticmethod
+    def filename(environment, basename) -> str:
+        if environment is None or environment == '':
+            return basename + '.sqlite'
+        return f'{basename}_{environment}.sqlite'
+
+    def _connect(self, database: str) -> None:
+        import sqlite3
+
+        self.connection = sqlite3.connect(database, isolation_level=None)
+        # the file replaces the output only when it is complete, so the journal is not needed
+        self.connection.execute('PRAGMA journal_mode = OFF')
+        self.connection.execute('PRAGMA synchronous = OFF')
+        self.connection.execute('BEGIN')
+        self.connection.execute(
+            'CREATE TABLE documents (id INTEGER PRIMARY KEY, title TEXT, summary TEXT,'
+            ' table_name TEXT, file_path TEXT, row_count INTEGER)'
+        )
+        self.connection.execute(
+            'CREATE TABLE columns (table_name TEXT, position INTEGER, column_name TEXT, title TEXT)'
+        )
 
-        # write steps
+    def add_sheet(self, document, column_config, variables, all_conditions, columns, steps):
+        if self.connection is None:
+            # compose copies the database to the output
+            self._connect(':memory:')
+        template = VariableTemplate.of(variables)
+        connection = self.connection
+        if not columns:
+            # a document without steps has no table to create
+            self._insert_document(document, template, None, 0)
+            return
+
+        table_name = sql_identifier(document.title, self.table_names)
+        used = set()
+        column_names = [sql_identifier(column, used) for column in columns]
         increment_columns = column_config.increment_columns()
-
+        definitions = ', '.join(
+            f'"{name}" INTEGER' if column in increment_columns else f'"{name}" TEXT'
+            for column, name in zip(columns, column_names)
+        )
+        connection.execute(f'CREATE TABLE "{table_name}" ({definitions})')
+        connection.executemany(
+            'INSERT INTO columns VALUES (?, ?, ?, ?)',
+            [(table_name, position, name, column) for position, (column, name) in enumerate(zip(columns, column_names))]
+        )
+
+        insert = f'INSERT INTO "{table_name}" VALUES ({", ".join("?" * len(columns))})'
+        row_count = 0
+        rows = []
         for index, step in enumerate(steps):
             increment_value = index + 1
             for column in increment_columns:
                 step[column] = increment_value
-            values.append(
-                [
-                    apply_variables(step[column], variables) if column in step else None
-                    for column in columns
-                ]
+            rows.append([
+                template.apply(step[column]) if column in step else None
+                for column in columns
+            ])
+            if len(rows) >= self.BATCH_SIZE:
+                connection.executemany(insert, rows)
+                row_count += len(rows)
+                rows = []
+        if rows:
+            connection.executemany(insert, rows)
+            row_count += len(rows)
+
+        declared = set(all_conditions)
+        if column_config.declared_columns:
+            declared.update(column_config.declared_columns)
+        # the numbered columns of a list column are declared by the list column
+        list_columns = {
+            f'{column} ({i + 1})': column
+            for column in column_config.list_columns()
+            for i in range(len(columns))
+        }
+        for column, name in zip(columns, column_names):
+            if column in declared or list_columns.get(column) in declared:
+                index_name = sql_identifier(f'{table_name}_{name}', self.table_names)
+                connection.execute(f'CREATE INDEX "{index_name}" ON "{table_name}" ("{name}")')
+        self._insert_document(document, template, table_name, row_count)
+
+    def _insert_document(self, document, template, table_name: str | None, row_count: int) -> None:
+        self.document_count += 1
+        self.connection.execute(
+            'INSERT INTO documents VALUES (?, ?, ?, ?, ?, ?)',
+            (
+                self.document_count, template.apply(document.title),
+                template.apply("\n".join(document.summary_lines)),
+                table_name, document.file_path, row_count,
             )
+        )
 
-        doc['rows'] = values
-        self.documents.append(doc)
+    def compose(self, directory_path, environment, basename):
+        if self.connection is None:
+            self.begin(directory_path, environment, basename)
+        self.connection.execute('COMMIT')
+        filename = self.filename(environment, basename)
+        path = os.path.join(directory_path, 'output', filename)
+        if self.path == path:
+            self.connection.close()
+        else:
+            os.makedirs(os.path.join(directory_path, 'output'), exist_ok=True)
+            if os.path.exists(path + '.tmp'):
+                os.remove(path + '.tmp')
+            import sqlite3
+
+            with sqlite3.connect(path + '.tmp') as destination:
+                self.connection.backup(destination)
+            destination.close()
+            self.connection.close()
+        self.connection = None
+        written = self.publish(path + '.tmp', path)
+        print('Saved' if written else 'Unchanged', filename)
+        return path
+
+
+class JsonlComposer(Composer):
+    """Write each row as a JSON object on a line as soon as it is added.
+
+    A line holds the document title, the row number and the values of the
+    row.  With native_lists, the numbered columns of a list column such as
+    "Categories (1)" and "Categories (2)" are written as one array
+    "Categories".  No document is kept in memory.  With compress, the
+    output is gzip compressed.
+    """
+    BUFFER_LINES = 1000
 
-    def compose(self, directory_path, environment, basename) -> None:
+    def __init__(self, compress: bool = False, native_lists: bool = False):
+        super().__init__()
+        self.compress = compress
+        self.native_lists = native_lists
+        self.path = None
+        self.file = None
+        self.stream = None
+
+    def filename(self, environment, basename) -> str:
         if environment is None or environment == '':
-            dir_name = basename + '_' + self.extension
+            filename = basename + '.jsonl'
         else:
-            dir_name = f'{basename}_{environment}_' + self.extension
+            filename = f'{basename}_{environment}.jsonl'
+        return filename + '.gz' if self.compress else filename
 
-        dir_path = os.path.join(directory_path, 'output', dir_name)
-        if os.path.exists(dir_path) and os.path.isdir(dir_path):
-            shutil.rmtree(dir_path)
-        os.makedirs(dir_path, exist_ok=True)
+    def begin(self, directory_path, environment, basename) -> None:
+        os.makedirs(os.path.join(directory_path, 'output'), exist_ok=True)
+        self.path = os.path.join(directory_path, 'output', self.filename(environment, basename))
+        self._open(open(self.path + '.tmp', 'wb', buffering=1024 * 1024))
 
-        values = [['title', 'description']]
-        for doc in self.documents:
-            file_name = doc['title'] + '.' + self.extension
-            file_path = os.path.join(dir_path, file_name)
-            with open(file_path, 'w', newline='') as csvfile:
-                writer = csv.writer(csvfile, delimiter=self.delimiter)
-                writer.writerows(doc['rows'])
-                print('Saved', file_name)
-            values.append([doc['title'], doc['summary_lines']])
+    def _open(self, file) -> None:
+        self.file = file
+        # mtime is fixed so that the same input gives the same file
+        self.stream = gzip.GzipFile(filename='', mode='wb', fileobj=file, mtime=0) if self.compress else file
 
-        # write summary file
-        if len(values) > 1:
-            prefix = ''
-            while True:
-                file_name = prefix + 'summary.' + self.extension
-                summary_file_path = os.path.join(dir_path, file_name)
-                if os.path.exists(summary_file_path):
-                    prefix += '_'
-                    if len(prefix) > 10:
-                        logging.warning('Too many summary files. Can\'t write the summary')
-                break
-
-            with open(os.path.join(dir_path, 'summary.' + self.extension), 'w', newline='') as csvfile:
-                writer = csv.writer(csvfile, delimiter=self.delimiter)
-                writer.writerows(values)
-                print('Saved', 'summary.' + self.extension)
+    def add_sheet(self, document, column_config, variables, all_conditions, columns, steps):
+        if self.file is None:
+            # compose copies the file to the output
+            import tempfile
 
+            self._open(tempfile.TemporaryFile())
+        template = VariableTemplate.of(variables)
+        increment_columns = column_config.increment_columns()
 
-class TsvComposer(CsvComposer):
-    def __init__(self):
-        super().__init__('\t')
-        self.extension = 'tsv'
+        # name of each value, and numbered columns of the value if it is a list
+        fields = [(column, None) for column in columns]
+        if self.native_lists:
+            numbered_columns = {
+                f'{column} ({i + 1})': column
+                for column in column_config.list_columns()
+                for i in range(len(columns))
+            }
+            fields = []
+            groups = {}
+            for column in columns:
+                name = numbered_columns.get(column)
+                if name is None:
+                    fields.append((column, None))
+                elif name in groups:
+                    groups[name].append(column)
+                else:
+                    groups[name] = [column]
+                    fields.append((name, groups[name]))
+
+        title = template.apply(document.title)
+        lines = []
+        for index, step in enumerate(steps):
+            increment_value = index + 1
+            for column in increment_columns:
+                step[column] = increment_value
+            values = {}
+            for name, group in fields:
+                if group is None:
+                    values[name] = template.apply(step[name]) if name in step else None
+                else:
+                    values[name] = [template.apply(step[column]) for column in group if column in step]
+            lines.append(json.dumps({'document': title, 'row': index + 1, 'values': values}, ensure_ascii=False))
+            if len(lines) >= self.BUFFER_LINES:
+                self._write(lines)
+                lines = []
+        if lines:
+            self._write(lines)
+
+    def _write(self, lines: list[str]) -> None:
+        self.stream.write(('\n'.join(lines) + '\n').encode('utf-8'))
+
+    def compose(self, directory_path, environment, basename):
+        if self.file is None:
+            self.begin(directory_path, environment, basename)
+        if self.stream is not self.file:
+            self.stream.close()
+        filename = self.filename(environment, basename)
+        path = os.path.join(directory_path, 'output', filename)
+        if self.path == path:
+            self.file.close()
+        else:
+            os.makedirs(os.path.join(directory_path, 'output'), exist_ok=True)
+            self.file.seek(0)
+            with open(path + '.tmp', 'wb') as f:
+                shutil.copyfileobj(self.file, f)
+            self.file.close()
+        self.file = None
+        self.stream = None
+        written = self.publish(path + '.tmp', path)
+        print('Saved' if written else 'Unchanged', filename)
+        return path
@@ -1,10 +1,18 @@
-import functools
 import glob
 import os
 import re
+import shutil
+from contextlib import nullcontext
 
+from .cache import ParseCache, file_fingerprint
 from .column_config import ColumnConfig, ValueType, Document
-from .composer import OutputFormat
+from .composer import ExcelEngine, ExcelMode, OutputFormat
+from .output import OutputFiles
+from .normalizer import collect_columns, iter_normalized_steps, normalize_steps, output_columns
+from .parser import MarkdownListParser
+from .profiler import measure, timed_variables
+from .scanner import parse_file_in_chunks
+from .variables import VariableTemplate
 
 COLUMN_CONFIG_PATHS = [
     'columns.yml',
@@ -75,212 +83,517 @@ def read_ignore_file(directory_path) -> list[str]:
     return []
 
 
-def trim_blank_lines(lines: list[str]) -> list[str]:
-    """Remove blank lines from front and back of lines.
+def filter_ignored_files(directory_path, target_files: list[str]) -> list[str]:
+    """Remove the files listed in the ignore file.
 
-    :param lines: list of lines
-    :return: list of lines
-
-    >>> trim_blank_lines([' ', '', 'a', '', 'b', 'c', '', ' ', ''])
-    ['a', '', 'b', 'c']
+    :param directory_path: path to the directory which holds config files
+    :param target_files: paths to the markdown files
+    :return: paths to the markdown files which are not ignored
     """
-    # remove front blank lines
-    blank_count = 0
-    for i in range(len(lines)):
-        if re.match(r"^\s*$", lines[i]):
-            blank_count += 1
-        else:
-            break
-    lines = lines[blank_count:]
-    # remove back blank lines
-    blank_count = 0
-    for i in range(1, len(lines) + 1):
-        if re.match(r"^\s*$", lines[-i]):
-            blank_count += 1
-        else:
-            break
-    if blank_count > 0:
-        lines = lines[:-blank_count]
-    return lines
-
-
-class StepItem:
-    def __init__(self, title: str = None, step_type: ValueType = ValueType.STRING):
-        self.title = title
-        self.type = step_type
-        self.content_lines = []
-        self.content_items = []
-
-    def add_content_line(self, content) -> 'StepItem':
-        if self.type == ValueType.STRING:
-            if len(self.content_lines) == 0 and re.match(r'^\s*$', content):
-                return self
-            self.content_lines.append(content)
-        elif self.type == ValueType.LIST:
-            if len(self.content_items) == 0 and re.match(r'^\s*$', content):
-                return self
-            self.content_items.append(re.sub(r'^\s*\*\s*', '', content))
-        return self
-
-    def get_content(self) -> str | list:
-        if self.type == ValueType.STRING:
-            self.content_lines = trim_blank_lines(self.content_lines)
-            return "\n".join(self.content_lines)
-        if self.type == ValueType.LIST:
-            self.content_items = trim_blank_lines(self.content_items)
-            return self.content_items
-        raise ValueError(f'Type {self.type} does not provide content.')
-
-
-def convert(directory_path, environment: str = None, format: OutputFormat = OutputFormat.EXCEL):
-    target_files = sorted(glob.glob(os.path.join(directory_path, '*.md')))
-    if len(target_files) == 0:
-        print(f'No markdown files found in {directory_path}')
-        return
+    ignore_file_names = [name for name in read_ignore_file(directory_path) if name != '']
+    return [path for path in target_files if os.path.basename(path) not in ignore_file_names]
 
-    # load column config
-    column_config = read_column_config(directory_path)
-    list_columns = column_config.list_columns()
 
-    # load variables from ini
-    variables = read_variables(directory_path, environment)
+def parse_document(scenario_file, column_config: ColumnConfig):
+    """Parse a markdown file into a document and its normalized steps.
 
-    ignore_file_path = os.path.join(directory_path, 'config', IGNORE_FILE_PATH)
-    ignore_file_names = []
-    if os.path.exists(ignore_file_path):
-        with open(ignore_file_path, 'r') as f:
-            ignore_file_names =\
-                list(filter(lambda x: x != '', map(lambda x: x.strip(), f.readlines())))
-
-    composer = OutputFormat.build_composer(format)
+    This is the per-file work of a build.  It depends only on the file and
+    the column config, so it can run in a worker process.
 
-    # compose output
-    for scenario_file in target_files:
-        if os.path.basename(scenario_file) in ignore_file_names:
+    :param scenario_file: path to the markdown file
+    :param column_config: column config of the directory
+    :return: tuple of document, columns and steps, or None if the file has no summary
+    """
+    file_name = os.path.basename(scenario_file)
+    # the lines are parsed as they are read, so reading is part of the parse stage
+    with measure('parse', file_name):
+        document = MarkdownListParser(column_config).parse_file(scenario_file)
+    if document is None:
+        return None
+    with measure('normalize', file_name):
+        columns, steps = normalize_steps(document.steps, column_config)
+    document.steps = steps
+    return document, columns, steps
+
+
+def parse_document_in_chunks(scenario_file, column_config: ColumnConfig, executor, workers: int):
+    """Parse a large markdown file in chunks in a process pool, and normalize its steps.
+
+    :param scenario_file: path to the markdown file
+    :param column_config: column config of the directory
+    :param executor: process pool
+    :param workers: number of processes of the pool
+    :return: the same as parse_document
+    """
+    file_name = os.path.basename(scenario_file)
+    with measure('parse chunks', file_name):
+        document = parse_file_in_chunks(scenario_file, column_config, executor, workers)
+    if document is None:
+        return None
+    with measure('normalize', file_name):
+        columns, steps = normalize_steps(document.steps, column_config)
+    document.steps = steps
+    return document, columns, steps
+
+
+def stream_document(scenario_file, column_config: ColumnConfig):
+    """Parse a markdown file lazily, holding only one step in memory at a time.
+
+    The columns come from the schema declared in the column config, or from
+    a first pass over the file which keeps no steps.  The steps are read in
+    a second pass while the composer consumes them.
+
+    :param scenario_file: path to the markdown file
+    :param column_config: column config of the directory
+    :return: tuple of document, columns and iterator of steps, or None if the file has no summary
+    """
+    parser = MarkdownListParser(column_config)
+    schema = column_config.declared_schema()
+    with open(scenario_file, encoding="utf-8") as f:
+        lines = iter(f)
+        document = parser.read_header(lines, scenario_file)
+        if document is None:
+            return None
+        if schema is None:
+            schema = collect_columns(parser.iter_steps(lines), column_config)
+    columns = output_columns(*schema, column_config)
+    return document, columns, iter_normalized_steps(parser.iter_file_steps(scenario_file), column_config)
+
+
+def parse_documents(
+        target_files: list[str],
+        column_config: ColumnConfig,
+        jobs: int = 1,
+        cache: ParseCache = None,
+        executor=None,
+        split_size: int = 0,
+) -> list:
+    """Parse markdown files, in a process pool unless jobs is 1.
+
+    A file larger than split_size bytes is split into chunks which are
+    parsed in the pool, so that a huge file uses all the processes too.
+
+    :param target_files: paths to the markdown files
+    :param column_config: column config of the directory
+    :param jobs: number of worker processes, 0 for the number of CPUs
+    :param cache: cache to load unchanged files from and store parsed files to
+    :param executor: pool shared with other builds to parse the files in, instead of a pool of jobs processes
+    :param split_size: size in bytes of the files to parse in chunks, 0 to parse every file as a whole
+    :return: results of parse_document in the order of target_files
+    """
+    results = [None] * len(target_files)
+    keys = {}
+    missing = []
+    for index, path in enumerate(target_files):
+        if cache is None:
+            missing.append(index)
             continue
+        with measure('cache', os.path.basename(path)):
+            keys[index] = cache.key(path)
+            try:
+                results[index] = cache.load(keys[index])
+            except KeyError:
+                missing.append(index)
+
+    missing_files = [target_files[index] for index in missing]
+    split_files = []
+    whole_files = []
+    for path in missing_files:
+        (split_files if split_size and os.path.getsize(path) > split_size else whole_files).append(path)
+    if executor is None and (jobs == 1 or (len(whole_files) < 2 and not split_files)):
+        parsed = {path: parse_document(path, column_config) for path in missing_files}
+    else:
+        # imported only when a pool is used, since multiprocessing takes long to import
+        from concurrent.futures import ProcessPoolExecutor
+
+        workers = jobs or os.cpu_count() or 1
+        pool = nullcontext(executor) if executor is not None else ProcessPoolExecutor(max_workers=workers)
+        with pool as pool:
+            with measure('parse files'):
+                parsed = dict(zip(whole_files, pool.map(
+                    parse_document,
+                    whole_files,
+                    [column_config] * len(whole_files),
+                    chunksize=max(1, len(whole_files) // (workers * 4)),
+                )))
+            for path in split_files:
+                parsed[path] = parse_document_in_chunks(path, column_config, pool, workers)
+
+    for index in missing:
+        result = parsed[target_files[index]]
+        results[index] = result
+        if cache is not None:
+            cache.store(keys[index], result)
+    return results
+
+
+def split_environments(environment: str = None) -> list[str | None]:
+    """Split a comma separated list of environments.
+
+    :param environment: environment signature such as "dev", or a list such as "dev,stg,prod"
+    :return: list of environments, where None stands for the build without environment
+
+    >>> split_environments('dev, stg,prod')
+    ['dev', 'stg', 'prod']
+    >>> split_environments(None)
+    [None]
+    >>> split_environments(',dev')
+    [None, 'dev']
+    """
+    if environment is None or environment == '':
+        return [None]
+    return [name.strip() or None for name in environment.split(',')]
+
+
+def build_output(
+        directory_path,
+        environment: str | None,
+        format: OutputFormat,
+        excel_mode: ExcelMode,
+        column_config: ColumnConfig,
+        parsed_documents,
+        compress: bool = False,
+        native_lists: bool = False,
+        output_directory=None,
+        deterministic: bool = False,
+        engine: ExcelEngine = ExcelEngine.OPENPYXL,
+        compression_level: int = None,
+):
+    """Compose parsed documents into the output of an environment.
+
+    An output whose content is the same as the last build is not written
+    again.  The outputs written and left unchanged are reported.
+
+    :param directory_path: path to the directory which holds markdown files
+    :param environment: environment signature such as "dev" or "test"
+    :param format: output format
+    :param excel_mode: mode of the Excel composer
+    :param column_config: column config of the directory
+    :param parsed_documents: results of parse_document or stream_document in the order of the sheets
+    :param compress: gzip the output of the formats which support it
+    :param native_lists: write list columns as arrays in the formats which support it
+    :param output_directory: directory to write the "output" directory in instead of directory_path
+    :param deterministic: write the same bytes for the same documents in the formats which embed timestamps
+    :param engine: library which writes Excel workbooks
+    :param compression_level: zlib compression level of the workbooks of the native engine, None for the default
+    :return: result of the composer
+    """
+    # load variables from ini
+    variables = VariableTemplate(read_variables(directory_path, environment))
 
-        document = Document(os.path.abspath(scenario_file), variables)
-        # add Excel sheet
-        with open(scenario_file, encoding="utf-8") as f:
-            # set name
-            document.title = os.path.basename(scenario_file)
-            while True:
-                line = f.readline()
-
-                if not line:
-                    break
-
-                result = re.match(r'^#[^#]\s*(\S.*)\s*$', line.rstrip())
-                if result:
-                    document.title = result.group(1)
-                    break
-
-            # set summary
-            has_summary = False
-            while True:
-                line = f.readline()
-
-                if not line:
-                    break
-
-                result = re.match(r'^##\s*Summary\s*$', line)
-                if not result:
-                    continue
-                has_summary = True
-                break
-
-            if not has_summary:
-                continue
+    composer = OutputFormat.build_composer(
+        format, excel_mode, compress, native_lists, deterministic, engine, compression_level)
+    all_conditions = column_config.all_conditions()
+    basename = os.path.basename(os.path.abspath(directory_path))
+    output_directory = output_directory or directory_path
+    composer.outputs = OutputFiles(os.path.join(output_directory, 'output'), environment)
+    composer.begin(output_directory, environment, basename)
 
-            # read summary lines
-            summary_lines = []
-            while True:
-                line = f.readline()
-                if re.match(r'^##\s*(List|Steps|Rows)\s*$', line):
-                    break
-                summary_lines.append(line.rstrip())
-            document.summary_lines = trim_blank_lines(summary_lines)
-
-            # read steps
-            steps = []
-            step_dict = {}
-            item = None
-            while True:
-                line = f.readline()
-
-                if not line:
-                    if item:
-                        step_dict[item.title] = item.get_content()
-                    if len(step_dict) > 0:
-                        steps.append(step_dict)
-                    break
-
-                if re.match(r'^\s*---\s*$', line):
-                    if item:
-                        step_dict[item.title] = item.get_content()
-                        item = None
-                    if len(step_dict) > 0:
-                        steps.append(step_dict)
-                        step_dict = {}
-                    continue
-
-                result = re.match(r'^#{3,}\s*(\S.*\S|\S)\s*$', line)
-                if result:
-                    if item:
-                        step_dict[item.title] = item.get_content()
-                    title = result.group(1)
-                    if not column_config.overwrite_for_repeat:
-                        if title in step_dict:
-                            steps.append(step_dict)
-                            step_dict = {}
-                    item = StepItem(
-                        title,
-                        column_config.type_of(title)
-                    )
-                    continue
-
-                if item:
-                    item.add_content_line(line.rstrip())
-
-        all_conditions = column_config.all_conditions()
-
-        # update steps
-        columns = functools.reduce(lambda x, y: x + [z for z in y if z not in x], map(lambda x: x.keys(), steps), [])
-        # Copy the previous column value if the step doesn't have the column
-        for index, step in enumerate(steps):
-            step.update({
-                k: v for k, v in steps[index - 1].items() \
-                    if k not in step and (k not in all_conditions or all_conditions[k].duplicate_previous_for_blank)
-            })
-        for column in list_columns:
-            if column in columns:
-                index = columns.index(column)
-                count = functools.reduce(max, map(lambda x: len(x[column]) if column in x else 0, steps), 0)
-                # add numbered column
-                for i in range(count - 1, -1, -1):
-                    columns.insert(index + 1, f'{column} ({i + 1})')
-
-                # split list column
-                for index, step in enumerate(steps):
-                    if column in step:
-                        for i in range(len(step[column])):
-                            step[f'{column} ({i + 1})'] = step[column][i]
-                        del step[column]
-                # remove original column
-                columns.remove(column)
-
-        for column_index, column in enumerate(column_config.prepend_columns.items()):
-            columns.insert(column_index, column[0])
-
-        for column in column_config.append_columns:
-            columns.append(column)
+    # compose output in the order of the files
+    for parsed in parsed_documents:
+        if parsed is None:
+            continue
+        document, columns, steps = parsed
 
         # add sheet
-        composer.add_sheet(document, column_config, variables, all_conditions, columns, steps)
+        with measure('sheet', document.title):
+            composer.add_sheet(
+                document, column_config, timed_variables(variables, document.title), all_conditions, columns, steps)
+
+    with measure('save', f'{basename}_{environment}' if environment else basename):
+        result = composer.compose(output_directory, environment, basename)
+    composer.outputs.save()
+    print(composer.outputs.report())
+    return result
+
+
+def _build_output_in_worker(*args) -> None:
+    build_output(*args)
+
+
+def build_workbook(
+        directory_path,
+        environment: str | None,
+        excel_mode: ExcelMode,
+        column_config: ColumnConfig,
+        parsed_documents,
+        path,
+        deterministic: bool = False,
+        engine: ExcelEngine = ExcelEngine.OPENPYXL,
+        compression_level: int = None,
+) -> list[tuple]:
+    """Write parsed documents to a workbook of their own.
+
+    :param directory_path: path to the directory which holds markdown files
+    :param environment: environment signature such as "dev" or "test"
+    :param excel_mode: mode of the Excel composer
+    :param column_config: column config of the directory
+    :param parsed_documents: results of parse_document or stream_document
+    :param path: path to the workbook
+    :param deterministic: write fixed document properties and zip timestamps
+    :param engine: library which writes Excel workbooks
+    :param compression_level: zlib compression level of the workbooks of the native engine, None for the default
+    :return: title, sheet title and row count of each sheet
+    """
+    variables = VariableTemplate(read_variables(directory_path, environment))
+    if ExcelEngine.of(engine) == ExcelEngine.NATIVE:
+        from .xlsx_composer import XlsxComposer
+
+        composer = XlsxComposer(deterministic=deterministic, use_cache=False, compression_level=compression_level)
+    else:
+        from .excel_composer import ExcelComposer
+
+        composer = ExcelComposer(excel_mode, deterministic=deterministic)
+    all_conditions = column_config.all_conditions()
+    for parsed in parsed_documents:
+        if parsed is None:
+            continue
+        document, columns, steps = parsed
+        with measure('sheet', document.title):
+            composer.add_sheet(
+                document, column_config, timed_variables(variables, document.title), all_conditions, columns, steps)
+    with measure('save', os.path.basename(path)):
+        composer.save(path)
+    return composer.sheets
 
+
+def write_index_workbook(path, entries: list[tuple], deterministic: bool = False) -> None:
+    """Write a workbook which lists the sheets of other workbooks with links to them.
+
+    :param path: path to the index workbook
+    :param entries: tuples of workbook file name, title, sheet title and row count
+    :param deterministic: write fixed document properties and zip timestamps
+    """
+    import openpyxl as px
+    from .excel_composer import save_workbook
+    from .styles import StyleRegistry, styled_cell
+
+    workbook = px.Workbook()
+    ws = workbook.active
+    ws.title = 'Index'
+    styles = StyleRegistry(workbook)
+    header = styles.style_array('header')
+    cell = styles.style_array('cell')
+    ws.append([styled_cell(ws, value, header) for value in ['Title', 'Sheet', 'Rows', 'Workbook']])
+    for row, (file_name, title, sheet, count) in enumerate(entries, 2):
+        ws.append([styled_cell(ws, value, cell) for value in [title, sheet, count, file_name]])
+        # quotes in a sheet name are doubled in a reference
+        quoted_sheet = sheet.replace("'", "''")
+        ws.cell(row=row, column=2).hyperlink = f"{file_name}#'{quoted_sheet}'!A1"
+    for letter, width in zip('ABCD', [40, 40, 10, 40]):
+        ws.column_dimensions[letter].width = width
+    save_workbook(workbook, path, deterministic)
+
+
+def build_workbooks(
+        directory_path,
+        environment: str | None,
+        excel_mode: ExcelMode,
+        column_config: ColumnConfig,
+        target_files: list[str],
+        parsed_documents: list,
+        files_per_workbook: int,
+        jobs: int = 1,
+        deterministic: bool = False,
+        engine: ExcelEngine = ExcelEngine.OPENPYXL,
+        compression_level: int = None,
+) -> str:
+    """Write a workbook per group of markdown files and an index workbook.
+
+    The workbooks are written to output/<basename>[_<environment>]_xlsx.  A
+    workbook of one file is named after the markdown file, and a workbook of
+    several files is numbered.  The workbooks are written in worker processes
+    unless jobs is 1.  A workbook whose content is the same as the last build
+    is not written again.
+
+    :param directory_path: path to the directory which holds markdown files
+    :param environment: environment signature such as "dev" or "test"
+    :param excel_mode: mode of the Excel composer
+    :param column_config: column config of the directory
+    :param target_files: paths to the markdown files
+    :param parsed_documents: results of parse_document or stream_document in the order of target_files
+    :param files_per_workbook: number of markdown files per workbook
+    :param jobs: number of worker processes, 0 for the number of CPUs
+    :param deterministic: write fixed document properties and zip timestamps
+    :param engine: library which writes Excel workbooks
+    :param compression_level: zlib compression level of the workbooks of the native engine, None for the default
+    :return: path to the output directory
+    """
     basename = os.path.basename(os.path.abspath(directory_path))
+    dir_name = f'{basename}_{environment}_xlsx' if environment else f'{basename}_xlsx'
+    dir_path = os.path.join(directory_path, 'output', dir_name)
+    temporary_dir_path = dir_path + '.tmp'
+    if os.path.exists(temporary_dir_path):
+        shutil.rmtree(temporary_dir_path)
+    os.makedirs(temporary_dir_path)
+
+    groups = []
+    for start in range(0, len(target_files), files_per_workbook):
+        if files_per_workbook == 1:
+            file_name = os.path.splitext(os.path.basename(target_files[start]))[0] + '.xlsx'
+        else:
+            file_name = f'{basename}_{start // files_per_workbook + 1}.xlsx'
+        documents = [parsed for parsed in parsed_documents[start:start + files_per_workbook] if parsed is not None]
+        if documents:
+            groups.append((file_name, documents))
+
+    arguments = [
+        (directory_path, environment, excel_mode, column_config, documents,
+         os.path.join(temporary_dir_path, file_name), deterministic, engine, compression_level)
+        for file_name, documents in groups
+    ]
+    if jobs == 1 or len(groups) < 2:
+        sheets = [build_workbook(*args) for args in arguments]
+    else:
+        workers = min(jobs or os.cpu_count() or 1, len(groups))
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            sheets = list(executor.map(build_workbook, *zip(*arguments)))
+
+    index_name = 'index.xlsx'
+    while index_name in [file_name for file_name, _ in groups]:
+        index_name = '_' + index_name
+    write_index_workbook(os.path.join(temporary_dir_path, index_name), [
+        (file_name, *sheet) for (file_name, _), workbook_sheets in zip(groups, sheets) for sheet in workbook_sheets
+    ], deterministic)
+
+    outputs = OutputFiles(os.path.join(directory_path, 'output'), environment)
+    os.makedirs(dir_path, exist_ok=True)
+    file_names = [file_name for file_name, _ in groups] + [index_name]
+    for file_name in file_names:
+        written = outputs.publish(os.path.join(temporary_dir_path, file_name), os.path.join(dir_path, file_name))
+        print('Saved' if written else 'Unchanged', file_name)
+    for file_name in set(os.listdir(dir_path)) - set(file_names):
+        path = os.path.join(dir_path, file_name)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            outputs.remove(path)
+    shutil.rmtree(temporary_dir_path)
+    outputs.save()
+    print(outputs.report())
+    return dir_path
+
+
+def convert(
+        directory_path,
+        environment: str = None,
+        format: OutputFormat = OutputFormat.EXCEL,
+        excel_mode: ExcelMode = ExcelMode.NORMAL,
+        jobs: int = 1,
+        use_cache: bool = True,
+        streaming: bool = False,
+        compress: bool = False,
+        native_lists: bool = False,
+        files_per_workbook: int = 0,
+        deterministic: bool = False,
+        split_size: int = 0,
+        engine: ExcelEngine = ExcelEngine.OPENPYXL,
+        compression_level: int = None,
+):
+    """Build the output of a directory.
+
+    Several environments can be given as a comma separated list such as
+    "dev,stg,prod".  Then the markdown files are parsed once and an output
+    is written for each environment, in worker processes unless jobs is 1.
+
+    :param directory_path: path to the directory which holds markdown files
+    :param environment: environment signature, or comma separated environment signatures
+    :param format: output format
+    :param excel_mode: mode of the Excel composer
+    :param jobs: number of worker processes, 0 for the number of CPUs
+    :param use_cache: load unchanged markdown files from the parse cache
+    :param streaming: read the steps of each markdown file as a stream
+    :param compress: gzip the output of the formats which support it
+    :param native_lists: write list columns as arrays in the formats which support it
+    :param files_per_workbook: write a workbook per this number of markdown files and an index
+        workbook instead of one workbook, 0 for one workbook
+    :param deterministic: write the same bytes for the same documents in the formats which embed timestamps
+    :param split_size: size in bytes of the markdown files to parse in chunks in parallel, 0 for none
+    :param engine: library which writes Excel workbooks
+    :param compression_level: zlib compression level of the workbooks of the native engine, None for the default
+    :return: result of the composer, or list of them for several environments
+        (None for the outputs written in worker processes)
+    """
+    target_files = sorted(glob.glob(os.path.join(directory_path, '*.md')))
+    if len(target_files) == 0:
+        print(f'No markdown files found in {directory_path}')
+        return
+
+    environments = split_environments(environment)
+
+    # load column config
+    column_config = read_column_config(directory_path)
 
-    return composer.compose(directory_path, environment, basename)
+    target_files = filter_ignored_files(directory_path, target_files)
+
+    if files_per_workbook and OutputFormat.of(format) != OutputFormat.EXCEL:
+        raise ValueError('Workbooks per file are only written in the Excel format.')
+
+    if streaming:
+        # a stream is consumed by one output, so each environment reads the files again
+        results = []
+        for name in environments:
+            if files_per_workbook:
+                # streams can not be sent to worker processes
+                parsed_documents = [stream_document(path, column_config) for path in target_files]
+                results.append(build_workbooks(
+                    directory_path, name, excel_mode, column_config, target_files, parsed_documents,
+                    files_per_workbook, deterministic=deterministic, engine=engine,
+                    compression_level=compression_level))
+                continue
+            parsed_documents = (stream_document(path, column_config) for path in target_files)
+            results.append(build_output(
+                directory_path, name, format, excel_mode, column_config, parsed_documents, compress, native_lists,
+                deterministic=deterministic, engine=engine, compression_level=compression_level))
+        return results[0] if len(environments) == 1 else results
+
+    cache = None
+    if use_cache:
+        cache = ParseCache(
+            directory_path,
+            file_fingerprint([os.path.join(directory_path, 'config', path) for path in COLUMN_CONFIG_PATHS]),
+        )
+    parsed_documents = parse_documents(target_files, column_config, jobs, cache, split_size=split_size)
+    if cache is not None:
+        cache.evict()
+        print(cache.stats())
+
+    if files_per_workbook:
+        results = [
+            build_workbooks(
+                directory_path, name, excel_mode, column_config, target_files, parsed_documents,
+                files_per_workbook, jobs, deterministic, engine, compression_level)
+            for name in environments
+        ]
+        return results[0] if len(environments) == 1 else results
+
+    if len(environments) == 1:
+        return build_output(
+            directory_path, environments[0], format, excel_mode, column_config, parsed_documents,
+            compress, native_lists, deterministic=deterministic, engine=engine,
+            compression_level=compression_level)
+    if jobs == 1:
+        return [
+            build_output(
+                directory_path, name, format, excel_mode, column_config, parsed_documents, compress, native_lists,
+                deterministic=deterministic, engine=engine, compression_level=compression_level)
+            for name in environments
+        ]
+    from concurrent.futures import ProcessPoolExecutor
+
+    workers = min(jobs or os.cpu_count() or 1, len(environments))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(
+                _build_output_in_worker,
+                directory_path, name, format, excel_mode, column_config, parsed_documents,
+                compress, native_lists, None, deterministic, engine, compression_level,
+            )
+            for name in environments
+        ]
+        return [future.result() for future in futures]
 
 
 def is_none_or_blank_string(value):
@@ -0,0 +1,171 @@
+import os
+import zipfile
+
+import openpyxl as px
+from openpyxl.utils.cell import get_column_letter
+from openpyxl.writer.excel import ExcelWriter
+
+from .composer import Composer, ExcelMode
+from .styles import StyleRegistry, THIN_BORDER, styled_cell
+from .variables import VariableTemplate
+from .xlsx_writer import FIXED_DATETIME, numbered_title
+
+# Zip entries of deterministic workbooks carry this instead of the time of the build.
+FIXED_ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+
+class DeterministicZipFile(zipfile.ZipFile):
+    """ZipFile whose entries have a fixed timestamp and permissions."""
+
+    def _info(self, name: str) -> zipfile.ZipInfo:
+        info = zipfile.ZipInfo(name, date_time=FIXED_ZIP_DATE_TIME)
+        info.compress_type = self.compression
+        info.external_attr = 0o600 << 16
+        return info
+
+    def writestr(self, zinfo_or_arcname, data, compress_type=None, compresslevel=None):
+        if not isinstance(zinfo_or_arcname, zipfile.ZipInfo):
+            zinfo_or_arcname = self._info(zinfo_or_arcname)
+        super().writestr(zinfo_or_arcname, data, compress_type, compresslevel)
+
+    def write(self, filename, arcname=None, compress_type=None, compresslevel=None):
+        info = self._info(arcname or os.path.basename(filename))
+        if compress_type is not None:
+            info.compress_type = compress_type
+        with open(filename, 'rb') as source, self.open(info, 'w', force_zip64=True) as destination:
+            while True:
+                chunk = source.read(1024 * 1024)
+                if not chunk:
+                    break
+                destination.write(chunk)
+
+
+def save_workbook(workbook, path, deterministic: bool = False) -> None:
+    """Save an openpyxl workbook.
+
+    :param workbook: workbook to save
+    :param path: path to the file
+    :param deterministic: write fixed document properties and zip timestamps,
+        so that the same workbook always gives the same bytes
+    """
+    if not deterministic:
+        workbook.save(path)
+        return
+    if workbook.write_only and not workbook.worksheets:
+        workbook.create_sheet()
+    workbook.properties.created = FIXED_DATETIME
+    workbook.properties.modified = FIXED_DATETIME
+    with DeterministicZipFile(path, 'w', zipfile.ZIP_DEFLATED, allowZip64=True) as archive:
+        ExcelWriter(workbook, archive).write_data()
+
+
+class ExcelComposer(Composer):
+    """Write the documents to the sheets of a workbook.
+
+    A document with more rows than a sheet can hold (``max_rows`` including
+    the summary and the header) is split into sheets "Title (1)",
+    "Title (2)" and so on, each of which repeats the summary and the header.
+    ``sheets`` records the title, sheet title and row count of each sheet.
+    With deterministic, the workbook has fixed document properties and zip
+    timestamps, so that the same documents always give the same file.
+    """
+    THIN_BORDER = THIN_BORDER
+    MAX_ROWS = 1048576
+
+    def __init__(self, mode: ExcelMode | str = ExcelMode.NORMAL, max_rows: int = MAX_ROWS,
+                 deterministic: bool = False):
+        super().__init__()
+        self.mode = ExcelMode.of(mode)
+        self.deterministic = deterministic
+        self.workbook = px.Workbook(write_only=self.mode == ExcelMode.STREAM)
+        self.max_rows = max_rows
+        self.styles = None
+        self.sheets = []
+        # a normal workbook starts with an empty sheet
+        self._default_sheet = self.workbook.active if self.mode == ExcelMode.NORMAL else None
+
+    def _create_sheet(self, title, document, template, all_conditions, columns):
+        ws = self.workbook.create_sheet(title)
+
+        # arrange column width
+        # (write-only worksheets need them before the first row is appended)
+        for column_index, column in enumerate(columns):
+            if column in all_conditions and all_conditions[column].width:
+                letter = get_column_letter(column_index + 1)
+                ws.column_dimensions[letter].width = all_conditions[column].width
+
+        ws.append([styled_cell(ws, 'Summary', self.styles.style_array('summary'))])
+        ws.append([])
+        # write summary lines
+        for summary_line in document.summary_lines:
+            ws.append([template.apply(summary_line)])
+        ws.append([])
+
+        # write header
+        ws.append([
+            styled_cell(ws, column, self.styles.style_array('header', all_conditions.get(column)))
+            for column in columns
+        ])
+        return ws
+
+    def add_sheet(self, document, column_config, variables, all_conditions, columns, steps):
+        template = VariableTemplate.of(variables)
+        if self.styles is None:
+            self.styles = StyleRegistry(self.workbook, column_config)
+        ws = self._create_sheet(document.title, document, template, all_conditions, columns)
+        sheets = [[document.title, ws, 0]]
+        capacity = self.max_rows - (len(document.summary_lines) + 4)
+        if capacity < 1:
+            raise ValueError(f'The summary of {document.title} does not fit in a sheet.')
+
+        # write steps
+        increment_columns = column_config.increment_columns()
+        style_arrays = [self.styles.style_array('cell', all_conditions.get(column)) for column in columns]
+
+        row_count = 0
+        for index, step in enumerate(steps):
+            if row_count == capacity:
+                # split the document into sheets
+                if len(sheets) == 1:
+                    ws.title = numbered_title(document.title, 1)
+                ws = self._create_sheet(
+                    numbered_title(document.title, len(sheets) + 1), document, template, all_conditions, columns)
+                sheets.append([document.title, ws, 0])
+                row_count = 0
+            row_count += 1
+            sheets[-1][2] = row_count
+
+            increment_value = index + 1
+            for column in increment_columns:
+                step[column] = increment_value
+
+            ws.append([
+                styled_cell(ws, template.apply(step[column]) if column in step else None, style_array)
+                for column, style_array in zip(columns, style_arrays)
+            ])
+        self.sheets.extend((title, ws.title, count) for title, ws, count in sheets)
+
+    def save(self, path) -> bool:
+        """Save the workbook to path.
+
+        :return: False if the file was left as it was since its content is unchanged
+        :raises ValueError: if there is no sheet
+        """
+        if self._default_sheet is not None:
+            self.workbook.remove(self._default_sheet)
+            self._default_sheet = None
+        if len(self.workbook.worksheets) == 0:
+            raise ValueError('There is no valid markdown file.')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        save_workbook(self.workbook, path + '.tmp', self.deterministic)
+        return self.publish(path + '.tmp', path)
+
+    def compose(self, directory_path, environment, basename):
+        # save Excel file
+        if environment is None or environment == '':
+            filename = basename + '.xlsx'
+        else:
+            filename = f'{basename}_{environment}.xlsx'
+        written = self.save(os.path.join(directory_path, 'output', filename))
+        print('Saved' if written else 'Unchanged', filename)
+        return self.workbook
@@ -0,0 +1,477 @@
+import csv
+import datetime
+import glob
+import gzip
+import os
+import re
+import unicodedata
+from contextlib import closing
+
+from .parser import is_structure_line, trim_blank_lines
+
+LIST_HEADER_PATTERN = re.compile(r'^(.*\S) \((\d+)\)$')
+UNSAFE_FILE_NAME_PATTERN = re.compile(r'[\\/:*?"<>|\x00-\x1f]')
+TABLE_EXTENSIONS = {'.csv': ',', '.tsv': '\t'}
+
+MIN_WIDTH = 8
+MAX_WIDTH = 60
+PREPEND = 'prepend'
+APPEND = 'append'
+
+
+def cell_text(value) -> str | None:
+    """Return the text of a cell as the parser reads it back, or None if it is blank.
+
+    >>> cell_text(None), cell_text(' \\n '), cell_text(3), cell_text(2.5), cell_text(True)
+    (None, None, '3', '2.5', 'TRUE')
+    >>> cell_text(datetime.datetime(2020, 1, 2)), cell_text(datetime.datetime(2020, 1, 2, 3, 4))
+    ('2020-01-02', '2020-01-02 03:04:00')
+    >>> cell_text('\\r\\n a  \\r\\nb\\n\\n')
+    ' a\\nb'
+    """
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return 'TRUE' if value else 'FALSE'
+    if isinstance(value, datetime.datetime):
+        if value.time() == datetime.time():
+            return value.date().isoformat()
+        return value.isoformat(sep=' ')
+    if not isinstance(value, str):
+        return str(value)
+    if '\n' not in value and '\r' not in value:
+        value = value.rstrip()
+        return value or None
+    lines = trim_blank_lines([line.rstrip() for line in value.replace('\r\n', '\n').replace('\r', '\n').split('\n')])
+    return '\n'.join(lines) or None
+
+
+def display_width(text: str) -> int:
+    """Return the width of the longest line of text, counting wide characters twice.
+
+    >>> display_width('ab\\nabcd'), display_width('日本語')
+    (4, 6)
+    """
+    if text.isascii():
+        return max(len(line) for line in text.split('\n'))
+    return max(
+        sum(2 if unicodedata.east_asian_width(c) in 'WF' else 1 for c in line)
+        for line in text.split('\n')
+    )
+
+
+def escape_line(line: str) -> str:
+    """Escape a line which the parser would read as a column header or a separator.
+
+    >>> escape_line('### Note'), escape_line(' --- '), escape_line('## List'), escape_line('text')
+    ('\\\\### Note', '\\\\ --- ', '\\\\## List', 'text')
+    >>> escape_line('\\\\---')
+    '\\\\\\\\---'
+    """
+    if is_structure_line(line.lstrip('\\')):
+        return '\\' + line
+    return line
+
+
+def plan_columns(header: list, plain=frozenset()) -> list[tuple[str, list[int], bool]]:
+    """Plan the columns of the markdown file from the header of a table.
+
+    Consecutive headers such as "Column (1)", "Column (2)" become a list
+    column, unless its name is in plain or is used by another column.
+    Blank headers are named after their position and repeated names get a
+    suffix, since a repeated column starts a new step.
+
+    :param header: values of the header row
+    :param plain: names which are not made list columns
+    :return: list of the name, the indexes in the row and whether it is a list column
+
+    >>> plan_columns(['No.', 'A', 'L (1)', 'L (2)', None, 'A'])
+    [('No.', [0], False), ('A', [1], False), ('L', [2, 3], True), ('Column 5', [4], False), ('A_2', [5], False)]
+    >>> plan_columns(['L (1)', 'L (2)'], {'L'})
+    [('L (1)', [0], False), ('L (2)', [1], False)]
+    """
+    names = [' '.join((cell_text(value) or f'Column {index + 1}').split()) for index, value in enumerate(header)]
+    plan = []
+    index = 0
+    while index < len(names):
+        match = LIST_HEADER_PATTERN.match(names[index])
+        if match and match.group(2) == '1' and match.group(1) not in plain and match.group(1) not in names:
+            base = match.group(1)
+            end = index + 1
+            while end < len(names) and names[end] == f'{base} ({end - index + 1})':
+                end += 1
+            plan.append((base, list(range(index, end)), True))
+            index = end
+        else:
+            plan.append((names[index], [index], False))
+            index += 1
+
+    seen = set()
+    result = []
+    for name, indexes, is_list in plan:
+        unique = name
+        suffix = 1
+        while unique in seen:
+            suffix += 1
+            unique = f'{name}_{suffix}'
+        seen.add(unique)
+        result.append((unique, indexes, is_list))
+    return result
+
+
+def is_row_number(value, number: int) -> bool:
+    """Return True if value is the row number, as an increment column writes it.
+
+    >>> is_row_number(3, 3), is_row_number('3', 3), is_row_number(3.0, 3), is_row_number(True, 1)
+    (True, True, True, False)
+    """
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, (int, float)):
+        return value == number
+    return isinstance(value, str) and value.strip() == str(number)
+
+
+def safe_file_name(title: str) -> str:
+    """Return a file name for a title without the characters file systems reject.
+
+    >>> safe_file_name('a/b: c'), safe_file_name('.hidden')
+    ('a_b_ c', '_hidden')
+    """
+    name = UNSAFE_FILE_NAME_PATTERN.sub('_', title).strip() or 'Untitled'
+    return '_' + name[1:] if name.startswith('.') else name
+
+
+class SheetResult:
+    """Columns of an imported table, which make the column config."""
+
+    def __init__(self):
+        self.rows = 0
+        self.columns = []
+        self.lists = set()
+        self.widths = {}
+        self.increments = set()
+        self.escaped = 0
+
+
+class _IncrementMismatch(Exception):
+    def __init__(self, column):
+        self.column = column
+
+
+def write_sheet(file, title: str, summary_lines: list[str], header: list, rows, increments=None,
+                plain=frozenset()) -> SheetResult:
+    """Write a table as a mael markdown file, one row at a time.
+
+    The first and last columns are left out of the markdown file as
+    increment columns as long as they hold the row numbers.  The first step
+    has a block for every column, empty or not, so that the columns are built
+    in the order of the header.
+
+    :param file: file to write the markdown to
+    :param title: title of the document
+    :param summary_lines: lines of the summary
+    :param header: values of the header row
+    :param rows: iterator of the values of the rows
+    :param increments: (side, name) of the columns which may be increment columns, None for any
+    :param plain: names which are not made list columns
+    :return: result with the columns, the widths and the increment columns found
+    :raise _IncrementMismatch: if a column left out as an increment column turns out not to be one
+    """
+    result = SheetResult()
+    plan = plan_columns(header, plain)
+    candidates = {}
+    for side, position in ((PREPEND, 0), (APPEND, len(plan) - 1)):
+        # at least one column is left to write
+        if len(plan) - len(candidates) < 2:
+            break
+        name, indexes, is_list = plan[position]
+        if not is_list and (increments is None or (side, name) in increments):
+            candidates[position] = (side, name)
+    columns = [column for position, column in enumerate(plan) if position not in candidates]
+    increment_indexes = [(plan[position][1][0], key) for position, key in candidates.items()]
+    result.columns = [name for name, _, _ in columns]
+    result.lists = {name for name, _, is_list in columns if is_list}
+    widths = {name: display_width(name) for name, _, _ in plan}
+
+    file.write(f'# {title}\n\n## Summary\n\n')
+    for line in summary_lines:
+        escaped = escape_line(line)
+        result.escaped += escaped != line
+        file.write(escaped + '\n')
+    file.write('\n' if summary_lines else '')
+    file.write('## List\n')
+
+    header_width = len(header)
+    for values in rows:
+        values = list(values[:header_width]) + [None] * (header_width - len(values))
+        blocks = []
+        for name, indexes, is_list in columns:
+            if is_list:
+                items = [cell_text(values[index]) for index in indexes]
+                while items and items[-1] is None:
+                    items.pop()
+                if not items:
+                    continue
+                items = [' '.join(item.split('\n')) if item else '' for item in items]
+                widths[name] = max(widths[name], max(map(display_width, items)))
+                blocks.append((name, '\n'.join(f'* {item}' for item in items)))
+            else:
+                text = cell_text(values[indexes[0]])
+                if text is None:
+                    continue
+                if len(text) * 2 > widths[name]:
+                    widths[name] = max(widths[name], display_width(text))
+                lines = text.split('\n')
+                escaped = [escape_line(line) for line in lines]
+                result.escaped += sum(a != b for a, b in zip(escaped, lines))
+                blocks.append((name, '\n'.join(escaped)))
+
+        number = result.rows + 1
+        for index, key in increment_indexes:
+            # a blank row is not written, so it must not have a row number either
+            if is_row_number(values[index], number) if blocks else values[index] is None:
+                continue
+            raise _IncrementMismatch(key)
+        if not blocks:
+            continue
+        if result.rows == 0:
+            present = dict(blocks)
+            blocks = [(name, present.get(name, '')) for name, _, _ in columns]
+        file.write('\n---\n' if result.rows else '')
+        for name, content in blocks:
+            file.write(f'\n### {name}\n\n{content}\n' if content else f'\n### {name}\n')
+        result.rows = number
+
+    result.increments = set(candidates.values())
+    for _, name in result.increments:
+        widths[name] = max(widths[name], len(str(result.rows)))
+    result.widths = {name: min(max(width + 2, MIN_WIDTH), MAX_WIDTH) for name, width in widths.items()}
+    return result
+
+
+class WorkbookSheet:
+    """A worksheet of a workbook opened in read-only mode.
+
+    A sheet which starts with "Summary", as mael writes it, has the summary
+    lines in the first column and the header after a blank row.  The header
+    is the first row after a blank row which has a border or more than one
+    value.  Any other sheet starts with the header.
+    """
+
+    def __init__(self, worksheet):
+        self.worksheet = worksheet
+        self.title = worksheet.title
+
+    def read(self) -> tuple[list[str], list, object]:
+        """Return the summary lines, the header and an iterator of the values of the rows."""
+        ws = self.worksheet
+        # the dimensions written in legacy files are not always right
+        ws.reset_dimensions()
+        summary_lines = []
+        header = []
+        header_row = 1
+        with closing(ws.iter_rows()) as cells:
+            first = next(cells, None)
+            if first is not None:
+                values = [cell.value for cell in first]
+                if values[:1] == ['Summary'] and not any(values[1:]):
+                    blank = False
+                    for row_number, row in enumerate(cells, 2):
+                        values = [cell.value for cell in row]
+                        filled = sum(value is not None for value in values)
+                        if blank and filled and (filled > 1 or getattr(row[0].border.left, 'style', None)):
+                            header, header_row = values, row_number
+                            break
+                        blank = not filled
+                        summary_lines.append(cell_text(values[0]) if values else '')
+                    summary_lines = trim_blank_lines(
+                        [line for text in summary_lines for line in (text or '').split('\n')])
+                else:
+                    header = values
+        while header and header[-1] is None:
+            header.pop()
+        rows = ws.iter_rows(min_row=header_row + 1, values_only=True) if header else (row for row in ())
+        return summary_lines, header, rows
+
+
+class TableFile:
+    """A CSV or TSV file, which may be compressed with gzip."""
+
+    def __init__(self, path, summary: str = None):
+        self.path = path
+        name = os.path.basename(path)
+        if name.endswith('.gz'):
+            name = name[:-3]
+        name, extension = os.path.splitext(name)
+        self.title = name
+        self.delimiter = TABLE_EXTENSIONS.get(extension.lower(), ',')
+        self.summary = summary
+
+    def _rows(self):
+        opener = gzip.open if self.path.endswith('.gz') else open
+        with opener(self.path, 'rt', encoding='utf-8-sig', newline='') as f:
+            for row in csv.reader(f, delimiter=self.delimiter):
+                yield [value if value != '' else None for value in row]
+
+    def read(self) -> tuple[list[str], list, object]:
+        """Return the summary lines, the header and an iterator of the values of the rows."""
+        rows = self._rows()
+        header = next(rows, None) or []
+        summary_lines = trim_blank_lines((cell_text(self.summary) or '').split('\n'))
+        return summary_lines, header, rows
+
+
+def is_table_file(path) -> bool:
+    name = path[:-3] if path.endswith('.gz') else path
+    return os.path.splitext(name)[1].lower() in TABLE_EXTENSIONS
+
+
+def read_summary_file(path) -> dict[str, str] | None:
+    """Read the titles and descriptions of a summary file, or return None if path is not one."""
+    rows = TableFile(path)._rows()
+    with closing(rows):
+        if next(rows, None) != ['title', 'description']:
+            return None
+        return {row[0]: row[1] or '' for row in rows if row and row[0] is not None}
+
+
+def open_sources(source_path) -> tuple[list, object]:
+    """Return the tables of a workbook, a CSV or TSV file or a directory of them.
+
+    In a directory, "summary.csv" as mael writes it gives the summaries of
+    the other files.
+
+    :param source_path: path to the source
+    :return: tuple of the tables and the workbook to close, or None
+    """
+    if os.path.isdir(source_path):
+        paths = sorted(path for path in glob.glob(os.path.join(source_path, '*')) if is_table_file(path))
+        summaries = {}
+        tables = []
+        for path in paths:
+            summary = read_summary_file(path) if TableFile(path).title.lstrip('_') == 'summary' else None
+            if summary is not None:
+                summaries.update(summary)
+            else:
+                tables.append(TableFile(path))
+        for table in tables:
+            table.summary = summaries.get(table.title)
+        return tables, None
+    if is_table_file(source_path):
+        return [TableFile(source_path)], None
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(source_path, read_only=True)
+    return [WorkbookSheet(worksheet) for worksheet in workbook.worksheets], workbook
+
+
+def column_config_of(results: list[SheetResult]) -> dict:
+    """Return the column config which builds the imported tables as they were.
+
+    Every column is declared so that blank cells are not filled with the
+    values of the previous rows.
+    """
+    def width(name):
+        return max(result.widths[name] for result in results if name in result.widths)
+
+    sections = {PREPEND: {}, 'column_conditions': {}, APPEND: {}}
+    for result in results:
+        for side, name in result.increments:
+            sections[side][name] = {'type': 'increment', 'width': width(name)}
+        for name in result.columns:
+            if name in sections['column_conditions']:
+                continue
+            if name in result.lists:
+                sections['column_conditions'][name] = {'type': 'list'}
+            else:
+                sections['column_conditions'][name] = {'width': width(name)}
+    config = {'global': {'duplicate_previous_for_blank': False}}
+    config.update((section, conditions) for section, conditions in sections.items() if conditions)
+    return config
+
+
+def import_tables(source_path, directory_path, overwrite: bool = False) -> list[str]:
+    """Convert the sheets of a workbook, or CSV or TSV files, to markdown files and a column config.
+
+    Each table is read a row at a time and written as a markdown file
+    named after its title.  Numbered columns such as "Column (1)" become a
+    list column, and a first or last column which holds the row numbers
+    becomes an increment column if every table has it.  A table is read
+    again only if that does not hold for all the tables.
+
+    :param source_path: path to an xlsx file, a CSV or TSV file, or a directory of them
+    :param directory_path: path to the mael directory to write
+    :param overwrite: replace the markdown files and the column config which exist
+    :return: paths to the markdown files
+    :raise FileNotFoundError: if the source does not exist
+    :raise FileExistsError: if a file exists and overwrite is not set
+    """
+    if not os.path.exists(source_path):
+        raise FileNotFoundError(f'{source_path} does not exist.')
+    tables, workbook = open_sources(source_path)
+    try:
+        paths = []
+        used = set()
+        for table in tables:
+            name = safe_file_name(table.title)
+            file_name = name + '.md'
+            suffix = 1
+            while file_name.lower() in used:
+                suffix += 1
+                file_name = f'{name} {suffix}.md'
+            used.add(file_name.lower())
+            paths.append(os.path.join(directory_path, file_name))
+        config_path = os.path.join(directory_path, 'config', 'columns.yml')
+        if not overwrite:
+            for path in paths + [config_path]:
+                if os.path.exists(path):
+                    raise FileExistsError(f'{path} exists. Use --overwrite to replace it.')
+        os.makedirs(os.path.join(directory_path, 'config'), exist_ok=True)
+
+        def write(table, path, increments=None, plain=frozenset()) -> SheetResult | None:
+            while True:
+                summary_lines, header, rows = table.read()
+                with closing(rows):
+                    if not header and not summary_lines:
+                        return None
+                    try:
+                        with open(path, 'w', encoding='utf-8', newline='\n') as f:
+                            return write_sheet(f, table.title, summary_lines, header, rows, increments, plain)
+                    except _IncrementMismatch as e:
+                        candidates = plan_columns(header, plain)
+                        increments = {
+                            (side, candidates[position][0]) for side, position in ((PREPEND, 0), (APPEND, -1))
+                            if increments is None or (side, candidates[position][0]) in increments
+                        } - {e.column}
+
+        imported = [(table, path, write(table, path)) for table, path in zip(tables, paths)]
+        for table, path, result in imported:
+            if result is None:
+                print('Skipped', table.title, '(empty)')
+        imported = [(table, path, result) for table, path, result in imported if result is not None]
+        tables = [table for table, _, _ in imported]
+        paths = [path for _, path, _ in imported]
+        results = [result for _, _, result in imported]
+
+        # the column config is shared by the tables, so they must agree on the increment and list columns
+        increments = set.intersection(*[result.increments for result in results]) if results else set()
+        plain_columns = {name for result in results for name in result.columns if name not in result.lists}
+        conflicts = plain_columns & {name for result in results for name in result.lists}
+        for index, (table, path) in enumerate(zip(tables, paths)):
+            if results[index].increments != increments or results[index].lists & conflicts:
+                results[index] = write(table, path, increments, frozenset(conflicts))
+
+        for path, result in zip(paths, results):
+            escaped = f', {result.escaped} lines escaped' if result.escaped else ''
+            print('Saved', os.path.basename(path), f'({result.rows} rows{escaped})')
+
+        import yaml
+
+        with open(config_path, 'w', encoding='utf-8') as f:
+            yaml.safe_dump(column_config_of(results), f, allow_unicode=True, sort_keys=False)
+        print('Saved', os.path.join('config', 'columns.yml'))
+        return paths
+    finally:
+        if workbook is not None:
+            workbook.close()
@@ -1,30 +1,239 @@
+import bisect
+import glob
+import os
+import re
 import sys
 
-LOAD_COMMANDS = ["load", "l"]
+from .excel_builder import filter_ignored_files, parse_document, read_column_config, read_variables
+from .variables import PLACEHOLDER_PATTERN
+from .watcher import file_state
+
+RELOAD_COMMANDS = ["reload", "load", "l"]
 EXIT_COMMANDS = ["quit", "exit", "q", "bye"]
 HELP_COMMANDS = ["help", "h", "?"]
 
-def process_command(command):
-    command = command.strip()
-    if command == "":
-        return
-    if command in HELP_COMMANDS:
-        print("Commands:")
-        print("  hello: Print 'Hello, World!'")
-        print("  load: Load a file")
-        print("  exit: Exit the program")
-        return
-    if command in LOAD_COMMANDS:
-        print("Loading...")
-        return
-    if command in EXIT_COMMANDS:
-        print("Exiting...")
-        sys.exit()
-
-    print("Unknown command: " + command)
-
-def repl(directory, env = None):
+FILTER_PATTERN = re.compile(r'^(?P<column>.+?)\s*(?P<operator>\^=|=)\s*(?P<value>.*)$')
+DISPLAY_LIMIT = 50
+
+
+class ColumnIndex:
+    """Index of the rows of a column, built lazily on the first lookup.
+
+    The hash index maps a value to its rows and serves equality lookups.
+    The sorted index holds the distinct values in order and serves prefix
+    lookups with bisect.
+
+    >>> index = ColumnIndex(['b', 'ab', None, 'abc', 'b'])
+    >>> index.equal('b')
+    [0, 4]
+    >>> index.prefix('ab')
+    [1, 3]
+    """
+
+    def __init__(self, values: list):
+        self.values = values
+        self._hash = None
+        self._sorted = None
+
+    def _hash_index(self) -> dict[str, list[int]]:
+        if self._hash is None:
+            self._hash = {}
+            for row, value in enumerate(self.values):
+                if value is not None:
+                    self._hash.setdefault(str(value), []).append(row)
+        return self._hash
+
+    def equal(self, value: str) -> list[int]:
+        """Return the rows whose value equals value."""
+        return list(self._hash_index().get(value, []))
+
+    def prefix(self, prefix: str) -> list[int]:
+        """Return the rows whose value starts with prefix."""
+        hash_index = self._hash_index()
+        if self._sorted is None:
+            self._sorted = sorted(hash_index)
+        rows = []
+        for position in range(bisect.bisect_left(self._sorted, prefix), len(self._sorted)):
+            value = self._sorted[position]
+            if not value.startswith(prefix):
+                break
+            rows.extend(hash_index[value])
+        return sorted(rows)
+
+
+def display_value(value) -> str:
+    return str(value).replace('\n', '\\n')
+
+
+class Inspector:
+    """Parsed markdown files of a directory held in memory to answer queries.
+
+    The rows of all sheets are numbered in order of the sheets.  Column
+    indexes and the variable usage are built on the first query which needs
+    them and dropped when files are reloaded.
+    """
+
+    def __init__(self, directory_path, environment: str = None):
+        self.directory_path = directory_path
+        self.environment = environment
+        self.column_config = None
+        self.parsed = {}
+        self.states = {}
+        self.config_states = None
+        self.selected_columns = None
+        self._rows = None
+        self._indexes = {}
+        self._variable_usage = None
+
+    def load(self) -> int:
+        """Parse the markdown files which changed since the last load.
+
+        A change of a config file parses all files again.
+
+        :return: number of parsed files
+        """
+        config_states = {
+            path: file_state(path)
+            for path in glob.glob(os.path.join(self.directory_path, 'config', '*'))
+        }
+        if self.column_config is None or config_states != self.config_states:
+            self.column_config = read_column_config(self.directory_path)
+            self.config_states = config_states
+            self.parsed = {}
+
+        target_files = filter_ignored_files(
+            self.directory_path, sorted(glob.glob(os.path.join(self.directory_path, '*.md'))))
+        parsed = {}
+        parse_count = 0
+        for path in target_files:
+            state = file_state(path)
+            if path in self.parsed and self.states.get(path) == state:
+                parsed[path] = self.parsed[path]
+                continue
+            parsed[path] = parse_document(path, self.column_config)
+            self.states[path] = state
+            parse_count += 1
+        self.parsed = parsed
+        self._rows = None
+        self._indexes = {}
+        self._variable_usage = None
+        return parse_count
+
+    def documents(self) -> list:
+        return [parsed for parsed in self.parsed.values() if parsed is not None]
+
+    def rows(self) -> list[tuple]:
+        """Return all rows as tuples of document, row number in the sheet and row."""
+        if self._rows is None:
+            self._rows = [
+                (document, number, row)
+                for document, _, table in self.documents()
+                for number, row in enumerate(table, 1)
+            ]
+        return self._rows
+
+    def index(self, column: str) -> ColumnIndex:
+        index = self._indexes.get(column)
+        if index is None:
+            index = ColumnIndex([row.get(column) for _, _, row in self.rows()])
+            self._indexes[column] = index
+        return index
+
+    def variable_usage(self) -> dict[str, list[str]]:
+        """Return the paths of the files which use each variable."""
+        if self._variable_usage is None:
+            usage = {}
+            for document, _, table in self.documents():
+                values = [document.title, *document.summary_lines]
+                values.extend(value for row in table for value in row.values() if isinstance(value, str))
+                for value in values:
+                    if '{{' in value:
+                        for name in PLACEHOLDER_PATTERN.findall(value):
+                            usage.setdefault(name, {})[document.file_path] = None
+            self._variable_usage = {name: list(paths) for name, paths in usage.items()}
+        return self._variable_usage
+
+    def print_rows(self, row_ids: list[int]) -> None:
+        rows = self.rows()
+        for row_id in row_ids[:DISPLAY_LIMIT]:
+            document, number, row = rows[row_id]
+            columns = self.selected_columns or list(row)
+            values = ' | '.join(f'{column}={display_value(row.get(column, ""))}' for column in columns)
+            print(f'{document.title}:{number}  {values}')
+        if len(row_ids) > DISPLAY_LIMIT:
+            print(f'... {len(row_ids) - DISPLAY_LIMIT} more rows')
+        print(f'{len(row_ids)} rows')
+
+    def process_command(self, command: str) -> None:
+        command = command.strip()
+        if command == "":
+            return
+        name, _, argument = command.partition(' ')
+        argument = argument.strip()
+        if name in HELP_COMMANDS:
+            print("Commands:")
+            print("  sheets: List the sheets and their row counts")
+            print("  count [SHEET]: Count the rows of all sheets or of a sheet")
+            print("  filter COLUMN=VALUE: Show the rows whose column equals the value")
+            print("  filter COLUMN^=PREFIX: Show the rows whose column starts with the prefix")
+            print("  select COLUMN, ...: Show only these columns, \"select *\" shows all")
+            print("  uses NAME: List the files which use the variable")
+            print("  reload: Parse the files which changed")
+            print("  exit: Exit the program")
+            return
+        if name in RELOAD_COMMANDS:
+            print(f'Parsed {self.load()} files')
+            return
+        if name in EXIT_COMMANDS:
+            print("Exiting...")
+            sys.exit()
+        if name == "sheets":
+            for document, _, table in self.documents():
+                print(f'{document.title}: {len(table)} rows')
+            return
+        if name == "count":
+            documents = [
+                (document, table) for document, _, table in self.documents()
+                if argument == '' or document.title == argument
+            ]
+            print(sum(len(table) for _, table in documents))
+            return
+        if name == "filter":
+            match = FILTER_PATTERN.match(argument)
+            if match is None:
+                print("Usage: filter COLUMN=VALUE or filter COLUMN^=PREFIX")
+                return
+            index = self.index(match.group('column'))
+            if match.group('operator') == '=':
+                self.print_rows(index.equal(match.group('value')))
+            else:
+                self.print_rows(index.prefix(match.group('value')))
+            return
+        if name == "select":
+            if argument in ('', '*'):
+                self.selected_columns = None
+            else:
+                self.selected_columns = [column.strip() for column in argument.split(',') if column.strip()]
+            return
+        if name == "uses":
+            paths = self.variable_usage().get(argument, [])
+            for path in paths:
+                print(os.path.basename(path))
+            if paths and argument not in read_variables(self.directory_path, self.environment):
+                print(f'{argument} is not defined')
+            print(f'{len(paths)} files')
+            return
+
+        print("Unknown command: " + command)
+
+
+def repl(directory, env=None):
+    inspector = Inspector(directory, env)
+    print(f'Parsed {inspector.load()} files')
     while True:
-        command = input("> ")
+        try:
+            command = input("> ")
+        except EOFError:
+            break
 
-        process_command(command)
+        inspector.process_command(command)
@@ -1,10 +1,11 @@
 import argparse
 import os
+import sys
 
-from .composer import OutputFormat
-from .excel_builder import convert
-from .initializer import Initializer
-from .inspector import repl
+from .composer import OutputFormat, ExcelEngine, ExcelMode
+
+# The modules of the commands are imported in the branch of each command,
+# so that a command loads only what it uses.
 
 
 def main() -> None:
@@ -35,11 +36,90 @@ This is a tool to convert markdown file to excel.
     parser_build.add_argument('directory', default=os.getcwd(),
                               help='Directory which holds markdown files.')
     parser_build.add_argument('-e', '--environment',
-                              help='Environment signature such as "dev" or "prod"')
+                              help='Environment signature such as "dev" or "prod",\n'
+                                   'or comma separated signatures such as "dev,stg,prod"')
     parser_build.add_argument('-f', '--format', default=OutputFormat.EXCEL,
-                              help='Output format such as "excel" or "csv", "tsv"')
+                              help='Output format such as "excel" or "csv", "tsv", "sqlite", "jsonl"')
+    parser_build.add_argument('--excel-mode', default=ExcelMode.NORMAL.value,
+                              choices=[mode.value for mode in ExcelMode],
+                              help='"stream" writes Excel rows as they are built to keep memory usage low,\n'
+                                   '"incremental" renders only the sheets changed since the last build')
+    parser_build.add_argument('--engine', default=ExcelEngine.OPENPYXL.value,
+                              choices=[engine.value for engine in ExcelEngine],
+                              help='"native" writes Excel files without openpyxl, several times faster')
+    parser_build.add_argument('--compression-level', type=int, choices=range(10), metavar='{0-9}',
+                              help='zlib compression level of Excel files written by the native engine\n'
+                                   'or in incremental mode, 1 for fastest and 9 for smallest')
+    parser_build.add_argument('-j', '--jobs', type=int, default=1,
+                              help='Number of processes to parse markdown files, 0 for the number of CPUs')
+    parser_build.add_argument('--stream', action='store_true',
+                              help='Read each markdown file as a stream of steps to keep memory usage low')
+    parser_build.add_argument('--no-cache', action='store_true',
+                              help='Parse all markdown files without the cache in output/.mael-cache')
+    parser_build.add_argument('--files-per-workbook', type=int, default=0,
+                              help='Write a workbook per this number of markdown files and an index workbook,\n'
+                                   'in parallel with --jobs')
+    parser_build.add_argument('--gzip', action='store_true',
+                              help='Compress the output with gzip (csv, tsv, jsonl)')
+    parser_build.add_argument('--native-lists', action='store_true',
+                              help='Write list columns as arrays instead of numbered columns (jsonl)')
+    parser_build.add_argument('--split-size', type=float, default=0, metavar='MIB',
+                              help='Parse markdown files larger than this many MiB in chunks,\n'
+                                   'in parallel with --jobs')
+    parser_build.add_argument('-r', '--recursive', action='store_true',
+                              help='Build every directory with a config directory under the directory,\n'
+                                   'sharing the --jobs processes')
+    parser_build.add_argument('--deterministic', action='store_true',
+                              help='Write fixed timestamps so that unchanged documents give the same bytes (excel)')
+    parser_build.add_argument('--profile', action='store_true',
+                              help='Print the time spent in each stage of the build')
+    parser_build.add_argument('--profile-json', metavar='PATH',
+                              help='Write the time spent in each stage of the build to a JSON file')
+    parser_build.add_argument('--profile-memory', action='store_true',
+                              help='Measure the peak memory of each stage too, which slows down the build')
+    # parser for watch command
+    parser_watch = subparsers.add_parser('watch', help='Rebuild whenever markdown or config files change')
+    parser_watch.add_argument('directory', default=os.getcwd(),
+                              help='Directory which holds markdown files.')
+    parser_watch.add_argument('-e', '--environment',
+                              help='Environment signature such as "dev" or "prod",\n'
+                                   'or comma separated signatures such as "dev,stg,prod"')
+    parser_watch.add_argument('-f', '--format', default=OutputFormat.EXCEL,
+                              help='Output format such as "excel" or "csv", "tsv", "sqlite", "jsonl"')
+    parser_watch.add_argument('--excel-mode', default=ExcelMode.NORMAL.value,
+                              choices=[mode.value for mode in ExcelMode],
+                              help='"stream" writes Excel rows as they are built to keep memory usage low,\n'
+                                   '"incremental" renders only the sheets changed since the last build')
+    parser_watch.add_argument('--interval', type=float, default=0.5,
+                              help='Seconds between checks for changed files')
+    parser_watch.add_argument('--debounce', type=float, default=0.3,
+                              help='Seconds without changes to wait for before rebuilding')
+    # parser for serve command
+    parser_serve = subparsers.add_parser('serve', help='Serve the outputs over HTTP')
+    parser_serve.add_argument('directory', default=os.getcwd(),
+                              help='Directory which holds markdown files.')
+    parser_serve.add_argument('--host', default='127.0.0.1',
+                              help='Host to listen on')
+    parser_serve.add_argument('--port', type=int, default=8000,
+                              help='Port to listen on')
+    parser_serve.add_argument('--cache-size', type=int, default=16,
+                              help='Number of built outputs to keep in memory')
+    # parser for cache command
+    parser_cache = subparsers.add_parser('cache', help='Manage the parse cache')
+    parser_cache.add_argument('action', choices=['clear'],
+                              help='"clear" removes the parse cache')
+    parser_cache.add_argument('directory', default=os.getcwd(),
+                              help='Directory which holds markdown files.')
+    # parser for import command
+    parser_import = subparsers.add_parser('import', help='Convert Excel or CSV files to markdown files')
+    parser_import.add_argument('source',
+                               help='xlsx file, CSV or TSV file, or directory which holds CSV or TSV files')
+    parser_import.add_argument('directory', default=os.getcwd(),
+                               help='Directory to write markdown files and config/columns.yml to.')
+    parser_import.add_argument('--overwrite', action='store_true',
+                               help='Replace markdown files and config/columns.yml which exist')
     # parser for inspect command
-    parser_build = subparsers.add_parser('inspect', help='Under development')
+    parser_build = subparsers.add_parser('inspect', help='Query the lists of markdown files interactively')
     parser_build.add_argument('directory', default=os.getcwd(),
                               help='Directory which holds markdown files.')
     parser_build.add_argument('-e', '--environment',
@@ -56,16 +136,81 @@ This is a tool to convert markdown file to excel.
         target_dir = os.getcwd()
 
     if args.command == 'init':
+        from .initializer import Initializer
+
         # create init file
         i = Initializer(target_dir)
         i.initialize()
     elif args.command == 'build':
-        # read the directory and save the Excel file
-        convert(target_dir, args.environment, args.format)
+        if args.recursive and (args.stream or args.files_per_workbook):
+            parser.error('--recursive can not be combined with --stream or --files-per-workbook')
+
+        if args.excel_mode == ExcelMode.INCREMENTAL.value and args.files_per_workbook:
+            parser.error('--excel-mode incremental can not be combined with --files-per-workbook')
+
+        if args.compression_level is not None and not (
+                args.engine == ExcelEngine.NATIVE.value or args.excel_mode == ExcelMode.INCREMENTAL.value):
+            parser.error('--compression-level needs --engine native or --excel-mode incremental')
+
+        split_size = int(args.split_size * 2 ** 20)
+
+        def build():
+            if args.recursive:
+                from .projects import build_projects, summary
+
+                # build each project under the directory
+                results = build_projects(
+                    target_dir, args.environment, args.format, args.excel_mode, args.jobs, not args.no_cache,
+                    args.gzip, args.native_lists, args.deterministic, split_size, args.engine, args.compression_level)
+                print(summary(results))
+                return not any(result.errors for result in results)
+            from .excel_builder import convert
+
+            # read the directory and save the Excel file
+            convert(target_dir, args.environment, args.format, args.excel_mode, args.jobs, not args.no_cache,
+                    args.stream, args.gzip, args.native_lists, args.files_per_workbook,
+                    args.deterministic, split_size, args.engine, args.compression_level)
+            return True
+
+        if args.profile or args.profile_json or args.profile_memory:
+            from .profiler import Profiler
+
+            with Profiler(args.profile_memory) as profiler:
+                succeeded = build()
+            if args.profile or args.profile_memory:
+                print(profiler.summary())
+            if args.profile_json:
+                profiler.write_json(args.profile_json)
+        else:
+            succeeded = build()
+        if not succeeded:
+            sys.exit(1)
+    elif args.command == 'watch':
+        from .watcher import Watcher
+
+        # rebuild whenever the files change
+        Watcher(target_dir, args.environment, args.format, args.excel_mode, args.interval, args.debounce).run()
+    elif args.command == 'serve':
+        from .server import serve
+
+        # serve the outputs until interrupted
+        serve(target_dir, args.host, args.port, args.cache_size)
+    elif args.command == 'cache':
+        from .cache import clear_cache
+
+        if args.action == 'clear':
+            clear_cache(target_dir)
+    elif args.command == 'import':
+        from .importer import import_tables
+
+        # convert the tables to markdown files
+        try:
+            import_tables(os.path.abspath(args.source), target_dir, args.overwrite)
+        except (FileExistsError, FileNotFoundError) as e:
+            parser.error(str(e))
     elif args.command == 'inspect':
+        from .inspector import repl
+
         # read the directory and get into REPL
         repl(target_dir, args.environment)
 
-
-# TODO:
-#   * font configuration
@@ -0,0 +1,129 @@
+from typing import Iterable, Iterator
+
+from .column_config import ColumnConfig
+from .table import Table
+
+
+def collect_columns(steps: Iterable[dict], column_config: ColumnConfig) -> tuple[list[str], dict[str, int]]:
+    """Collect columns in order of appearance and the maximum item count of list columns.
+
+    This reads each step once and keeps none of them, so it also works as a
+    cheap first pass over a stream of steps.
+
+    :param steps: raw steps
+    :param column_config: column config
+    :return: tuple of columns and item counts of list columns
+
+    >>> config = ColumnConfig()
+    >>> config.conditions['L'] = config.parse_condition({'type': 'list'})
+    >>> collect_columns([{'A': '1', 'L': ['x']}, {'B': '2', 'L': ['x', 'y']}], config)
+    (['A', 'L', 'B'], {'L': 2})
+    """
+    list_columns = set(column_config.list_columns())
+    columns = []
+    seen = set()
+    counts = {}
+    for step in steps:
+        for column, value in step.items():
+            if column not in seen:
+                seen.add(column)
+                columns.append(column)
+            if column in list_columns:
+                counts[column] = max(counts.get(column, 0), len(value))
+    return columns, counts
+
+
+def output_columns(columns: list[str], counts: dict[str, int], column_config: ColumnConfig) -> list[str]:
+    """Return the columns of the output table.
+
+    List columns are replaced with numbered columns such as "Column (1)",
+    and prepended and appended columns are added.
+
+    :param columns: columns in the markdown file
+    :param counts: item counts of list columns
+    :param column_config: column config
+    :return: columns of the output table
+
+    >>> config = ColumnConfig()
+    >>> config.conditions['L'] = config.parse_condition({'type': 'list'})
+    >>> config.prepend_columns['No.'] = config.parse_condition({'type': 'increment'})
+    >>> output_columns(['A', 'L', 'B'], {'L': 2}, config)
+    ['No.', 'A', 'L (1)', 'L (2)', 'B']
+    """
+    list_columns = set(column_config.list_columns())
+    result = list(column_config.prepend_columns)
+    for column in columns:
+        if column in list_columns:
+            result.extend(f'{column} ({i + 1})' for i in range(counts.get(column, 0)))
+        else:
+            result.append(column)
+    result.extend(column_config.append_columns)
+    return result
+
+
+def iter_normalized_steps(steps: Iterable[dict], column_config: ColumnConfig) -> Iterator[dict]:
+    """Fill blank columns from the previous step and split list columns.
+
+    Only the previous step is kept, so memory does not depend on the number
+    of steps.  The first step has no previous step and is not filled.
+
+    :param steps: raw steps
+    :param column_config: column config
+    :return: iterator of normalized steps
+
+    >>> config = ColumnConfig()
+    >>> config.duplicate_previous_for_blank = True
+    >>> config.conditions['L'] = config.parse_condition({'type': 'list'})
+    >>> list(iter_normalized_steps([{'A': '1', 'L': ['x']}, {'B': '2'}], config))
+    [{'A': '1', 'L (1)': 'x'}, {'B': '2', 'A': '1', 'L (1)': 'x'}]
+    """
+    all_conditions = column_config.all_conditions()
+    list_columns = column_config.list_columns()
+    previous = None
+    for step in steps:
+        if previous is not None:
+            step.update({
+                k: v for k, v in previous.items()
+                if k not in step and (k not in all_conditions or all_conditions[k].duplicate_previous_for_blank)
+            })
+        previous = step
+        step = dict(step)
+        for column in list_columns:
+            if column in step:
+                for i, value in enumerate(step.pop(column)):
+                    step[f'{column} ({i + 1})'] = value
+        yield step
+
+
+def normalize_steps(steps: list[dict], column_config: ColumnConfig) -> tuple[list[str], Table]:
+    """Normalize steps held in memory as column-wise operations on a table.
+
+    :param steps: raw steps
+    :param column_config: column config
+    :return: tuple of columns of the output table and the table
+
+    >>> config = ColumnConfig()
+    >>> config.duplicate_previous_for_blank = True
+    >>> config.conditions['L'] = config.parse_condition({'type': 'list'})
+    >>> config.prepend_columns['No.'] = config.parse_condition({'type': 'increment'})
+    >>> columns, table = normalize_steps([{'A': '1', 'L': ['x']}, {'B': '2'}], config)
+    >>> columns
+    ['No.', 'A', 'L (1)', 'B']
+    >>> list(table)
+    [{'A': '1', 'L (1)': 'x', 'No.': 1}, {'A': '1', 'L (1)': 'x', 'B': '2', 'No.': 2}]
+    """
+    table = Table.from_steps(steps)
+    all_conditions = column_config.all_conditions()
+    columns = list(table.columns)
+    counts = {}
+
+    # Copy the previous column value if the step doesn't have the column
+    for column in columns:
+        if column not in all_conditions or all_conditions[column].duplicate_previous_for_blank:
+            table.fill_forward(column)
+    for column in column_config.list_columns():
+        if column in table:
+            counts[column] = len(table.expand_list(column))
+    for column in column_config.increment_columns():
+        table.set_increment(column)
+    return output_columns(columns, counts, column_config), table
@@ -0,0 +1,85 @@
+import hashlib
+import json
+import os
+import shutil
+
+MANIFEST_FILE_NAME = '.mael-manifest.json'
+
+
+def file_hash(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(1024 * 1024)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class OutputFiles:
+    """Outputs of a build, which are not written again if their content is unchanged.
+
+    A composer writes an output to a temporary file and publishes it.  The
+    content hash of the temporary file is compared with the manifest in the
+    output directory, and the output is left untouched if it has the same
+    hash and was not modified since it was written.  Otherwise the temporary
+    file replaces the output.  Each environment has its own manifest, so that
+    environments can be built in parallel.
+    """
+
+    def __init__(self, output_path, environment: str = None):
+        self.output_path = output_path
+        file_name = MANIFEST_FILE_NAME if not environment else MANIFEST_FILE_NAME.replace('.json', f'.{environment}.json')
+        self.manifest_path = os.path.join(output_path, file_name)
+        self.entries = {}
+        self.written = []
+        self.skipped = []
+        try:
+            with open(self.manifest_path, encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    def key(self, path) -> str:
+        return os.path.relpath(path, self.output_path).replace(os.sep, '/')
+
+    def publish(self, temporary_path, path) -> bool:
+        """Replace the output at path with the temporary file unless their contents are the same.
+
+        :param temporary_path: path to the newly written file, which is removed
+        :param path: path to the output
+        :return: True if the output was written, False if it was unchanged
+        """
+        key = self.key(path)
+        digest = file_hash(temporary_path)
+        entry = self.entries.get(key)
+        if entry is not None and entry['sha256'] == digest:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                stat = None
+            if stat is not None and [stat.st_size, stat.st_mtime_ns] == [entry['size'], entry['mtime_ns']]:
+                os.remove(temporary_path)
+                self.skipped.append(key)
+                return False
+        shutil.move(temporary_path, path)
+        stat = os.stat(path)
+        self.entries[key] = {'sha256': digest, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+        self.written.append(key)
+        return True
+
+    def remove(self, path) -> None:
+        """Remove an output which is not produced any more."""
+        os.remove(path)
+        self.entries.pop(self.key(path), None)
+
+    def save(self) -> None:
+        os.makedirs(self.output_path, exist_ok=True)
+        temporary_path = self.manifest_path + '.tmp'
+        with open(temporary_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, indent=1, sort_keys=True)
+        os.replace(temporary_path, self.manifest_path)
+
+    def report(self) -> str:
+        return f'Outputs: {len(self.written)} written, {len(self.skipped)} unchanged'
@@ -0,0 +1,406 @@
+import os
+import re
+from typing import Iterable, Iterator
+
+from .column_config import ColumnConfig, Document, ValueType
+
+# The patterns below describe the syntax.  MarkdownListParser checks a cheap
+# prefix first and only then looks at the rest of the line.
+TITLE_PATTERN = re.compile(r'^#[^#]\s*(\S.*)\s*$')
+SUMMARY_PATTERN = re.compile(r'^##\s*Summary\s*$')
+LIST_PATTERN = re.compile(r'^##\s*(List|Steps|Rows)\s*$')
+SEPARATOR_PATTERN = re.compile(r'^\s*---\s*$')
+COLUMN_PATTERN = re.compile(r'^#{3,}\s*(\S.*\S|\S)\s*$')
+
+LIST_HEADERS = frozenset(['List', 'Steps', 'Rows'])
+
+
+def trim_blank_lines(lines: list[str]) -> list[str]:
+    """Remove blank lines from front and back of lines.
+
+    :param lines: list of lines
+    :return: list of lines
+
+    >>> trim_blank_lines([' ', '', 'a', '', 'b', 'c', '', ' ', ''])
+    ['a', '', 'b', 'c']
+    """
+    start = 0
+    end = len(lines)
+    while start < end and not lines[start].strip():
+        start += 1
+    while end > start and not lines[end - 1].strip():
+        end -= 1
+    return lines[start:end]
+
+
+class StepItem:
+    def __init__(self, title: str = None, step_type: ValueType = ValueType.STRING):
+        self.title = title
+        self.type = step_type
+        self.content_lines = []
+        self.content_items = []
+
+    def add_content_line(self, content) -> 'StepItem':
+        if self.type == ValueType.STRING:
+            if len(self.content_lines) == 0 and not content.strip():
+                return self
+            self.content_lines.append(content)
+        elif self.type == ValueType.LIST:
+            if len(self.content_items) == 0 and not content.strip():
+                return self
+            self.content_items.append(list_item(content))
+        return self
+
+    def get_content(self) -> str | list:
+        if self.type == ValueType.STRING:
+            self.content_lines = trim_blank_lines(self.content_lines)
+            return "\n".join(self.content_lines)
+        if self.type == ValueType.LIST:
+            self.content_items = trim_blank_lines(self.content_items)
+            return self.content_items
+        raise ValueError(f'Type {self.type} does not provide content.')
+
+
+def list_item(content: str) -> str:
+    """Remove the bullet of a list item.
+
+    >>> list_item('  * item')
+    'item'
+    >>> list_item('- item')
+    '- item'
+    """
+    stripped = content.lstrip()
+    if stripped.startswith('*'):
+        return stripped[1:].lstrip()
+    return content
+
+
+def title_of(line: str) -> str | None:
+    """Return the title if line is a title line such as "# Title".
+
+    >>> title_of('# Title\\n')
+    'Title'
+    >>> title_of('## Summary') is None
+    True
+    """
+    line = line.rstrip()
+    if len(line) < 3 or line[0] != '#' or line[1] == '#':
+        return None
+    return line[2:].lstrip() or None
+
+
+def column_of(line: str) -> str | None:
+    """Return the column name if line is a column header such as "### Column".
+
+    >>> column_of('### Column 1 \\n')
+    'Column 1'
+    >>> column_of('####\\n')
+    '#'
+    >>> column_of('### \\n') is None
+    True
+    """
+    if not line.startswith('###'):
+        return None
+    line = line.rstrip()
+    body = line.lstrip('#')
+    title = body.lstrip()
+    if title:
+        return title
+    if len(line) - len(body) > 3:
+        return '#'
+    return None
+
+
+def is_section(line: str, names) -> bool:
+    """Return True if line is a "## Name" section header for one of names.
+
+    >>> is_section('## Steps\\n', LIST_HEADERS)
+    True
+    >>> is_section('### Steps\\n', LIST_HEADERS)
+    False
+    """
+    return line.startswith('##') and line[2:].strip() in names
+
+
+def is_structure_line(line: str) -> bool:
+    """Return True if line is read as a column header, a separator or a list section header.
+
+    >>> is_structure_line('### Note'), is_structure_line(' --- '), is_structure_line('## List'), is_structure_line('a')
+    (True, True, True, False)
+    """
+    return column_of(line) is not None or line.strip() == '---' or is_section(line, LIST_HEADERS)
+
+
+def unescape_line(line: str) -> str:
+    """Remove the backslash before a line which would be read as a column header, a separator or a list section header.
+
+    A line escaped more than once keeps the rest of its backslashes.
+
+    >>> unescape_line('\\\\### Note'), unescape_line('\\\\\\\\---'), unescape_line('\\\\n')
+    ('### Note', '\\\\---', '\\\\n')
+    """
+    if line[:1] == '\\' and is_structure_line(line.lstrip('\\')):
+        return line[1:]
+    return line
+
+
+class MarkdownListParser:
+    """Single pass parser for mael markdown files.
+
+    A file consists of a title line, a "## Summary" section and a list
+    section ("## List", "## Steps" or "## Rows") whose steps are separated by
+    "---" and hold "### Column" blocks.  Each line is classified by a cheap
+    prefix check before the rest of it is looked at.  A line of a summary or
+    a block which starts with a backslash and a header or a separator has the
+    backslash removed, so that such a line can be written as a value.
+
+    >>> parser = MarkdownListParser()
+    >>> document = parser.parse([
+    ...     '# Title', '', '## Summary', '', 'Summary line', '',
+    ...     '## List', '', '### A', '', 'a 1', '', '### B', 'b 1', '---', '### A', 'a 2',
+    ... ])
+    >>> document.title, document.summary_lines
+    ('Title', ['Summary line'])
+    >>> document.steps
+    [{'A': 'a 1', 'B': 'b 1'}, {'A': 'a 2'}]
+
+    A repeated column starts a new step unless overwrite_for_repeat is set.
+
+    >>> parser.parse(['# T', '## Summary', '## List', '### A', '1', '### A', '2']).steps
+    [{'A': '1'}, {'A': '2'}]
+    >>> config = ColumnConfig()
+    >>> config.overwrite_for_repeat = True
+    >>> MarkdownListParser(config).parse(['# T', '## Summary', '## List', '### A', '1', '### A', '2']).steps
+    [{'A': '2'}]
+
+    List columns hold the items of the block.
+
+    >>> config = ColumnConfig()
+    >>> config.conditions['C'] = config.parse_condition({'type': 'list'})
+    >>> MarkdownListParser(config).parse(['# T', '## Summary', '## List', '### C', '', '* x', '* y', '']).steps
+    [{'C': ['x', 'y']}]
+    >>> parser.parse(['# T', '## Summary', '\\\\## List', '## List', '### A', '\\\\---', '\\\\### B']).steps
+    [{'A': '---\\n### B'}]
+
+    A file without summary is not a document, and a file without list
+    section is a document without steps.
+
+    >>> parser.parse(['# T', '### A', '1']) is None
+    True
+    >>> parser.parse(['# T', '## Summary', 'only summary']).summary_lines
+    ['only summary']
+    """
+
+    def __init__(self, column_config: ColumnConfig = None):
+        self.column_config = column_config or ColumnConfig()
+
+    def parse_file(self, file_path: str) -> Document | None:
+        """Parse a markdown file.
+
+        :param file_path: path to the markdown file
+        :return: document with steps, or None if the file has no summary
+        """
+        with open(file_path, encoding="utf-8") as f:
+            return self.parse(f, file_path)
+
+    def iter_file_steps(self, file_path: str) -> Iterator[dict]:
+        """Yield the steps of a markdown file without holding them in memory.
+
+        :param file_path: path to the markdown file
+        :return: iterator of steps
+        """
+        with open(file_path, encoding="utf-8") as f:
+            lines = iter(f)
+            if self.read_header(lines, file_path) is not None:
+                yield from self.iter_steps(lines)
+
+    def parse(self, lines: Iterable[str], file_path: str = '') -> Document | None:
+        """Parse lines of a markdown file.
+
+        :param lines: lines of the markdown file
+        :param file_path: path to the markdown file, used for the default title
+        :return: document with steps, or None if there is no summary
+        """
+        lines = iter(lines)
+        document = self.read_header(lines, file_path)
+        if document is None:
+            return None
+        document.steps = list(self.iter_steps(lines))
+        return document
+
+    def read_header(self, lines: Iterator[str], file_path: str = '') -> Document | None:
+        """Read the title and the summary, and stop after the list section header.
+
+        :param lines: iterator of lines, which is left at the first line of the list section
+        :param file_path: path to the markdown file, used for the default title
+        :return: document without steps, or None if there is no summary
+        """
+        document = Document(os.path.abspath(file_path) if file_path else file_path)
+        document.title = os.path.basename(file_path)
+        for line in lines:
+            if line.startswith('#'):
+                title = title_of(line)
+                if title:
+                    document.title = title
+                    break
+
+        for line in lines:
+            if is_section(line, ('Summary',)):
+                break
+        else:
+            return None
+
+        summary_lines = []
+        for line in lines:
+            if is_section(line, LIST_HEADERS):
+                break
+            summary_lines.append(unescape_line(line.rstrip()))
+        document.summary_lines = trim_blank_lines(summary_lines)
+        return document
+
+    def iter_steps(self, lines: Iterable[str]) -> Iterator[dict]:
+        """Yield each step of the list section as a dict of column and content.
+
+        :param lines: lines of the list section
+        :return: iterator of steps
+        """
+        column_config = self.column_config
+        overwrite_for_repeat = column_config.overwrite_for_repeat
+        step = {}
+        title = None
+        item_type = None
+        content = []
+
+        for line in lines:
+            first = line[:1]
+            if first == '#':
+                column = column_of(line)
+                if column is not None:
+                    if title is not None:
+                        step[title] = self._content(item_type, content)
+                    if not overwrite_for_repeat and column in step:
+                        yield step
+                        step = {}
+                    title = column
+                    item_type = column_config.type_of(column)
+                    content = []
+                    continue
+            elif (first == '-' or first.isspace()) and line.strip() == '---':
+                if title is not None:
+                    step[title] = self._content(item_type, content)
+                    title = None
+                if step:
+                    yield step
+                    step = {}
+                continue
+
+            if title is not None:
+                line = line.rstrip()
+                if not content and not line:
+                    continue
+                if first == '\\':
+                    line = unescape_line(line)
+                if item_type == ValueType.LIST:
+                    line = list_item(line)
+                content.append(line)
+
+        if title is not None:
+            step[title] = self._content(item_type, content)
+        if step:
+            yield step
+
+    def iter_blocks(self, lines: Iterable[str]) -> Iterator[tuple | None]:
+        """Yield each column block of the list section as a tuple of column and content, and None for each separator.
+
+        The lines are classified as in iter_steps, which does not use this
+        to keep the hot path of a build in one loop.  StepBuilder makes the
+        steps of iter_steps from the blocks.
+
+        :param lines: lines of the list section
+        :return: iterator of blocks and separators
+
+        >>> list(MarkdownListParser().iter_blocks(['### A', 'a', '---', 'ignored', '### B', '', 'b', '']))
+        [('A', 'a'), None, ('B', 'b')]
+        """
+        column_config = self.column_config
+        title = None
+        item_type = None
+        content = []
+
+        for line in lines:
+            first = line[:1]
+            if first == '#':
+                column = column_of(line)
+                if column is not None:
+                    if title is not None:
+                        yield title, self._content(item_type, content)
+                    title = column
+                    item_type = column_config.type_of(column)
+                    content = []
+                    continue
+            elif (first == '-' or first.isspace()) and line.strip() == '---':
+                if title is not None:
+                    yield title, self._content(item_type, content)
+                    title = None
+                yield None
+                continue
+
+            if title is not None:
+                line = line.rstrip()
+                if not content and not line:
+                    continue
+                if first == '\\':
+                    line = unescape_line(line)
+                if item_type == ValueType.LIST:
+                    line = list_item(line)
+                content.append(line)
+
+        if title is not None:
+            yield title, self._content(item_type, content)
+
+    @staticmethod
+    def _content(item_type: ValueType, content: list[str]) -> str | list:
+        if item_type == ValueType.STRING:
+            return "\n".join(trim_blank_lines(content))
+        if item_type == ValueType.LIST:
+            return trim_blank_lines(content)
+        raise ValueError(f'Type {item_type} does not provide content.')
+
+
+class StepBuilder:
+    """Builds steps from column blocks and separators.
+
+    A separator ends the step.  A column which the step already has starts
+    a new step, or overwrites the content if overwrite_for_repeat is set.
+
+    >>> builder = StepBuilder()
+    >>> builder.add('A', '1'), builder.add('B', '2'), builder.add('A', '3')
+    (None, None, {'A': '1', 'B': '2'})
+    >>> builder.separate(), builder.separate()
+    ({'A': '3'}, None)
+    """
+
+    def __init__(self, overwrite_for_repeat: bool = False):
+        self.overwrite_for_repeat = overwrite_for_repeat
+        self.step = {}
+
+    def add(self, column: str, content) -> dict | None:
+        """Add a column block.
+
+        :return: the step ended by the block, or None
+        """
+        ended = None
+        if not self.overwrite_for_repeat and column in self.step:
+            ended = self.step
+            self.step = {}
+        self.step[column] = content
+        return ended
+
+    def separate(self) -> dict | None:
+        """End the step at a separator or at the end of the list.
+
+        :return: the step, or None if it has no column
+        """
+        ended = self.step or None
+        self.step = {}
+        return ended
@@ -0,0 +1,229 @@
+import json
+import time
+import tracemalloc
+from contextlib import nullcontext
+
+from .variables import VariableTemplate
+
+_active = None
+_NULL_CONTEXT = nullcontext()
+
+
+class Stage:
+    """Accumulated measurements of a stage for one subject such as a file or a sheet."""
+
+    def __init__(self, name: str, subject: str = ''):
+        self.name = name
+        self.subject = subject
+        self.calls = 0
+        self.seconds = 0.0
+        self.peak_bytes = None
+
+    def as_dict(self) -> dict:
+        return {
+            'stage': self.name,
+            'subject': self.subject,
+            'calls': self.calls,
+            'seconds': self.seconds,
+            'peak_bytes': self.peak_bytes,
+        }
+
+
+class _Measurement:
+    def __init__(self, profiler: 'Profiler', stage: Stage):
+        self.profiler = profiler
+        self.stage = stage
+        self.started_at = 0.0
+        self.traced_at = 0
+        self.inner_peak = 0
+
+    def __enter__(self):
+        profiler = self.profiler
+        if profiler.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if profiler._measurements:
+                parent = profiler._measurements[-1]
+                parent.inner_peak = max(parent.inner_peak, peak)
+            tracemalloc.reset_peak()
+            self.traced_at = current
+        profiler._measurements.append(self)
+        self.started_at = time.perf_counter()
+        return self.stage
+
+    def __exit__(self, *exc_info):
+        seconds = time.perf_counter() - self.started_at
+        profiler = self.profiler
+        profiler._measurements.pop()
+        stage = self.stage
+        stage.calls += 1
+        stage.seconds += seconds
+        peak_bytes = None
+        if profiler.trace_memory:
+            peak = max(tracemalloc.get_traced_memory()[1], self.inner_peak)
+            peak_bytes = peak - self.traced_at
+            stage.peak_bytes = max(stage.peak_bytes or 0, peak_bytes)
+            if profiler._measurements:
+                parent = profiler._measurements[-1]
+                parent.inner_peak = max(parent.inner_peak, peak)
+        for hook in profiler.hooks:
+            hook(stage.name, stage.subject, seconds, peak_bytes)
+        return False
+
+
+class TimedTemplate(VariableTemplate):
+    """VariableTemplate which adds the time spent applying variables to a stage."""
+
+    def __init__(self, template: VariableTemplate, stage: Stage):
+        self.template = template
+        self.stage = stage
+        self.variables = template.variables
+
+    def parse(self, value: str) -> tuple:
+        return self.template.parse(value)
+
+    def apply(self, value):
+        started_at = time.perf_counter()
+        result = self.template.apply(value)
+        self.stage.seconds += time.perf_counter() - started_at
+        self.stage.calls += 1
+        return result
+
+
+class Profiler:
+    """Wall time, call counts and optionally peak memory of the stages of a build.
+
+    A profiler measures the builds run while it is active as a context
+    manager.  Stages are recorded per subject, such as a markdown file or a
+    sheet.  Hooks are called with the stage name, subject, seconds and peak
+    bytes (None unless memory is traced) each time a stage ends.
+
+    Only the work done in this process is measured.  Files parsed in worker
+    processes with ``--jobs`` show up in the "parse files" stage as a whole.
+
+    >>> profiler = Profiler()
+    >>> with profiler:
+    ...     with measure('parse', 'a.md'):
+    ...         pass
+    >>> profiler.stages[('parse', 'a.md')].calls
+    1
+    >>> with measure('parse', 'a.md'):
+    ...     pass
+    >>> profiler.stages[('parse', 'a.md')].calls
+    1
+    """
+
+    def __init__(self, trace_memory: bool = False):
+        self.trace_memory = trace_memory
+        self.hooks = []
+        self.stages = {}
+        self.seconds = 0.0
+        self._measurements = []
+        self._started_at = 0.0
+        self._previous = None
+        self._started_tracing = False
+
+    def add_hook(self, hook) -> None:
+        """Register a callback called as hook(stage, subject, seconds, peak_bytes) when a stage ends."""
+        self.hooks.append(hook)
+
+    def stage(self, name: str, subject: str = '') -> Stage:
+        key = (name, subject)
+        stage = self.stages.get(key)
+        if stage is None:
+            stage = self.stages[key] = Stage(name, subject)
+        return stage
+
+    def measure(self, name: str, subject: str = '') -> _Measurement:
+        return _Measurement(self, self.stage(name, subject))
+
+    def __enter__(self) -> 'Profiler':
+        global _active
+        self._previous = _active
+        _active = self
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        self._started_at = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        global _active
+        self.seconds += time.perf_counter() - self._started_at
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        _active = self._previous
+        return False
+
+    def totals(self) -> list[Stage]:
+        """Return the measurements summed per stage in order of first appearance."""
+        totals = {}
+        for stage in self.stages.values():
+            total = totals.get(stage.name)
+            if total is None:
+                total = totals[stage.name] = Stage(stage.name)
+            total.calls += stage.calls
+            total.seconds += stage.seconds
+            if stage.peak_bytes is not None:
+                total.peak_bytes = max(total.peak_bytes or 0, stage.peak_bytes)
+        return list(totals.values())
+
+    def summary(self, limit: int = 5) -> str:
+        """Return a table of the totals per stage and the slowest subjects of each stage."""
+        lines = [f'{"stage":<16}{"subject":<32}{"calls":>8}{"seconds":>10}{"peak MiB":>10}']
+
+        def line(name: str, stage: Stage) -> str:
+            peak = f'{stage.peak_bytes / 2 ** 20:>10.1f}' if stage.peak_bytes is not None else f'{"-":>10}'
+            return f'{name:<16}{stage.subject[:31]:<32}{stage.calls:>8}{stage.seconds:>10.3f}{peak}'
+
+        for total in self.totals():
+            lines.append(line(total.name, total))
+            subjects = [
+                stage for stage in self.stages.values()
+                if stage.name == total.name and stage.subject
+            ]
+            subjects.sort(key=lambda stage: stage.seconds, reverse=True)
+            lines.extend(line('', stage) for stage in subjects[:limit])
+        lines.append(f'{"total":<16}{"":<32}{"":>8}{self.seconds:>10.3f}')
+        return '\n'.join(lines)
+
+    def report(self) -> dict:
+        return {
+            'seconds': self.seconds,
+            'trace_memory': self.trace_memory,
+            'totals': [stage.as_dict() for stage in self.totals()],
+            'stages': [stage.as_dict() for stage in self.stages.values()],
+        }
+
+    def write_json(self, path) -> None:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, indent=2)
+            f.write('\n')
+
+
+def active_profiler() -> Profiler | None:
+    return _active
+
+
+def measure(name: str, subject: str = ''):
+    """Measure a stage with the active profiler, or do nothing if there is none.
+
+    :param name: name of the stage such as "parse"
+    :param subject: what the stage works on, such as a file name or a sheet title
+    :return: context manager
+    """
+    if _active is None:
+        return _NULL_CONTEXT
+    return _active.measure(name, subject)
+
+
+def timed_variables(variables, subject: str = ''):
+    """Return variables which add their time to the "variables" stage of the active profiler.
+
+    :param variables: variables or VariableTemplate
+    :param subject: sheet title
+    :return: variables itself if there is no active profiler
+    """
+    if _active is None:
+        return variables
+    return TimedTemplate(VariableTemplate.of(variables), _active.stage('variables', subject))
@@ -0,0 +1,164 @@
+import glob
+import os
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from .cache import ParseCache, file_fingerprint
+from .composer import ExcelEngine, ExcelMode, OutputFormat
+from .excel_builder import (
+    COLUMN_CONFIG_PATHS, _build_output_in_worker, filter_ignored_files, parse_documents, read_column_config,
+    split_environments,
+)
+
+# directories which are not searched for projects
+SKIPPED_DIRECTORY_NAMES = {'config', 'output', 'node_modules', '__pycache__'}
+
+
+def find_projects(root_path) -> list[str]:
+    """Return the directories under root_path which have a config directory, root_path included.
+
+    Output, config and hidden directories are not searched.
+
+    :param root_path: path to the directory to search
+    :return: paths to the project directories in sorted order
+    """
+    projects = []
+    for directory_path, directory_names, _ in os.walk(root_path):
+        if 'config' in directory_names:
+            projects.append(directory_path)
+        directory_names[:] = sorted(
+            name for name in directory_names
+            if name not in SKIPPED_DIRECTORY_NAMES and not name.startswith('.')
+        )
+    return sorted(projects)
+
+
+class ProjectResult:
+    """Outcome of the build of a project."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.files = 0
+        self.started_at = time.perf_counter()
+        self.seconds = 0.0
+        self.errors = []
+
+    def finish(self) -> None:
+        self.seconds = time.perf_counter() - self.started_at
+
+    def status(self) -> str:
+        if self.errors:
+            return 'failed: ' + '; '.join(self.errors)
+        return 'ok' if self.files else 'no markdown files'
+
+
+def _call(function, *args) -> Future:
+    """Call function now and return its result as a future, for builds without a pool."""
+    future = Future()
+    try:
+        future.set_result(function(*args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def _describe(error: BaseException) -> str:
+    # on one line to fit in the summary
+    return f'{type(error).__name__}: ' + ' '.join(str(error).split())
+
+
+def build_projects(
+        root_path,
+        environment: str = None,
+        format: OutputFormat = OutputFormat.EXCEL,
+        excel_mode: ExcelMode = ExcelMode.NORMAL,
+        jobs: int = 1,
+        use_cache: bool = True,
+        compress: bool = False,
+        native_lists: bool = False,
+        deterministic: bool = False,
+        split_size: int = 0,
+        engine: ExcelEngine = ExcelEngine.OPENPYXL,
+        compression_level: int = None,
+) -> list[ProjectResult]:
+    """Build every project under a directory in one pool of worker processes.
+
+    A project is a directory with a config directory, built with its own
+    column config, variables and ignore file as ``convert`` builds it.  The
+    changed markdown files of a project are parsed in the pool, and then
+    the output of each environment is submitted to the pool, so that the
+    outputs of a project are written while the files of the next projects
+    are parsed.  An error fails the project it happens in but not the others.
+
+    :param root_path: path to the directory to search for projects
+    :param environment: environment signature, or comma separated environment signatures
+    :param format: output format
+    :param excel_mode: mode of the Excel composer
+    :param jobs: number of worker processes, 0 for the number of CPUs, 1 to build in this process
+    :param use_cache: load unchanged markdown files from the parse cache of each project
+    :param compress: gzip the output of the formats which support it
+    :param native_lists: write list columns as arrays in the formats which support it
+    :param deterministic: write the same bytes for the same documents in the formats which embed timestamps
+    :param split_size: size in bytes of the markdown files to parse in chunks in the pool, 0 for none
+    :param engine: library which writes Excel workbooks
+    :param compression_level: zlib compression level of the workbooks of the native engine, None for the default
+    :return: result of each project in the order of the paths
+    """
+    environments = split_environments(environment)
+    executor = ProcessPoolExecutor(max_workers=jobs or os.cpu_count() or 1) if jobs != 1 else None
+    submit = executor.submit if executor is not None else _call
+    results = []
+    builds = []
+    try:
+        for project_path in find_projects(root_path):
+            result = ProjectResult(os.path.relpath(project_path, root_path))
+            results.append(result)
+            try:
+                target_files = sorted(glob.glob(os.path.join(project_path, '*.md')))
+                target_files = filter_ignored_files(project_path, target_files)
+                result.files = len(target_files)
+                if not target_files:
+                    result.finish()
+                    continue
+                column_config = read_column_config(project_path)
+                cache = None
+                if use_cache:
+                    cache = ParseCache(
+                        project_path,
+                        file_fingerprint([os.path.join(project_path, 'config', path) for path in COLUMN_CONFIG_PATHS]),
+                    )
+                parsed_documents = parse_documents(target_files, column_config, jobs, cache, executor, split_size)
+                if cache is not None:
+                    cache.evict()
+            except Exception as e:
+                result.errors.append(_describe(e))
+                result.finish()
+                continue
+            for name in environments:
+                future = submit(
+                    _build_output_in_worker, project_path, name, format, excel_mode, column_config,
+                    parsed_documents, compress, native_lists, None, deterministic, engine, compression_level,
+                )
+                # the project is finished when the output of its last environment is
+                future.add_done_callback(lambda _, result=result: result.finish())
+                builds.append((result, future))
+
+        for result, future in builds:
+            error = future.exception()
+            if error is not None:
+                result.errors.append(_describe(error))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return results
+
+
+def summary(results: list[ProjectResult]) -> str:
+    """Return a table of the files, seconds and status of each project."""
+    width = max([len('project')] + [len(result.name) for result in results]) + 2
+    lines = [f'{"project":<{width}}{"files":>8}{"seconds":>10}  status']
+    for result in results:
+        lines.append(f'{result.name:<{width}}{result.files:>8}{result.seconds:>10.3f}  {result.status()}')
+    failed = sum(1 for result in results if result.errors)
+    lines.append(f'{len(results)} projects, {failed} failed')
+    return '\n'.join(lines)
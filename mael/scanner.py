@@ -0,0 +1,188 @@
+import io
+import mmap
+import os
+
+from .column_config import ColumnConfig, Document
+from .parser import MarkdownListParser, StepBuilder, column_of
+
+MIN_CHUNK_SIZE = 1024 * 1024
+
+
+def read_header_offset(parser: MarkdownListParser, file_path: str) -> tuple[Document | None, int]:
+    """Read the title and the summary of a markdown file.
+
+    :param parser: parser
+    :param file_path: path to the markdown file
+    :return: tuple of the document without steps, or None if there is no summary,
+        and the byte offset of the first line of the list section
+    """
+    offset = 0
+
+    def lines(f):
+        nonlocal offset
+        for line in f:
+            offset += len(line)
+            yield line.decode('utf-8')
+
+    with open(file_path, 'rb') as f:
+        document = parser.read_header(lines(f), file_path)
+    return document, offset
+
+
+def is_block_start(line: bytes) -> bool:
+    """Return True if line is a column header or a separator, where no column block continues.
+
+    >>> is_block_start(b'### Column\\n'), is_block_start(b' --- \\r\\n'), is_block_start(b'text---\\n')
+    (True, True, False)
+    """
+    if line.startswith(b'###'):
+        return column_of(line.decode('utf-8')) is not None
+    return line.strip() == b'---'
+
+
+def next_block_start(buffer, position: int, end: int) -> int | None:
+    """Return the offset of the first line at or after position which starts a block.
+
+    :param buffer: bytes or mmap of the file
+    :param position: offset to search from
+    :param end: offset to search to
+    :return: offset of the line, or None if there is none
+    """
+    if position > 0 and buffer[position - 1:position] != b'\n':
+        position = buffer.find(b'\n', position, end) + 1
+        if position == 0:
+            return None
+    while position < end:
+        line_end = buffer.find(b'\n', position, end)
+        line_end = end if line_end < 0 else line_end + 1
+        if is_block_start(buffer[position:line_end]):
+            return position
+        position = line_end
+    return None
+
+
+def chunk_boundaries(buffer, start: int, end: int, count: int) -> list[int]:
+    """Split buffer[start:end] into about count chunks at the lines which start a block.
+
+    No column block is split, so that the chunks can be parsed apart.
+
+    :param buffer: bytes or mmap of the file
+    :param start: offset of the list section
+    :param end: size of the file
+    :param count: number of chunks
+    :return: offsets of the chunks, from start to end
+
+    >>> text = b'### A\\n1\\n---\\n### A\\n2\\n### B\\n3\\n'
+    >>> chunk_boundaries(text, 0, len(text), 3)
+    [0, 12, 20, 28]
+    """
+    boundaries = [start]
+    size = (end - start) // max(count, 1)
+    for i in range(1, count):
+        boundary = next_block_start(buffer, max(start + i * size, boundaries[-1] + 1), end)
+        if boundary is None:
+            break
+        boundaries.append(boundary)
+    boundaries.append(end)
+    return boundaries
+
+
+def parse_chunk(file_path: str, start: int, end: int, column_config: ColumnConfig) -> tuple[list, list | None, dict]:
+    """Parse a chunk of the list section of a markdown file.
+
+    The blocks before the first separator may belong to the step which
+    the previous chunk leaves open, so they are returned as they are.
+    The steps after it are built as the whole file would build them.
+
+    :param file_path: path to the markdown file
+    :param start: offset of the chunk
+    :param end: offset of the end of the chunk
+    :param column_config: column config of the directory
+    :return: tuple of the blocks before the first separator, the steps after it
+        (None if the chunk has no separator) and the step left open at the end
+    """
+    with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        text = buffer[start:end].decode('utf-8')
+    parser = MarkdownListParser(column_config)
+    builder = StepBuilder(column_config.overwrite_for_repeat)
+    head = []
+    steps = None
+    # lines are split as a file in text mode splits them
+    for block in parser.iter_blocks(io.StringIO(text, newline=None)):
+        if steps is None:
+            if block is None:
+                steps = []
+            else:
+                head.append(block)
+            continue
+        step = builder.separate() if block is None else builder.add(*block)
+        if step:
+            steps.append(step)
+    return head, steps, builder.step
+
+
+def stitch_chunks(chunks, overwrite_for_repeat: bool = False) -> list[dict]:
+    """Join the results of parse_chunk in order into the steps of the file.
+
+    The blocks at the head of a chunk are added to the step the previous
+    chunk left open, as the parser would have added them.
+
+    :param chunks: results of parse_chunk in the order of the chunks
+    :param overwrite_for_repeat: overwrite_for_repeat of the column config
+    :return: steps
+
+    >>> stitch_chunks([([], [{'A': '1'}], {'A': '2'}), ([('B', '3'), ('A', '4')], None, {})])
+    [{'A': '1'}, {'A': '2', 'B': '3'}, {'A': '4'}]
+    >>> stitch_chunks([([], [{'A': '1'}], {'A': '2'}), ([('B', '3'), ('A', '4')], None, {})], True)
+    [{'A': '1'}, {'A': '4', 'B': '3'}]
+    """
+    builder = StepBuilder(overwrite_for_repeat)
+    steps = []
+    for head, chunk_steps, open_step in chunks:
+        for block in head:
+            step = builder.add(*block)
+            if step:
+                steps.append(step)
+        if chunk_steps is None:
+            continue
+        step = builder.separate()
+        if step:
+            steps.append(step)
+        steps.extend(chunk_steps)
+        builder.step = open_step
+    step = builder.separate()
+    if step:
+        steps.append(step)
+    return steps
+
+
+def parse_file_in_chunks(file_path: str, column_config: ColumnConfig, executor, workers: int) -> Document | None:
+    """Parse a markdown file in chunks in a process pool.
+
+    The file is memory-mapped, and its list section is split into chunks at
+    the lines which start a block, searched as bytes.  The chunks are parsed
+    in the pool and stitched in order, so the steps are the same as
+    MarkdownListParser.parse_file gives.  Filling blank columns from the
+    previous step works on the stitched steps.
+
+    :param file_path: path to the markdown file
+    :param column_config: column config of the directory
+    :param executor: process pool
+    :param workers: number of processes of the pool
+    :return: document with steps, or None if the file has no summary
+    """
+    document, offset = read_header_offset(MarkdownListParser(column_config), file_path)
+    if document is None:
+        return None
+    size = os.path.getsize(file_path)
+    if offset >= size:
+        document.steps = []
+        return document
+    count = max(1, min(workers * 4, (size - offset) // MIN_CHUNK_SIZE))
+    with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        boundaries = chunk_boundaries(buffer, offset, size, count)
+    starts = boundaries[:-1]
+    ends = boundaries[1:]
+    chunks = executor.map(parse_chunk, [file_path] * len(starts), starts, ends, [column_config] * len(starts))
+    document.steps = stitch_chunks(chunks, column_config.overwrite_for_repeat)
+    return document
@@ -0,0 +1,295 @@
+import glob
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import Future
+from functools import partial
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+from .column_config import ColumnConfig
+from .composer import ExcelMode, OutputFormat
+from .excel_builder import (
+    build_output, filter_ignored_files, parse_document, read_column_config, read_variables,
+)
+from .variables import VariableTemplate
+from .watcher import file_state
+
+OUTPUTS = {
+    'output.xlsx': (OutputFormat.EXCEL, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'output.csv.zip': (OutputFormat.CSV, 'application/zip'),
+    'output.tsv.zip': (OutputFormat.TSV, 'application/zip'),
+    'output.jsonl': (OutputFormat.JSONL, 'application/x-ndjson'),
+}
+JSON_CONTENT_TYPE = 'application/json'
+
+
+class LruCache:
+    """Dict which keeps only the capacity most recently used items.
+
+    >>> cache = LruCache(2)
+    >>> cache.put('a', 1); cache.put('b', 2); cache.get('a')
+    1
+    >>> cache.put('c', 3); cache.get('b') is None
+    True
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.items = OrderedDict()
+
+    def get(self, key):
+        value = self.items.get(key)
+        if value is not None:
+            self.items.move_to_end(key)
+        return value
+
+    def put(self, key, value) -> None:
+        self.items[key] = value
+        self.items.move_to_end(key)
+        while len(self.items) > self.capacity:
+            self.items.popitem(last=False)
+
+
+class Artifact:
+    def __init__(self, body: bytes, content_type: str, filename: str = None):
+        self.body = body
+        self.content_type = content_type
+        self.filename = filename
+
+
+class BuildService:
+    """Builds of a directory, kept in memory between requests.
+
+    The content hash of each file is computed again only when its
+    modification time or size changes, and a markdown file is parsed again
+    only when its hash changes.  A change of a config file parses all files
+    again.  Built artifacts are kept in an LRU cache keyed by the name, the
+    environment and the hashes of all files, and concurrent requests for an
+    artifact which is being built wait for the same build.
+    """
+
+    def __init__(self, directory_path, cache_size: int = 16):
+        self.directory_path = directory_path
+        self.artifacts = LruCache(cache_size)
+        self.lock = threading.Lock()
+        self.column_config = None
+        self.config_digest = None
+        self._hashes = {}
+        self._documents = {}
+        self._building = {}
+
+    def _file_hash(self, path: str) -> str:
+        state = file_state(path)
+        cached = self._hashes.get(path)
+        if cached is not None and cached[0] == state:
+            return cached[1]
+        with open(path, 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        self._hashes[path] = (state, digest)
+        return digest
+
+    def refresh(self) -> tuple[str, ColumnConfig, list]:
+        """Parse the changed files.
+
+        :return: tuple of the version, which is a hash of all files, the column config the documents were parsed
+            with, and the parsed documents
+        """
+        with self.lock:
+            config_digest = hashlib.sha256()
+            for path in sorted(glob.glob(os.path.join(self.directory_path, 'config', '*'))):
+                if os.path.isfile(path):
+                    config_digest.update(os.path.basename(path).encode('utf-8'))
+                    config_digest.update(self._file_hash(path).encode('utf-8'))
+            config_digest = config_digest.hexdigest()
+            if config_digest != self.config_digest:
+                self.column_config = read_column_config(self.directory_path)
+                self.config_digest = config_digest
+                self._documents = {}
+
+            version = hashlib.sha256(config_digest.encode('utf-8'))
+            target_files = filter_ignored_files(
+                self.directory_path, sorted(glob.glob(os.path.join(self.directory_path, '*.md'))))
+            documents = {}
+            for path in target_files:
+                digest = self._file_hash(path)
+                cached = self._documents.get(path)
+                if cached is None or cached[0] != digest:
+                    cached = (digest, parse_document(path, self.column_config))
+                documents[path] = cached
+                version.update(os.path.basename(path).encode('utf-8'))
+                version.update(digest.encode('utf-8'))
+            self._documents = documents
+            return version.hexdigest(), self.column_config, [parsed for _, parsed in documents.values() if parsed is not None]
+
+    def artifact(self, key: tuple, build) -> Artifact:
+        """Return the cached artifact for key, or build it once for all concurrent requests.
+
+        :param key: key of the artifact
+        :param build: function which builds the artifact
+        :return: artifact
+        """
+        with self.lock:
+            artifact = self.artifacts.get(key)
+            if artifact is not None:
+                return artifact
+            future = self._building.get(key)
+            owner = future is None
+            if owner:
+                future = self._building[key] = Future()
+        if not owner:
+            return future.result()
+        try:
+            artifact = build()
+        except BaseException as e:
+            with self.lock:
+                del self._building[key]
+            future.set_exception(e)
+            raise
+        with self.lock:
+            self.artifacts.put(key, artifact)
+            del self._building[key]
+        future.set_result(artifact)
+        return artifact
+
+    def build_output(
+            self,
+            name: str,
+            environment: str | None,
+            column_config: ColumnConfig,
+            parsed_documents: list,
+    ) -> Artifact:
+        format, content_type = OUTPUTS[name]
+        with tempfile.TemporaryDirectory() as output_directory:
+            build_output(
+                self.directory_path, environment, format, ExcelMode.NORMAL, column_config, parsed_documents,
+                output_directory=output_directory,
+            )
+            output_path = os.path.join(output_directory, 'output')
+            (filename,) = [name for name in os.listdir(output_path) if not name.startswith('.')]
+            path = os.path.join(output_path, filename)
+            if not os.path.isdir(path):
+                with open(path, 'rb') as f:
+                    return Artifact(f.read(), content_type, filename)
+            buffer = io.BytesIO()
+            with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+                for member in sorted(os.listdir(path)):
+                    archive.write(os.path.join(path, member), member)
+            return Artifact(buffer.getvalue(), content_type, filename + '.zip')
+
+    def build_sheet(self, title: str, environment: str | None, parsed_documents: list) -> Artifact | None:
+        for document, columns, steps in parsed_documents:
+            if document.title == title:
+                break
+        else:
+            return None
+        template = VariableTemplate(read_variables(self.directory_path, environment))
+        body = {
+            'title': template.apply(document.title),
+            'summary_lines': [template.apply(line) for line in document.summary_lines],
+            'columns': columns,
+            'rows': [
+                {column: template.apply(step[column]) for column in columns if column in step}
+                for step in steps
+            ],
+        }
+        return Artifact(json.dumps(body, ensure_ascii=False).encode('utf-8'), JSON_CONTENT_TYPE)
+
+
+def etag_of(key: tuple) -> str:
+    return '"' + hashlib.sha256(repr(key).encode('utf-8')).hexdigest()[:32] + '"'
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """Serves the outputs of a BuildService.
+
+    GET / lists the sheets and outputs.  GET /output.xlsx, /output.csv.zip,
+    /output.tsv.zip and /output.jsonl return the outputs, and
+    GET /sheets/TITLE.json returns one sheet as JSON.  The environment is
+    given as ?env=dev.
+    """
+    service: BuildService = None
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        environment = parse_qs(url.query).get('env', [None])[0] or None
+        path = unquote(url.path)
+        try:
+            version, column_config, parsed_documents = self.service.refresh()
+            if path == '/':
+                self.send_index(environment, parsed_documents)
+                return
+            if path in ('/' + name for name in OUTPUTS):
+                name = path[1:]
+                key = (name, environment, version)
+                build = partial(self.service.build_output, name, environment, column_config, parsed_documents)
+            elif path.startswith('/sheets/') and path.endswith('.json'):
+                title = path[len('/sheets/'):-len('.json')]
+                if not any(document.title == title for document, _, _ in parsed_documents):
+                    self.send_error(HTTPStatus.NOT_FOUND, f'No sheet titled {title}')
+                    return
+                key = ('sheet', title, environment, version)
+                build = partial(self.service.build_sheet, title, environment, parsed_documents)
+            else:
+                self.send_error(HTTPStatus.NOT_FOUND)
+                return
+
+            etag = etag_of(key)
+            if etag in [tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')]:
+                self.send_response(HTTPStatus.NOT_MODIFIED)
+                self.send_header('ETag', etag)
+                self.end_headers()
+                return
+            artifact = self.service.artifact(key, build)
+        except Exception as e:
+            self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR, str(e))
+            return
+
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-Type', artifact.content_type)
+        self.send_header('Content-Length', str(len(artifact.body)))
+        self.send_header('ETag', etag)
+        if artifact.filename:
+            self.send_header('Content-Disposition', f'attachment; filename="{artifact.filename}"')
+        self.end_headers()
+        self.wfile.write(artifact.body)
+
+    def send_index(self, environment: str | None, parsed_documents: list) -> None:
+        query = f'?env={quote(environment)}' if environment else ''
+        body = json.dumps({
+            'sheets': [
+                {'title': document.title, 'url': f'/sheets/{quote(document.title)}.json{query}'}
+                for document, _, _ in parsed_documents
+            ],
+            'outputs': [f'/{name}{query}' for name in OUTPUTS],
+        }, ensure_ascii=False).encode('utf-8')
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-Type', JSON_CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve(directory_path, host: str = '127.0.0.1', port: int = 8000, cache_size: int = 16) -> None:
+    """Serve the outputs of a directory over HTTP until interrupted.
+
+    :param directory_path: path to the directory which holds markdown files
+    :param host: host to listen on
+    :param port: port to listen on
+    :param cache_size: number of built artifacts to keep in memory
+    """
+    handler = type('Handler', (RequestHandler,), {'service': BuildService(directory_path, cache_size)})
+    server = ThreadingHTTPServer((host, port), handler)
+    print(f'Serving {directory_path} on http://{host}:{server.server_port}/ (Ctrl-C to stop)')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print('Stopped serving')
+    finally:
+        server.server_close()
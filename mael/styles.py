@@ -0,0 +1,104 @@
+import openpyxl as px
+from openpyxl.cell import Cell
+from openpyxl.styles.borders import DEFAULT_BORDER
+from openpyxl.styles.fonts import DEFAULT_FONT
+
+from .column_config import Alignment, ColumnCondition, ColumnConfig
+
+THIN_SIDE = px.styles.Side(border_style='thin')
+THIN_BORDER = px.styles.Border(left=THIN_SIDE, right=THIN_SIDE, top=THIN_SIDE, bottom=THIN_SIDE)
+
+
+def build_fill(fill) -> px.styles.PatternFill | None:
+    """Build a fill from a color string such as "FFFF00" or a dict of PatternFill arguments.
+
+    >>> build_fill('FFFF00').fgColor.rgb
+    '00FFFF00'
+    >>> build_fill(None) is None
+    True
+    """
+    if not fill:
+        return None
+    if isinstance(fill, dict):
+        return px.styles.PatternFill(**fill)
+    return px.styles.PatternFill(fill_type='solid', start_color=str(fill), end_color=str(fill))
+
+
+def styled_cell(ws, value, style_array) -> Cell:
+    """Create a cell to append to a worksheet, like openpyxl's WriteOnlyCell with a style array."""
+    return Cell(ws, row=1, column=1, value=value, style_array=style_array)
+
+
+class StyleRegistry:
+    """Named styles of a workbook, built once per distinct combination.
+
+    A combination consists of role (summary title, header or cell), alignment,
+    border, font, fill and number format.  The registry adds a named style to
+    the workbook the first time a combination is requested and hands out its
+    style array afterwards, so cells can be created with ``styled_cell``
+    without building any style object per cell.
+    """
+
+    def __init__(self, workbook: px.Workbook, column_config: ColumnConfig = None):
+        self.workbook = workbook
+        self.column_config = column_config or ColumnConfig()
+        self._styles = {}
+
+    def _font(self, role: str, condition: ColumnCondition | None) -> px.styles.Font:
+        font = dict(self.column_config.font)
+        if role == 'cell':
+            if condition and condition.font:
+                font.update(condition.font)
+            if not font:
+                return DEFAULT_FONT
+            return px.styles.Font(**{'name': DEFAULT_FONT.name, 'size': DEFAULT_FONT.sz, **font})
+        font['bold'] = True
+        if role == 'header':
+            font.update(self.column_config.header_font)
+        return px.styles.Font(**font)
+
+    def _key(self, role: str, condition: ColumnCondition | None) -> tuple:
+        if role == 'summary':
+            return role,
+        alignment = condition.alignment if condition else Alignment.LEFT
+        if role == 'header':
+            return role, alignment
+        return (
+            role,
+            alignment,
+            repr(sorted(condition.font.items())) if condition and condition.font else None,
+            repr(condition.fill) if condition and condition.fill else None,
+            condition.number_format if condition else None,
+        )
+
+    def _build(self, name: str, role: str, condition: ColumnCondition | None) -> px.styles.NamedStyle:
+        style = px.styles.NamedStyle(name=name, font=self._font(role, condition), border=DEFAULT_BORDER)
+        if role == 'summary':
+            return style
+        style.border = THIN_BORDER
+        style.alignment = (condition.alignment if condition else Alignment.LEFT).excel_alignment()
+        if role == 'header':
+            fill = build_fill(self.column_config.header_fill)
+        else:
+            fill = build_fill(condition.fill) if condition else None
+            if condition and condition.number_format:
+                style.number_format = condition.number_format
+        if fill:
+            style.fill = fill
+        return style
+
+    def style_array(self, role: str, condition: ColumnCondition = None):
+        """Return the style array of the named style for role and column condition.
+
+        :param role: "summary", "header" or "cell"
+        :param condition: condition of the column, or None for a column without configuration
+        :return: openpyxl style array to pass to a cell
+        """
+        key = self._key(role, condition)
+        style_array = self._styles.get(key)
+        if style_array is None:
+            style = self._build(f'mael {role} {len(self._styles) + 1}', role, condition)
+            self.workbook.add_named_style(style)
+            style_array = style.as_tuple()
+            self._styles[key] = style_array
+        return style_array
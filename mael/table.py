@@ -0,0 +1,102 @@
+from typing import Iterable, Iterator
+
+
+class Table:
+    """Columnar table of steps.
+
+    The table holds an ordered column index and one value array per column.
+    A blank cell is None.  Normalization runs as operations over whole
+    columns, and composers read the rows as dicts of the non-blank cells.
+
+    >>> table = Table.from_steps([{'A': '1', 'L': ['x', 'y']}, {'B': '2'}])
+    >>> table.columns
+    ['A', 'L', 'B']
+    >>> table.fill_forward('A')
+    >>> table.expand_list('L')
+    ['L (1)', 'L (2)']
+    >>> table.set_increment('No.')
+    >>> list(table)
+    [{'A': '1', 'L (1)': 'x', 'L (2)': 'y', 'No.': 1}, {'A': '1', 'B': '2', 'No.': 2}]
+    """
+
+    def __init__(self, length: int = 0):
+        self.length = length
+        self.columns = []
+        self.values = {}
+
+    @classmethod
+    def from_steps(cls, steps: Iterable[dict]) -> 'Table':
+        """Build a table from steps given as dicts of column and value.
+
+        :param steps: steps
+        :return: table whose columns are in order of appearance
+        """
+        table = cls()
+        values = table.values
+        row = -1
+        for row, step in enumerate(steps):
+            for column, value in step.items():
+                array = values.get(column)
+                if array is None:
+                    array = values[column] = [None] * row
+                    table.columns.append(column)
+                elif len(array) < row:
+                    array.extend([None] * (row - len(array)))
+                array.append(value)
+        table.length = row + 1
+        for array in values.values():
+            array.extend([None] * (table.length - len(array)))
+        return table
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __contains__(self, column: str) -> bool:
+        return column in self.values
+
+    def __iter__(self) -> Iterator[dict]:
+        columns = self.columns
+        if not columns:
+            yield from ({} for _ in range(self.length))
+            return
+        for row in zip(*[self.values[column] for column in columns]):
+            yield {column: value for column, value in zip(columns, row) if value is not None}
+
+    def add_column(self, column: str, values: list = None) -> None:
+        """Add a column, or replace the values of an existing column.
+
+        :param column: column name
+        :param values: values of the column, blank if None
+        """
+        if column not in self.values:
+            self.columns.append(column)
+        self.values[column] = list(values) if values is not None else [None] * self.length
+
+    def fill_forward(self, column: str) -> None:
+        """Fill blank cells of column with the value of the previous row."""
+        array = self.values[column]
+        previous = None
+        for row, value in enumerate(array):
+            if value is None:
+                array[row] = previous
+            else:
+                previous = value
+
+    def expand_list(self, column: str) -> list[str]:
+        """Replace a list column with numbered columns such as "Column (1)".
+
+        :param column: list column
+        :return: names of the numbered columns
+        """
+        array = self.values.pop(column)
+        position = self.columns.index(column)
+        count = max((len(value) for value in array if value is not None), default=0)
+        names = [f'{column} ({i + 1})' for i in range(count)]
+        for i, name in enumerate(names):
+            self.values[name] = [value[i] if value is not None and i < len(value) else None for value in array]
+        self.columns[position:position + 1] = names
+        return names
+
+    def set_increment(self, column: str, start: int = 1) -> None:
+        """Set sequential numbers to column."""
+        self.add_column(column, range(start, start + self.length))
@@ -0,0 +1,129 @@
+import re
+from functools import lru_cache
+
+PLACEHOLDER_PATTERN = re.compile(r'{{\s*([^{}]*?)\s*}}')
+# characters which make a variable name a pattern other than the name itself
+METACHARACTERS = frozenset('.^$*+?{}[]\\|()')
+
+
+def expand_value(value: str) -> str:
+    """Expand a variable value the way ``re.sub`` expands a replacement string.
+
+    Variables used to be applied with ``re.sub``, so backslash escapes in
+    values such as ``\\n`` were expanded.  The expansion is done once here so
+    that the output stays the same.
+
+    >>> expand_value('a\\\\tb')
+    'a\\tb'
+    >>> expand_value('plain')
+    'plain'
+    """
+    if '\\' not in value:
+        return value
+    return re.sub(r'\A', value, '')
+
+
+class VariableTemplate:
+    """Variables compiled once and applied to cell values in a single pass.
+
+    The output is the same as that of applying the variables one after
+    another with ``re.sub`` in the order they are defined, which mael used
+    to do: a placeholder of a variable becomes its value with the variables
+    defined after it applied, which is computed once here.  Then every
+    ``{{ NAME }}`` placeholder of a cell is found with one precompiled pattern
+    and replaced with a dict lookup, and undefined placeholders are kept.
+
+    Where a single pass could give another result, that is, a name which is
+    a pattern rather than a plain name or a value with a brace which could
+    make a placeholder with the text around it, the variables are applied
+    one after another as before.
+
+    Parsed segments are cached for the most recent distinct strings with
+    placeholders, since the same cell value tends to repeat many times in a
+    build, while the memory of a streamed build does not grow with the data.
+
+    >>> t = VariableTemplate({'b': 'B'})
+    >>> t.apply('a{{b}}c{{ b }}')
+    'aBcB'
+    >>> t.apply('{{ x }}')
+    '{{ x }}'
+    >>> t.apply(1)
+    1
+
+    A value holds the values of the variables defined after it.
+
+    >>> t = VariableTemplate({'URL': 'https://{{ HOST }}/', 'HOST': 'example.com', 'NAME': '{{ URL }}'})
+    >>> t.apply('{{ URL }} {{ NAME }}'), t.sequential
+    ('https://example.com/ {{ URL }}', True)
+    >>> VariableTemplate({'a.b': 'X'}).apply('{{ a.b }} {{ a-b }}')
+    'X X'
+    """
+
+    def __init__(self, variables: dict):
+        self.variables = dict(variables)
+        self._patterns = [
+            (re.compile(r'{{\s*' + name + r'\s*}}'), value) for name, value in self.variables.items()
+        ]
+        # the value of each placeholder, which the variables defined later were applied to
+        self.values = {}
+        for index, name in enumerate(self.variables):
+            value = expand_value(self.variables[name])
+            for pattern, replacement in self._patterns[index + 1:]:
+                value = pattern.sub(replacement, value)
+            self.values[name] = value
+        self.sequential = (
+            any(METACHARACTERS.intersection(name) for name in self.variables)
+            or any('{' in value or '}' in value for value in self.values.values())
+        )
+
+    @classmethod
+    def of(cls, variables) -> 'VariableTemplate':
+        """Return ``variables`` itself if it is already compiled."""
+        if isinstance(variables, cls):
+            return variables
+        return cls(variables or {})
+
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def parse(value: str) -> tuple:
+        """Split value into literal text and placeholder names.
+
+        Even indexes hold literal text and odd indexes hold
+        ``(placeholder, name)`` pairs.
+
+        >>> VariableTemplate({}).parse('a{{ b }}c')
+        ('a', ('{{ b }}', 'b'), 'c')
+        """
+        segments = []
+        position = 0
+        for match in PLACEHOLDER_PATTERN.finditer(value):
+            segments.append(value[position:match.start()])
+            segments.append((match.group(0), match.group(1)))
+            position = match.end()
+        segments.append(value[position:])
+        return tuple(segments)
+
+    def apply(self, value):
+        """Apply variables to value.
+
+        :param value: value to apply variables
+        :return: value with variables applied, or value itself if it is not a string
+        """
+        if not isinstance(value, str) or '{{' not in value:
+            return value
+        if self.sequential:
+            for pattern, replacement in self._patterns:
+                value = pattern.sub(replacement, value)
+            return value
+        segments = self.parse(value)
+        if len(segments) == 1:
+            return value
+        values = self.values
+        parts = []
+        for index, segment in enumerate(segments):
+            if index % 2 == 0:
+                parts.append(segment)
+                continue
+            placeholder, name = segment
+            parts.append(values.get(name, placeholder))
+        return ''.join(parts)
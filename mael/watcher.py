@@ -0,0 +1,149 @@
+import glob
+import os
+import time
+
+from .composer import OutputFormat, ExcelMode
+from .excel_builder import (
+    build_output, filter_ignored_files, parse_document, read_column_config, split_environments,
+)
+
+
+def file_state(path: str) -> tuple[int, int] | None:
+    """Return the modification time and size of a file, or None if it does not exist."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class Watcher:
+    """Rebuild the output of a directory whenever its files change.
+
+    The watcher polls the modification time and size of the markdown files
+    and of the files in the config directory.  Changes are collected until
+    nothing changes for ``debounce`` seconds, so that a burst of saves causes
+    only one rebuild.  Parsed documents are kept in memory and only the
+    changed markdown files are parsed again.  A change of a config file
+    (columns.yml, variables*.ini, ignore.txt) invalidates all of them.
+    """
+
+    def __init__(
+            self,
+            directory_path,
+            environment: str = None,
+            format: OutputFormat = OutputFormat.EXCEL,
+            excel_mode: ExcelMode = ExcelMode.NORMAL,
+            interval: float = 0.5,
+            debounce: float = 0.3,
+    ):
+        self.directory_path = directory_path
+        self.environments = split_environments(environment)
+        self.format = format
+        self.excel_mode = excel_mode
+        self.interval = interval
+        self.debounce = debounce
+        self.column_config = None
+        self.parsed = {}
+        self.states = {}
+
+    def markdown_files(self) -> list[str]:
+        return sorted(glob.glob(os.path.join(self.directory_path, '*.md')))
+
+    def config_files(self) -> list[str]:
+        return sorted(glob.glob(os.path.join(self.directory_path, 'config', '*')))
+
+    def snapshot(self) -> dict[str, tuple[int, int]]:
+        """Return the state of every watched file.
+
+        :return: dict of path and tuple of modification time and size
+        """
+        states = {}
+        for path in self.markdown_files() + self.config_files():
+            state = file_state(path)
+            if state is not None:
+                states[path] = state
+        return states
+
+    def changed_paths(self, states: dict) -> set[str]:
+        """Return the paths which were added, modified or removed since the last build."""
+        return {
+            path for path in states.keys() | self.states.keys()
+            if states.get(path) != self.states.get(path)
+        }
+
+    def wait_for_changes(self) -> dict:
+        """Poll until some files change and stay unchanged for the debounce period.
+
+        :return: the settled states of the watched files
+        """
+        states = self.snapshot()
+        while not self.changed_paths(states):
+            time.sleep(self.interval)
+            states = self.snapshot()
+        settled_at = time.monotonic()
+        while time.monotonic() - settled_at < self.debounce:
+            time.sleep(min(self.interval, self.debounce))
+            latest = self.snapshot()
+            if latest != states:
+                states = latest
+                settled_at = time.monotonic()
+        return states
+
+    def rebuild(self, states: dict) -> int:
+        """Parse the changed markdown files and build the outputs.
+
+        :param states: states of the watched files
+        :return: number of parsed markdown files
+        """
+        changed = self.changed_paths(states)
+        self.states = states
+        # forget what the changes invalidate before anything can fail,
+        # so that the next build parses them again instead of reusing the old results
+        for path in changed:
+            self.parsed.pop(path, None)
+        config_directory = os.path.join(self.directory_path, 'config')
+        if self.column_config is None or any(os.path.dirname(path) == config_directory for path in changed):
+            self.column_config = None
+            self.parsed = {}
+            self.column_config = read_column_config(self.directory_path)
+
+        target_files = filter_ignored_files(self.directory_path, self.markdown_files())
+        parsed = {}
+        parse_count = 0
+        for path in target_files:
+            if path in self.parsed:
+                parsed[path] = self.parsed[path]
+            else:
+                parsed[path] = parse_document(path, self.column_config)
+                parse_count += 1
+        self.parsed = parsed
+
+        if not target_files:
+            print(f'No markdown files found in {self.directory_path}')
+            return parse_count
+        for environment in self.environments:
+            build_output(
+                self.directory_path, environment, self.format, self.excel_mode,
+                self.column_config, [parsed[path] for path in target_files],
+            )
+        return parse_count
+
+    def run(self) -> None:
+        """Build once, then rebuild on every change until interrupted."""
+        print(f'Watching {self.directory_path} (Ctrl-C to stop)')
+        states = self.snapshot()
+        try:
+            while True:
+                started_at = time.perf_counter()
+                try:
+                    parse_count = self.rebuild(states)
+                except Exception as e:
+                    # keep watching, the next save may fix the error
+                    self.states = states
+                    print(f'Build failed: {e}')
+                else:
+                    print(f'Rebuilt in {time.perf_counter() - started_at:.2f}s ({parse_count} files parsed)')
+                states = self.wait_for_changes()
+        except KeyboardInterrupt:
+            print('Stopped watching')
@@ -0,0 +1,201 @@
+import hashlib
+import os
+import shutil
+import tempfile
+
+from . import __version__
+from .cache import SHEET_CACHE_DIRECTORY, SHEET_CACHE_FORMAT, SheetCache
+from .composer import Composer
+from .table import Table
+from .variables import VariableTemplate
+from .xlsx_writer import FIXED_DATETIME, SharedStrings, SheetWriter, StyleTable, XlsxPackage, numbered_title
+
+
+class XlsxComposer(Composer):
+    """Write the documents to a workbook from worksheets rendered with the standard library.
+
+    Each document is rendered to worksheet XML with inline strings and the
+    cell formats of a StyleTable, which depend only on the column config, so
+    a rendered worksheet does not depend on the other sheets.  The XML is
+    kept in a SheetCache keyed by a hash of the title, summary, columns,
+    values and variables of the document, and a build renders only the
+    documents which changed and zips the cached worksheets of the others.
+
+    Without use_cache, the worksheets are written straight into the zip
+    package as the steps come, with the strings shared in the workbook,
+    which is faster than ExcelComposer and keeps memory low for streams.
+
+    The sheets look the same as ExcelComposer writes them, and a long
+    document is split into sheets in the same way.  With the cache, a
+    document given as a stream of steps is held in memory to compute its hash.
+    """
+    MAX_ROWS = 1048576
+
+    def __init__(self, max_rows: int = MAX_ROWS, deterministic: bool = False, use_cache: bool = True,
+                 compression_level: int = None):
+        super().__init__()
+        self.max_rows = max_rows
+        self.deterministic = deterministic
+        self.use_cache = use_cache
+        self.compression_level = compression_level
+        self.cache = None
+        self.styles = None
+        self.sheets = []
+        self._parts = []
+        self._fingerprint = None
+        self._package = None
+        self._strings = None if use_cache else SharedStrings()
+        self._temporary_dir_path = None
+
+    @staticmethod
+    def file_name(environment, basename) -> str:
+        if environment is None or environment == '':
+            return basename + '.xlsx'
+        return f'{basename}_{environment}.xlsx'
+
+    def begin(self, directory_path, environment, basename) -> None:
+        if self.use_cache:
+            name, _ = os.path.splitext(self.file_name(environment, basename))
+            self.cache = SheetCache(os.path.join(directory_path, SHEET_CACHE_DIRECTORY, name))
+
+    def _key(self, document, template, column_config, all_conditions, columns, table: Table) -> str:
+        digest = hashlib.sha256()
+        for part in (
+                __version__, SHEET_CACHE_FORMAT, self._fingerprint, self.max_rows,
+                document.title, document.summary_lines, list(template.variables.items()),
+                columns, column_config.increment_columns(),
+                [all_conditions[column].width if column in all_conditions else None for column in columns],
+                # the formats of the columns, which styles.xml alone does not tell
+                [self.styles.index('header', all_conditions.get(column)) for column in columns],
+                [self.styles.index('cell', all_conditions.get(column)) for column in columns],
+        ):
+            digest.update(repr(part).encode('utf-8'))
+            digest.update(b'\0')
+        for column in columns:
+            digest.update(repr(table.values.get(column)).encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def _new_package(self, path) -> XlsxPackage:
+        return XlsxPackage(path, self.compression_level, FIXED_DATETIME if self.deterministic else None)
+
+    def _open_part(self, key: str, index: int, title: str) -> tuple:
+        """Return a binary file to write a worksheet to, and the path to the cached part or None."""
+        if self.cache is not None:
+            os.makedirs(self.cache.path, exist_ok=True)
+            path = self.cache.part_path(key, index)
+            return open(path + '.tmp', 'wb', buffering=1024 * 1024), path
+        if self._package is None:
+            self._temporary_dir_path = tempfile.mkdtemp()
+            self._package = self._new_package(os.path.join(self._temporary_dir_path, 'workbook.xlsx'))
+        return self._package.add_sheet(title), None
+
+    def _render(self, key, document, column_config, template, all_conditions, columns, steps) -> list[tuple]:
+        styles = self.styles
+        widths = [all_conditions[column].width if column in all_conditions else None for column in columns]
+        header_styles = [styles.index('header', all_conditions.get(column)) for column in columns]
+        cell_styles = [styles.index('cell', all_conditions.get(column)) for column in columns]
+        summary_lines = [template.apply(line) for line in document.summary_lines]
+        capacity = self.max_rows - (len(summary_lines) + 4)
+        if capacity < 1:
+            raise ValueError(f'The summary of {document.title} does not fit in a sheet.')
+        increment_columns = column_config.increment_columns()
+
+        sheets = []
+        files = []
+
+        def create_sheet() -> SheetWriter:
+            title = numbered_title(document.title, len(sheets) + 1) if sheets else document.title
+            files.append(self._open_part(key, len(sheets), title))
+            writer = SheetWriter(files[-1][0], widths, self._strings)
+            writer.append(['Summary'], [styles.index('summary')])
+            writer.append([], [])
+            for summary_line in summary_lines:
+                writer.append([summary_line], [0])
+            writer.append([], [])
+            writer.append(columns, header_styles)
+            sheets.append([title, 0, files[-1][1]])
+            return writer
+
+        try:
+            writer = create_sheet()
+            row_count = 0
+            for index, step in enumerate(steps):
+                if row_count == capacity:
+                    # split the document into sheets
+                    writer.close()
+                    files[-1][0].close()
+                    if len(sheets) == 1:
+                        sheets[0][0] = numbered_title(document.title, 1)
+                        if self._package is not None:
+                            self._package.rename_sheet(len(self._package.titles) - 1, sheets[0][0])
+                    writer = create_sheet()
+                    row_count = 0
+                row_count += 1
+                sheets[-1][1] = row_count
+
+                increment_value = index + 1
+                for column in increment_columns:
+                    step[column] = increment_value
+                writer.append(
+                    [template.apply(step[column]) if column in step else None for column in columns], cell_styles)
+            writer.close()
+        finally:
+            for file, _ in files:
+                file.close()
+        for _, path in files:
+            if path is not None:
+                os.replace(path + '.tmp', path)
+        return [tuple(sheet) for sheet in sheets]
+
+    def add_sheet(self, document, column_config, variables, all_conditions, columns, steps):
+        template = VariableTemplate.of(variables)
+        if self.styles is None:
+            self.styles = StyleTable(column_config)
+            self._fingerprint = hashlib.sha256(self.styles.xml()).hexdigest()
+        if self.cache is None:
+            for title, rows, _ in self._render(None, document, column_config, template, all_conditions, columns,
+                                               steps):
+                self.sheets.append((document.title, title, rows))
+            return
+        if not isinstance(steps, Table):
+            steps = Table.from_steps(steps)
+        key = self._key(document, template, column_config, all_conditions, columns, steps)
+        parts = self.cache.load(key)
+        if parts is None:
+            parts = self._render(key, document, column_config, template, all_conditions, columns, steps)
+            self.cache.store(key, [(title, rows) for title, rows, _ in parts])
+        for title, rows, path in parts:
+            self._parts.append((title, path))
+            self.sheets.append((document.title, title, rows))
+
+    def save(self, path) -> bool:
+        """Zip the worksheets into a workbook at path.
+
+        :return: False if the file was left as it was since its content is unchanged
+        :raises ValueError: if there is no sheet
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        package = self._package or self._new_package(path + '.tmp')
+        try:
+            for title, part_path in self._parts:
+                package.add_sheet(title, part_path)
+            package.close(self.styles or StyleTable(), self._strings if self._package is not None else None)
+            # the numbered titles of sheets whose titles other sheets had
+            self.sheets = [(title, sheet, rows) for (title, _, rows), sheet in zip(self.sheets, package.titles)]
+            return self.publish(package.path, path)
+        finally:
+            if os.path.exists(package.path):
+                os.remove(package.path)
+            self._package = None
+            if self._temporary_dir_path is not None:
+                shutil.rmtree(self._temporary_dir_path)
+                self._temporary_dir_path = None
+
+    def compose(self, directory_path, environment, basename):
+        filename = self.file_name(environment, basename)
+        written = self.save(os.path.join(directory_path, 'output', filename))
+        print('Saved' if written else 'Unchanged', filename)
+        if self.cache is not None:
+            self.cache.evict()
+            print(self.cache.stats())
@@ -0,0 +1,530 @@
+import datetime
+import re
+import shutil
+import zipfile
+from xml.sax.saxutils import escape, quoteattr
+
+from .column_config import Alignment, ColumnCondition, ColumnConfig
+
+# The parts of an xlsx file are written with the standard library, so that a
+# worksheet can be rendered, cached and put into a package without openpyxl.
+
+MAIN_NAMESPACE = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+RELATIONSHIPS_NAMESPACE = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+XML_DECLARATION = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+
+ILLEGAL_CHARACTERS_PATTERN = re.compile(r'[\000-\010]|[\013-\014]|[\016-\037]')
+INVALID_TITLE_PATTERN = re.compile(r'[\\*?:/\[\]]')
+
+DEFAULT_FONT = ('<font><name val="Calibri"/><family val="2"/><color theme="1"/><sz val="11"/>'
+                '<scheme val="minor"/></font>')
+EMPTY_BORDER = '<border><left/><right/><top/><bottom/><diagonal/></border>'
+THIN_BORDER = ('<border><left style="thin"/><right style="thin"/><top style="thin"/>'
+               '<bottom style="thin"/><diagonal/></border>')
+FIRST_CUSTOM_NUMBER_FORMAT = 164
+MAX_TITLE_LENGTH = 31
+
+# Document properties of deterministic workbooks carry this instead of the time of the build.
+FIXED_DATETIME = datetime.datetime(2000, 1, 1)
+
+
+def column_letter(index: int) -> str:
+    """Return the letter of a column from its 1-based index.
+
+    >>> column_letter(1), column_letter(26), column_letter(27), column_letter(703)
+    ('A', 'Z', 'AA', 'AAA')
+    """
+    letters = ''
+    while index > 0:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def check_string(value: str) -> str:
+    if ILLEGAL_CHARACTERS_PATTERN.search(value):
+        raise ValueError(f'{value!r} cannot be used in worksheets.')
+    return value
+
+
+def text_element(tag: str, value: str) -> str:
+    """Return an element which holds text, keeping its leading and trailing spaces.
+
+    >>> text_element('t', 'a < b'), text_element('t', ' a')
+    ('<t>a &lt; b</t>', '<t xml:space="preserve"> a</t>')
+    """
+    value = escape(check_string(value))
+    if value[:1].isspace() or value[-1:].isspace():
+        return f'<{tag} xml:space="preserve">{value}</{tag}>'
+    return f'<{tag}>{value}</{tag}>'
+
+
+def check_sheet_title(title: str, titles) -> str:
+    """Return a title for a new sheet, numbered if another sheet has it, as openpyxl names it.
+
+    :param title: title of the sheet
+    :param titles: titles of the sheets added before, in lower case
+    :return: title which no sheet has
+    :raise ValueError: if the title has a character which is not allowed
+
+    >>> check_sheet_title('List', {'list', 'list1'})
+    'List2'
+    """
+    match = INVALID_TITLE_PATTERN.search(title)
+    if match:
+        raise ValueError(f'Invalid character {match.group(0)} found in sheet title')
+    if title.lower() not in titles:
+        return title
+    number = 1
+    while f'{title}{number}'.lower() in titles:
+        number += 1
+    return f'{title}{number}'
+
+
+def numbered_title(title: str, number: int) -> str:
+    """Return the title of a sheet of a split document, cut so that the number fits in a sheet title.
+
+    >>> numbered_title('Steps', 2)
+    'Steps (2)'
+    >>> numbered_title('A' * 30, 12)
+    'AAAAAAAAAAAAAAAAAAAAAAAAAA (12)'
+    """
+    suffix = f' ({number})'
+    return title[:MAX_TITLE_LENGTH - len(suffix)] + suffix
+
+
+def color_element(tag: str, color) -> str:
+    """Return a color element for an RGB string such as "1F4E78", with alpha as openpyxl adds it.
+
+    >>> color_element('color', '1F4E78')
+    '<color rgb="001F4E78"/>'
+    """
+    color = str(color)
+    return f'<{tag} rgb={quoteattr(color if len(color) == 8 else "00" + color)}/>'
+
+
+def font_element(font: dict) -> str:
+    """Return a font element for font attributes as openpyxl's Font takes them.
+
+    >>> font_element({'name': 'Arial', 'size': 10, 'bold': True, 'color': 'FF0000'})
+    '<font><name val="Arial"/><sz val="10"/><b val="1"/><color rgb="00FF0000"/></font>'
+    """
+    elements = []
+    for key, value in font.items():
+        if value is None:
+            continue
+        if key == 'name':
+            elements.append(f'<name val={quoteattr(str(value))}/>')
+        elif key in ('size', 'sz'):
+            elements.append(f'<sz val="{value}"/>')
+        elif key in ('bold', 'b', 'italic', 'i', 'strike', 'strikethrough', 'outline', 'shadow', 'condense', 'extend'):
+            tag = {'bold': 'b', 'italic': 'i', 'strikethrough': 'strike'}.get(key, key)
+            elements.append(f'<{tag} val="{1 if value else 0}"/>')
+        elif key in ('underline', 'u'):
+            elements.append(f'<u val={quoteattr("single" if value is True else str(value))}/>')
+        elif key in ('color', 'vertAlign', 'family', 'charset', 'scheme'):
+            if key == 'color':
+                elements.append(color_element('color', value))
+            else:
+                elements.append(f'<{key} val={quoteattr(str(value))}/>')
+        else:
+            raise ValueError(f'Unknown font attribute: {key}')
+    return '<font>' + ''.join(elements) + '</font>'
+
+
+def fill_element(fill) -> str | None:
+    """Return a fill element for a color string such as "FFFF00" or a dict of PatternFill arguments.
+
+    >>> fill_element('FFFF00')
+    '<fill><patternFill patternType="solid"><fgColor rgb="00FFFF00"/><bgColor rgb="00FFFF00"/></patternFill></fill>'
+    >>> fill_element(None) is None
+    True
+    """
+    if not fill:
+        return None
+    if isinstance(fill, dict):
+        pattern = fill.get('fill_type', fill.get('patternType'))
+        foreground = fill.get('start_color', fill.get('fgColor'))
+        background = fill.get('end_color', fill.get('bgColor'))
+    else:
+        pattern, foreground, background = 'solid', fill, fill
+    pattern_attribute = f' patternType={quoteattr(pattern)}' if pattern else ''
+    colors = ''.join(
+        color_element(tag, color) for tag, color in (('fgColor', foreground), ('bgColor', background)) if color)
+    return f'<fill><patternFill{pattern_attribute}>{colors}</patternFill></fill>'
+
+
+def alignment_element(alignment: Alignment) -> str:
+    return f'<alignment horizontal="{alignment.name.lower()}" vertical="top" wrapText="1"/>'
+
+
+class StyleTable:
+    """Cell formats of a workbook, built from the column config.
+
+    The formats are the same as ExcelComposer's named styles: the summary
+    title, the header of each alignment, and the cells of each combination
+    of alignment, font, fill and number format.  All the formats of the
+    column config are added in the order of its columns, so that the same
+    config always gives the same indexes.
+
+    >>> config = ColumnConfig()
+    >>> config.conditions['Price'] = config.parse_condition({'fill': 'FFF2CC', 'number_format': '#,##0'})
+    >>> styles = StyleTable(config)
+    >>> [styles.index(role) for role in ('summary', 'header', 'cell')], styles.index('cell', config.conditions['Price'])
+    ([1, 2, 3], 4)
+    """
+
+    def __init__(self, column_config: ColumnConfig = None):
+        self.column_config = column_config or ColumnConfig()
+        self.fonts = [DEFAULT_FONT]
+        self.fills = [
+            '<fill><patternFill patternType="none"/></fill>', '<fill><patternFill patternType="gray125"/></fill>',
+        ]
+        self.borders = [EMPTY_BORDER, THIN_BORDER]
+        self.number_formats = []
+        self.formats = ['<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>']
+        self._indexes = {}
+        self.index('summary')
+        self.index('header')
+        self.index('cell')
+        for condition in self.column_config.all_conditions().values():
+            if condition is not None:
+                self.index('header', condition)
+                self.index('cell', condition)
+
+    @staticmethod
+    def _add(items: list, item: str) -> int:
+        if item not in items:
+            items.append(item)
+        return items.index(item)
+
+    def _font(self, role: str, condition: ColumnCondition | None) -> str:
+        font = dict(self.column_config.font)
+        if role == 'cell':
+            if condition and condition.font:
+                font.update(condition.font)
+            if not font:
+                return DEFAULT_FONT
+            return font_element({'name': 'Calibri', 'size': 11, **font})
+        font['bold'] = True
+        if role == 'header':
+            font.update(self.column_config.header_font)
+        return font_element(font)
+
+    def _key(self, role: str, condition: ColumnCondition | None) -> tuple:
+        if role == 'summary':
+            return role,
+        alignment = condition.alignment if condition else Alignment.LEFT
+        if role == 'header':
+            return role, alignment
+        return (
+            role,
+            alignment,
+            repr(sorted(condition.font.items())) if condition and condition.font else None,
+            repr(condition.fill) if condition and condition.fill else None,
+            condition.number_format if condition else None,
+        )
+
+    def index(self, role: str, condition: ColumnCondition = None) -> int:
+        """Return the index of the cell format for role and column condition.
+
+        :param role: "summary", "header" or "cell"
+        :param condition: condition of the column, or None for a column without configuration
+        :return: index to write in the "s" attribute of a cell
+        """
+        key = self._key(role, condition)
+        index = self._indexes.get(key)
+        if index is not None:
+            return index
+        font_id = self._add(self.fonts, self._font(role, condition))
+        attributes = f'fontId="{font_id}" applyFont="1"'
+        children = ''
+        if role == 'summary':
+            attributes = f'numFmtId="0" {attributes} fillId="0" borderId="0"'
+        else:
+            fill = fill_element(self.column_config.header_fill if role == 'header' else condition and condition.fill)
+            fill_id = self._add(self.fills, fill) if fill else 0
+            number_format_id = 0
+            if role == 'cell' and condition and condition.number_format:
+                number_format_id = FIRST_CUSTOM_NUMBER_FORMAT + self._add(self.number_formats, condition.number_format)
+            attributes = (f'numFmtId="{number_format_id}" {attributes} fillId="{fill_id}" borderId="1" '
+                          f'applyBorder="1" applyAlignment="1"')
+            if fill_id:
+                attributes += ' applyFill="1"'
+            if number_format_id:
+                attributes += ' applyNumberFormat="1"'
+            children = alignment_element(condition.alignment if condition else Alignment.LEFT)
+        index = self._add(self.formats, f'<xf {attributes} xfId="0">{children}</xf>')
+        self._indexes[key] = index
+        return index
+
+    def xml(self) -> bytes:
+        """Return the styles part."""
+        number_formats = ''
+        if self.number_formats:
+            number_formats = f'<numFmts count="{len(self.number_formats)}">' + ''.join(
+                f'<numFmt numFmtId="{FIRST_CUSTOM_NUMBER_FORMAT + index}" formatCode={quoteattr(code)}/>'
+                for index, code in enumerate(self.number_formats)
+            ) + '</numFmts>'
+        return (
+            f'{XML_DECLARATION}<styleSheet xmlns="{MAIN_NAMESPACE}">{number_formats}'
+            f'<fonts count="{len(self.fonts)}">{"".join(self.fonts)}</fonts>'
+            f'<fills count="{len(self.fills)}">{"".join(self.fills)}</fills>'
+            f'<borders count="{len(self.borders)}">{"".join(self.borders)}</borders>'
+            '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+            f'<cellXfs count="{len(self.formats)}">{"".join(self.formats)}</cellXfs>'
+            '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+            '<dxfs count="0"/><tableStyles count="0"/></styleSheet>'
+        ).encode('utf-8')
+
+
+class InlineStrings:
+    """Strings written in the cells, which keeps a worksheet independent of the others."""
+
+    def cell(self, reference: str, style: int, value: str) -> str:
+        return f'<c r="{reference}" s="{style}" t="inlineStr"><is>{text_element("t", value)}</is></c>'
+
+
+class SharedStrings:
+    """Strings of a workbook, each written once to the shared strings part and referred to by its index.
+
+    Columns which repeat the previous value for blank cells have many equal
+    strings, which are then written once.
+
+    >>> strings = SharedStrings()
+    >>> strings.cell('A1', 3, 'Open'), strings.cell('A2', 3, 'Open'), strings.cell('B2', 3, 'Done')
+    ('<c r="A1" s="3" t="s"><v>0</v></c>', '<c r="A2" s="3" t="s"><v>0</v></c>', '<c r="B2" s="3" t="s"><v>1</v></c>')
+    """
+
+    def __init__(self):
+        self.indexes = {}
+        self.count = 0
+
+    def cell(self, reference: str, style: int, value: str) -> str:
+        index = self.indexes.get(value)
+        if index is None:
+            check_string(value)
+            index = self.indexes[value] = len(self.indexes)
+        self.count += 1
+        return f'<c r="{reference}" s="{style}" t="s"><v>{index}</v></c>'
+
+    def write(self, file) -> None:
+        """Write the shared strings part to a binary file."""
+        file.write(
+            f'{XML_DECLARATION}<sst xmlns="{MAIN_NAMESPACE}" count="{self.count}" '
+            f'uniqueCount="{len(self.indexes)}">'.encode('utf-8'))
+        buffer = []
+        for value in self.indexes:
+            buffer.append(f'<si>{text_element("t", value)}</si>')
+            if len(buffer) >= 1000:
+                file.write(''.join(buffer).encode('utf-8'))
+                buffer = []
+        file.write((''.join(buffer) + '</sst>').encode('utf-8'))
+
+
+class SheetWriter:
+    """Writes the XML of a worksheet to a binary file, a row at a time.
+
+    Cells are written as openpyxl writes them: a blank string is a string
+    cell without a value, and a string starting with "=" is a formula.
+
+    >>> import io
+    >>> file = io.BytesIO()
+    >>> writer = SheetWriter(file, [])
+    >>> writer.append(['', '=SUM(A1:A2)'], [1, 1])
+    >>> writer.flush()
+    >>> file.getvalue().split(b'<sheetData>')[1].decode()
+    '<row r="1"><c r="A1" s="1" t="inlineStr"/><c r="B1" s="1"><f>SUM(A1:A2)</f><v></v></c></row>'
+
+    :param file: binary file to write to
+    :param widths: width of each column, None for the default width
+    :param strings: InlineStrings, or SharedStrings to share the strings in the workbook
+    """
+
+    def __init__(self, file, widths: list, strings=None):
+        self.file = file
+        self.strings = strings or InlineStrings()
+        self.row_number = 0
+        self._letters = []
+        self._buffer = []
+        file.write((
+            f'{XML_DECLARATION}<worksheet xmlns="{MAIN_NAMESPACE}" xmlns:r="{RELATIONSHIPS_NAMESPACE}">'
+            '<sheetFormatPr baseColWidth="8" defaultRowHeight="15"/>'
+        ).encode('utf-8'))
+        cols = ''.join(
+            f'<col min="{index}" max="{index}" width="{width}" customWidth="1"/>'
+            for index, width in enumerate(widths, 1) if width
+        )
+        if cols:
+            file.write(f'<cols>{cols}</cols>'.encode('utf-8'))
+        file.write(b'<sheetData>')
+
+    def append(self, values: list, styles: list) -> None:
+        """Append a row, skipping a blank row without cells.
+
+        :param values: values of the cells, None for a styled blank cell
+        :param styles: format index of each cell
+        """
+        self.row_number += 1
+        if not values:
+            return
+        while len(self._letters) < len(values):
+            self._letters.append(column_letter(len(self._letters) + 1))
+        row = str(self.row_number)
+        cells = []
+        for letter, value, style in zip(self._letters, values, styles):
+            reference = letter + row
+            if value is None:
+                cells.append(f'<c r="{reference}" s="{style}"/>')
+            elif isinstance(value, str):
+                if not value:
+                    cells.append(f'<c r="{reference}" s="{style}" t="inlineStr"/>')
+                elif value[0] == '=' and len(value) > 1:
+                    cells.append(f'<c r="{reference}" s="{style}"><f>{escape(check_string(value[1:]))}</f><v></v></c>')
+                else:
+                    cells.append(self.strings.cell(reference, style, value))
+            elif isinstance(value, bool):
+                cells.append(f'<c r="{reference}" s="{style}" t="b"><v>{int(value)}</v></c>')
+            elif isinstance(value, (int, float)):
+                cells.append(f'<c r="{reference}" s="{style}"><v>{value!r}</v></c>')
+            else:
+                cells.append(self.strings.cell(reference, style, str(value)))
+        self._buffer.append(f'<row r="{row}">{"".join(cells)}</row>')
+        if len(self._buffer) >= 1000:
+            self.flush()
+
+    def flush(self) -> None:
+        self.file.write(''.join(self._buffer).encode('utf-8'))
+        self._buffer = []
+
+    def close(self) -> None:
+        self.flush()
+        self.file.write(b'</sheetData><pageMargins left="0.75" right="0.75" top="1" bottom="1" '
+                        b'header="0.5" footer="0.5"/></worksheet>')
+
+
+class XlsxPackage:
+    """Zip package of an xlsx file, whose worksheets are added one by one.
+
+    :param path: path to the file to write
+    :param compresslevel: zlib compression level of the parts
+    :param created: time to write in the document properties, the current time if None
+    """
+
+    def __init__(self, path, compresslevel: int = None, created: datetime.datetime = None):
+        self.path = path
+        self.archive = zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED, allowZip64=True, compresslevel=compresslevel)
+        self.created = created or datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None, microsecond=0)
+        self.titles = []
+
+    def _open(self, name: str, force_zip64: bool = False):
+        # entries opened by name carry the fixed date of ZipInfo, so that the same parts give the same bytes
+        return self.archive.open(name, 'w', force_zip64=force_zip64)
+
+    def _write(self, name: str, data: bytes) -> None:
+        with self._open(name) as f:
+            f.write(data)
+
+    def add_sheet(self, title: str, path=None):
+        """Add a worksheet.
+
+        :param title: title of the sheet, numbered if another sheet has it
+        :param path: path to the rendered XML of the sheet, or None to write it to the returned file
+        :return: None if path is given, or a binary file to write the XML to, which the caller closes
+        """
+        self.titles.append(check_sheet_title(title, {t.lower() for t in self.titles}))
+        name = f'xl/worksheets/sheet{len(self.titles)}.xml'
+        if path is None:
+            return self._open(name, force_zip64=True)
+        with open(path, 'rb') as source, self._open(name, force_zip64=True) as destination:
+            shutil.copyfileobj(source, destination, 1024 * 1024)
+        return None
+
+    def rename_sheet(self, index: int, title: str) -> None:
+        """Rename a sheet added before, as a split document numbers its first sheet.
+
+        :param index: 0-based index of the sheet
+        :param title: new title of the sheet, numbered if another sheet has it
+        """
+        others = {t.lower() for i, t in enumerate(self.titles) if i != index}
+        self.titles[index] = check_sheet_title(title, others)
+
+    def close(self, styles: StyleTable, shared_strings=None) -> None:
+        """Write the other parts and close the file.
+
+        :param styles: cell formats of the worksheets
+        :param shared_strings: SharedStrings of the worksheets, or None if they have inline strings
+        """
+        if not self.titles:
+            self.archive.close()
+            raise ValueError('There is no valid markdown file.')
+        sheet_count = len(self.titles)
+        overrides = [
+            ('/xl/workbook.xml', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml'),
+            *((f'/xl/worksheets/sheet{index}.xml',
+               'application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml')
+              for index in range(1, sheet_count + 1)),
+            ('/xl/styles.xml', 'application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml'),
+            ('/docProps/core.xml', 'application/vnd.openxmlformats-package.core-properties+xml'),
+            ('/docProps/app.xml', 'application/vnd.openxmlformats-officedocument.extended-properties+xml'),
+        ]
+        relationships = [
+            *((f'worksheets/sheet{index}.xml', 'worksheet') for index in range(1, sheet_count + 1)),
+            ('styles.xml', 'styles'),
+        ]
+        if shared_strings is not None:
+            overrides.append((
+                '/xl/sharedStrings.xml',
+                'application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml'))
+            relationships.append(('sharedStrings.xml', 'sharedStrings'))
+            with self._open('xl/sharedStrings.xml', force_zip64=True) as f:
+                shared_strings.write(f)
+
+        self._write('[Content_Types].xml', (
+            f'{XML_DECLARATION}<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            + ''.join(f'<Override PartName="{name}" ContentType="{content_type}"/>' for name, content_type in overrides)
+            + '</Types>'
+        ).encode('utf-8'))
+        self._write('_rels/.rels', (
+            f'{XML_DECLARATION}<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            f'<Relationship Id="rId1" Type="{RELATIONSHIPS_NAMESPACE}/officeDocument" Target="xl/workbook.xml"/>'
+            '<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/package/2006/relationships/metadata/'
+            'core-properties" Target="docProps/core.xml"/>'
+            f'<Relationship Id="rId3" Type="{RELATIONSHIPS_NAMESPACE}/extended-properties" Target="docProps/app.xml"/>'
+            '</Relationships>'
+        ).encode('utf-8'))
+        created = self.created.isoformat() + 'Z'
+        self._write('docProps/core.xml', (
+            f'{XML_DECLARATION}<cp:coreProperties '
+            'xmlns:cp="http://schemas.openxmlformats.org/package/2006/metadata/core-properties" '
+            'xmlns:dc="http://purl.org/dc/elements/1.1/" xmlns:dcterms="http://purl.org/dc/terms/" '
+            'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"><dc:creator>mael</dc:creator>'
+            f'<dcterms:created xsi:type="dcterms:W3CDTF">{created}</dcterms:created>'
+            f'<dcterms:modified xsi:type="dcterms:W3CDTF">{created}</dcterms:modified></cp:coreProperties>'
+        ).encode('utf-8'))
+        self._write('docProps/app.xml', (
+            f'{XML_DECLARATION}<Properties '
+            'xmlns="http://schemas.openxmlformats.org/officeDocument/2006/extended-properties">'
+            '<Application>mael</Application></Properties>'
+        ).encode('utf-8'))
+        self._write('xl/workbook.xml', (
+            f'{XML_DECLARATION}<workbook xmlns="{MAIN_NAMESPACE}" xmlns:r="{RELATIONSHIPS_NAMESPACE}">'
+            '<bookViews><workbookView activeTab="0"/></bookViews><sheets>'
+            + ''.join(
+                f'<sheet name={quoteattr(title)} sheetId="{index}" r:id="rId{index}"/>'
+                for index, title in enumerate(self.titles, 1)
+            )
+            + '</sheets><calcPr calcId="124519" fullCalcOnLoad="1"/></workbook>'
+        ).encode('utf-8'))
+        self._write('xl/_rels/workbook.xml.rels', (
+            f'{XML_DECLARATION}<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            + ''.join(
+                f'<Relationship Id="rId{index}" Type="{RELATIONSHIPS_NAMESPACE}/{kind}" Target="{target}"/>'
+                for index, (target, kind) in enumerate(relationships, 1)
+            )
+            + '</Relationships>'
+        ).encode('utf-8'))
+        self._write('xl/styles.xml', styles.xml())
+        self.archive.close()
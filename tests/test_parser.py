@@ -0,0 +1,165 @@
+import glob
+import os
+import re
+import tempfile
+import unittest
+
+from mael.column_config import ColumnConfig, ValueType
+from mael.excel_builder import read_column_config
+from mael.parser import MarkdownListParser, StepBuilder, trim_blank_lines
+
+TEMPLATES_PATH = os.path.join(os.path.dirname(__file__), os.pardir, 'mael', 'templates')
+
+
+def regex_parse(lines: list[str], column_config: ColumnConfig) -> tuple | None:
+    """Parse lines with the regular expressions of the line by line parser which MarkdownListParser replaced."""
+    lines = iter(lines)
+    title = None
+    for line in lines:
+        result = re.match(r'^#[^#]\s*(\S.*)\s*$', line.rstrip())
+        if result:
+            title = result.group(1)
+            break
+    for line in lines:
+        if re.match(r'^##\s*Summary\s*$', line):
+            break
+    else:
+        return None
+    summary_lines = []
+    for line in lines:
+        if re.match(r'^##\s*(List|Steps|Rows)\s*$', line):
+            break
+        summary_lines.append(line.rstrip())
+
+    steps = []
+    step = {}
+    column = None
+    content = []
+
+    def item_content():
+        if column_config.type_of(column) == ValueType.LIST:
+            return trim_blank_lines([re.sub(r'^\s*\*\s*', '', line) for line in content])
+        return '\n'.join(trim_blank_lines(content))
+
+    for line in lines:
+        if re.match(r'^\s*---\s*$', line):
+            if column is not None:
+                step[column] = item_content()
+                column = None
+            if step:
+                steps.append(step)
+                step = {}
+            continue
+        result = re.match(r'^#{3,}\s*(\S.*\S|\S)\s*$', line)
+        if result:
+            if column is not None:
+                step[column] = item_content()
+            column = result.group(1)
+            if not column_config.overwrite_for_repeat and column in step:
+                steps.append(step)
+                step = {}
+            content = []
+            continue
+        if column is not None and (content or line.strip()):
+            content.append(line.rstrip())
+    if column is not None:
+        step[column] = item_content()
+    if step:
+        steps.append(step)
+    return title, trim_blank_lines(summary_lines), steps
+
+
+def parse(lines: list[str], column_config: ColumnConfig = None) -> tuple | None:
+    document = MarkdownListParser(column_config).parse(lines)
+    if document is None:
+        return None
+    return document.title, document.summary_lines, document.steps
+
+
+class MarkdownListParserTest(unittest.TestCase):
+
+    def test_header_without_list(self):
+        self.assertEqual(('T', ['only summary'], []), parse(['# T\n', '## Summary\n', 'only summary\n']))
+
+    def test_end_of_file_right_after_the_list_header(self):
+        self.assertEqual(('T', ['s'], []), parse(['# T\n', '## Summary\n', 's\n', '## List']))
+        with tempfile.TemporaryDirectory() as directory_path:
+            file_path = os.path.join(directory_path, 'Empty.md')
+            with open(file_path, 'w', encoding='utf-8') as f:
+                f.write('# Empty\n\n## Summary\n\n## Steps')
+            document = MarkdownListParser().parse_file(file_path)
+            self.assertEqual(('Empty', [], []), (document.title, document.summary_lines, document.steps))
+            self.assertEqual([], list(MarkdownListParser().iter_file_steps(file_path)))
+
+    def test_file_without_summary(self):
+        self.assertIsNone(parse(['# T\n', '## List\n', '### A\n', '1\n']))
+
+    def test_crlf_lines(self):
+        text = '# T\r\n\r\n## Summary\r\n\r\nline 1\r\nline 2\r\n\r\n## List\r\n\r\n### A\r\n\r\na 1\r\n\r\n' \
+               '#### B\r\nb 1\r\nb 2\r\n---\r\n### A\r\na 2\r\n'
+        expected = ('T', ['line 1', 'line 2'], [{'A': 'a 1', 'B': 'b 1\nb 2'}, {'A': 'a 2'}])
+        self.assertEqual(expected, parse(text.splitlines(keepends=True)))
+        with tempfile.TemporaryDirectory() as directory_path:
+            file_path = os.path.join(directory_path, 'Crlf.md')
+            with open(file_path, 'wb') as f:
+                f.write(text.encode('utf-8'))
+            document = MarkdownListParser().parse_file(file_path)
+            self.assertEqual(expected, (document.title, document.summary_lines, document.steps))
+
+    def test_repeated_column_overwrites_in_one_step(self):
+        config = ColumnConfig()
+        config.overwrite_for_repeat = True
+        lines = ['# T', '## Summary', '## List', '### A', '1', '### B', 'x', '### A', '2', '---', '### A', '3']
+        expected = [{'A': '2', 'B': 'x'}, {'A': '3'}]
+        self.assertEqual(expected, parse(lines, config)[2])
+        self.assertEqual(regex_parse(lines, config), parse(lines, config))
+
+        builder = StepBuilder(overwrite_for_repeat=True)
+        steps = []
+        for block in MarkdownListParser(config).iter_blocks(lines[3:]):
+            step = builder.separate() if block is None else builder.add(*block)
+            if step:
+                steps.append(step)
+        steps.append(builder.separate())
+        self.assertEqual(expected, steps)
+
+    def test_repeated_column_starts_a_step(self):
+        lines = ['# T', '## Summary', '## List', '### A', '1', '### B', 'x', '### A', '2']
+        self.assertEqual([{'A': '1', 'B': 'x'}, {'A': '2'}], parse(lines)[2])
+
+    def test_escaped_structure_lines(self):
+        lines = [
+            '# T', '## Summary', '\\## List', '\\# not a header', '## List',
+            '### A', '\\### B', '\\---', '\\\\---', '\\ ---', '\\# not a header', '\\n',
+        ]
+        expected = ('T', ['## List', '\\# not a header'], [{'A': '### B\n---\n\\---\n ---\n\\# not a header\n\\n'}])
+        self.assertEqual(expected, parse(lines))
+
+    def test_blank_lines_are_trimmed(self):
+        config = ColumnConfig()
+        config.conditions['C'] = config.parse_condition({'type': 'list'})
+        lines = [
+            '# T', '## Summary', '', '  ', 'a', '', 'b', ' ', '## List', '',
+            '### A', '', '   ', 'x', '', '', 'y', '  ', '', '### C', '', '* i', '', '* j', '', '---', '',
+        ]
+        self.assertEqual(('T', ['a', '', 'b'], [{'A': 'x\n\n\ny', 'C': ['i', '', 'j']}]), parse(lines, config))
+        self.assertEqual(regex_parse(lines, config), parse(lines, config))
+
+    def test_templates_give_the_steps_of_the_regex_parser(self):
+        file_paths = sorted(glob.glob(os.path.join(TEMPLATES_PATH, '*', '*.md')))
+        self.assertTrue(file_paths)
+        for file_path in file_paths:
+            column_config = read_column_config(os.path.dirname(file_path))
+            with open(file_path, encoding='utf-8') as f:
+                lines = f.readlines()
+            with self.subTest(file_path=os.path.relpath(file_path, TEMPLATES_PATH)):
+                expected = regex_parse(lines, column_config)
+                document = MarkdownListParser(column_config).parse_file(file_path)
+                if expected is None:
+                    self.assertIsNone(document)
+                else:
+                    self.assertEqual(expected, (document.title, document.summary_lines, document.steps))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import contextlib
+import io
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from mael.composer import OutputFormat
+from mael.excel_builder import convert
+
+MARKDOWN = '''# Tagged
+
+## Summary
+
+## List
+
+### Tags
+
+* a
+* b
+
+### Note
+
+first
+
+---
+
+### Tags
+
+* c
+
+### Note
+
+second
+'''
+
+
+class SqliteComposerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory_path = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.directory_path, 'config'))
+        with open(os.path.join(self.directory_path, 'config', 'columns.yml'), 'w') as f:
+            f.write('column_conditions:\n  Tags:\n    type: list\n')
+        with open(os.path.join(self.directory_path, 'Tagged.md'), 'w') as f:
+            f.write(MARKDOWN)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory_path)
+
+    def test_numbered_columns_of_a_declared_list_column_are_indexed(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            convert(self.directory_path, None, OutputFormat.SQLITE, use_cache=False)
+        name = os.path.basename(self.directory_path) + '.sqlite'
+        connection = sqlite3.connect(os.path.join(self.directory_path, 'output', name))
+        try:
+            indexed = connection.execute(
+                "SELECT tbl_name, name FROM sqlite_master WHERE type = 'index' ORDER BY name").fetchall()
+            rows = connection.execute('SELECT * FROM Tagged').fetchall()
+        finally:
+            connection.close()
+        self.assertEqual([('Tagged', 'Tagged_Tags_1'), ('Tagged', 'Tagged_Tags_2')], indexed)
+        self.assertEqual([('a', 'b', 'first'), ('c', None, 'second')], rows)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+import openpyxl
+
+from mael.composer import ExcelEngine, ExcelMode, OutputFormat
+from mael.excel_builder import convert
+
+MARKDOWN = '''# Cells
+
+## Summary
+
+Values of every kind.
+
+## List
+
+### Text
+
+plain
+
+### Formula
+
+=1+2
+
+### Blank
+
+---
+
+### Text
+
+ leading space
+
+### Formula
+
+=
+
+### Number
+
+{{ NUMBER }}
+'''
+
+
+def cells(path: str) -> list:
+    """Return the title, coordinate, data type, value, style and width of every cell of a workbook."""
+    workbook = openpyxl.load_workbook(path)
+    result = []
+    for ws in workbook.worksheets:
+        widths = {letter: dimension.width for letter, dimension in ws.column_dimensions.items()}
+        for row in ws.iter_rows():
+            for cell in row:
+                result.append((
+                    ws.title, cell.coordinate, cell.data_type, cell.value, cell.font.b, cell.border.left.style,
+                    cell.alignment.horizontal, cell.number_format, widths.get(cell.column_letter),
+                ))
+    return result
+
+
+class XlsxComposerTest(unittest.TestCase):
+    """The workbooks of XlsxComposer have the same cells as those of ExcelComposer."""
+
+    def setUp(self):
+        self.directory_path = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.directory_path, 'config'))
+        with open(os.path.join(self.directory_path, 'config', 'columns.yml'), 'w') as f:
+            f.write('global:\n  duplicate_previous_for_blank: false\n'
+                    'column_conditions:\n  Text:\n    width: 30\n    alignment: center\n')
+        with open(os.path.join(self.directory_path, 'config', 'variables.ini'), 'w') as f:
+            f.write('[DEFAULT]\nNUMBER = 42\n')
+        with open(os.path.join(self.directory_path, 'Cells.md'), 'w') as f:
+            f.write(MARKDOWN)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory_path)
+
+    def build(self, **options) -> list:
+        with contextlib.redirect_stdout(io.StringIO()):
+            convert(self.directory_path, None, OutputFormat.EXCEL, use_cache=False, **options)
+        name = os.path.basename(self.directory_path) + '.xlsx'
+        return cells(os.path.join(self.directory_path, 'output', name))
+
+    def test_incremental_mode_writes_the_cells_of_a_normal_build(self):
+        expected = self.build()
+        self.assertIn(('Cells', 'B6', 'f', '=1+2'), [cell[:4] for cell in expected])
+        self.assertEqual(expected, self.build(excel_mode=ExcelMode.INCREMENTAL))
+        # the second build assembles the cached sheet
+        self.assertEqual(expected, self.build(excel_mode=ExcelMode.INCREMENTAL))
+
+    def test_native_engine_writes_the_cells_of_a_normal_build(self):
+        expected = self.build()
+        self.assertEqual(expected, self.build(engine=ExcelEngine.NATIVE))
+        self.assertEqual(expected, self.build(engine=ExcelEngine.NATIVE, streaming=True))
+
+
+if __name__ == '__main__':
+    unittest.main()